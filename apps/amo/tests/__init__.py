@@ -47,7 +47,8 @@ from mkt.constants.applications import DEVICE_TYPES
 from mkt.files.helpers import copyfileobj
 from mkt.files.models import File
 from mkt.prices.models import AddonPremium, Price, PriceCurrency
-from mkt.search.indexers import BaseIndexer
+from mkt.search.indexers import (BaseIndexer, discard_index_queue,
+                                 flush_index_queue)
 from mkt.site.fixtures import fixture
 from mkt.translations.models import Translation
 from mkt.users.models import UserProfile
@@ -315,6 +316,7 @@ class TestCase(MockEsMixin, RedisTest, MockBrowserIdMixin,
         super(TestCase, self)._pre_setup()
         self.mock_browser_id()
         post_request_task._discard_tasks()
+        discard_index_queue()
 
     def _post_teardown(self):
         amo.set_user(None)
@@ -884,6 +886,7 @@ class ESTestCase(TestCase):
             super(ESTestCase, cls).tearDownClass()
 
     def tearDown(self):
+        flush_index_queue()
         post_request_task._send_tasks()
         super(ESTestCase, self).tearDown()
 
@@ -893,6 +896,7 @@ class ESTestCase(TestCase):
 
     @classmethod
     def refresh(cls, doctype='webapp', timesleep=0):
+        flush_index_queue()
         post_request_task._send_tasks()
         index = settings.ES_INDEXES[doctype]
         try:
@@ -2,9 +2,12 @@ import json
 import os
 import shutil
 import tempfile
+import time
+import uuid
 from base64 import b64decode
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.storage import default_storage as storage
 
 import commonware.log
@@ -13,12 +16,18 @@ from celeryutils import task
 from django_statsd.clients import statsd
 from signing_clients.apps import JarExtractor
 
+from lib.post_request_task.task import task as post_request_task
 from mkt.versions.models import Version
 
 
 log = commonware.log.getLogger('z.crypto')
 
 
+# How often a request waiting for the signing lock checks whether the other
+# request is done.
+LOCK_POLL_INTERVAL = 0.5
+
+
 class SigningError(Exception):
     pass
 
@@ -147,6 +156,33 @@ def sign(version_id, reviewer=False, resign=False, **kw):
         log.info('[Webapp:%s] Already signed app exists.' % app.id)
         return path
 
+    lock = get_lock_key(version_id, reviewer)
+    # Only the request holding this token may release the lock.
+    token = uuid.uuid4().hex
+    if not cache.add(lock, token, settings.SIGNED_APPS_LOCK_TIMEOUT):
+        # Someone else is signing this version, wait for them instead of
+        # signing it twice.
+        log.info('[Webapp:%s] Waiting for version %s to be signed.'
+                 % (app.id, version_id))
+        statsd.incr('services.sign.app.wait')
+        wait_for_lock(lock)
+        if storage.exists(path):
+            return path
+        # The other request failed, sign it ourselves unless someone else
+        # still holds the lock.
+        if not cache.add(lock, token, settings.SIGNED_APPS_LOCK_TIMEOUT):
+            log.error('[Webapp:%s] Gave up waiting for version %s to be '
+                      'signed.' % (app.id, version_id))
+            raise SigningError('Signing in progress')
+
+    try:
+        _sign_version(app, version_id, file_obj, path, reviewer)
+    finally:
+        release_lock(lock, token)
+    return path
+
+
+def _sign_version(app, version_id, file_obj, path, reviewer):
     if reviewer:
         # Reviewers get a unique 'id' so the reviewer installed app won't
         # conflict with the public app, and also so multiple versions of the
@@ -170,4 +206,38 @@ def sign(version_id, reviewer=False, resign=False, **kw):
                 storage.delete(path)
             raise
     log.info('[Webapp:%s] Signing complete.' % app.id)
-    return path
+
+
+def get_lock_key(version_id, reviewer=False):
+    return 'crypto:sign:%s:%s' % ('reviewer' if reviewer else 'public',
+                                  version_id)
+
+
+def wait_for_lock(lock):
+    """Waits until `lock` is released, or for as long as it can be held."""
+    waited = 0
+    while cache.get(lock) and waited < settings.SIGNED_APPS_LOCK_TIMEOUT:
+        time.sleep(LOCK_POLL_INTERVAL)
+        waited += LOCK_POLL_INTERVAL
+
+
+def release_lock(lock, token):
+    """
+    Releases `lock` if it is still held with `token`, and not by whoever took
+    it after it expired.
+    """
+    if cache.get(lock) == token:
+        cache.delete(lock)
+
+
+@post_request_task
+def presign(version_id, reviewer=False, **kw):
+    """
+    Signs a version in the background so that the first request needing the
+    signed package doesn't have to wait for it.
+    """
+    try:
+        sign(version_id, reviewer=reviewer)
+    except (SigningError, Version.DoesNotExist):
+        # Whoever asks for it next will sign it again and see the error.
+        log.info('Pre-signing version %s failed.' % version_id, exc_info=True)
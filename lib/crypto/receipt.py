@@ -1,4 +1,5 @@
 import json
+import threading
 
 from django.conf import settings
 from django_statsd.clients import statsd
@@ -6,10 +7,23 @@ from django_statsd.clients import statsd
 import commonware.log
 import jwt
 import requests
+from requests.adapters import HTTPAdapter
 
 
 log = commonware.log.getLogger('z.crypto')
 
+# Keep the connections to the signing server alive between receipts, and
+# bound the number of receipts being signed at the same time. Under gevent
+# both of these are cooperative, so a worker can keep many verifications in
+# flight.
+session = requests.Session()
+session.mount('http://', HTTPAdapter(
+    pool_maxsize=settings.SIGNING_SERVER_MAX_CONNECTIONS))
+session.mount('https://', HTTPAdapter(
+    pool_maxsize=settings.SIGNING_SERVER_MAX_CONNECTIONS))
+signing_slots = threading.BoundedSemaphore(
+    settings.SIGNING_SERVER_MAX_CONNECTIONS)
+
 
 class SigningError(Exception):
     pass
@@ -35,9 +49,9 @@ def sign(receipt):
     data = receipt if isinstance(receipt, basestring) else receipt_json
 
     try:
-        with statsd.timer('services.sign.receipt'):
-            req = requests.post(destination, data=data, headers=headers,
-                                timeout=timeout)
+        with signing_slots, statsd.timer('services.sign.receipt'):
+            req = session.post(destination, data=data, headers=headers,
+                               timeout=timeout)
     except requests.Timeout:
         statsd.incr('services.sign.receipt.timeout')
         log.error('Posting to receipt signing timed out')
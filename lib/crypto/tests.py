@@ -5,6 +5,7 @@ import shutil
 import zipfile
 
 from django.conf import settings  # For mocking.
+from django.core.cache import cache
 from django.core.files.storage import default_storage as storage
 
 import jwt
@@ -38,7 +39,7 @@ def mock_sign(version_id, reviewer=False):
     return path
 
 
-@mock.patch('lib.crypto.receipt.requests.post')
+@mock.patch('lib.crypto.receipt.session.post')
 @mock.patch.object(settings, 'SIGNING_SERVER', 'http://localhost')
 class TestReceipt(amo.tests.TestCase):
 
@@ -141,6 +142,73 @@ class TestPackaged(PackagedApp, amo.tests.TestCase):
         packaged.sign(self.version.pk, resign=True)
         assert sign_app.called
 
+    @mock.patch('lib.crypto.packaged.wait_for_lock')
+    @mock.patch('lib.crypto.packaged.sign_app')
+    def test_wait_for_concurrent_signing(self, sign_app, wait_for_lock):
+        cache.add(packaged.get_lock_key(self.version.pk), True)
+        # The other request signs the version while we wait.
+        wait_for_lock.side_effect = lambda lock: storage.open(
+            self.file.signed_file_path, 'w')
+        eq_(packaged.sign(self.version.pk), self.file.signed_file_path)
+        assert wait_for_lock.called
+        assert not sign_app.called
+
+    @mock.patch('lib.crypto.packaged.wait_for_lock')
+    @mock.patch('lib.crypto.packaged.sign_app')
+    def test_sign_after_concurrent_signing_failed(self, sign_app,
+                                                  wait_for_lock):
+        lock = packaged.get_lock_key(self.version.pk)
+        cache.add(lock, 'other')
+        # The other request fails and releases the lock while we wait.
+        wait_for_lock.side_effect = lambda lock: cache.delete(lock)
+        packaged.sign(self.version.pk)
+        assert wait_for_lock.called
+        assert sign_app.called
+        assert not cache.get(lock)
+
+    @mock.patch('lib.crypto.packaged.wait_for_lock')
+    @mock.patch('lib.crypto.packaged.sign_app')
+    def test_lock_still_held_after_waiting(self, sign_app, wait_for_lock):
+        lock = packaged.get_lock_key(self.version.pk)
+        cache.add(lock, 'other')
+        with self.assertRaises(packaged.SigningError):
+            packaged.sign(self.version.pk)
+        assert not sign_app.called
+        eq_(cache.get(lock), 'other')
+
+    @mock.patch('lib.crypto.packaged.sign_app')
+    def test_lock_of_others_not_released(self, sign_app):
+        lock = packaged.get_lock_key(self.version.pk)
+        # Our lock expires while signing and another request takes it.
+        sign_app.side_effect = lambda *args: cache.set(lock, 'other')
+        packaged.sign(self.version.pk)
+        eq_(cache.get(lock), 'other')
+
+    @mock.patch('lib.crypto.packaged.sign_app')
+    def test_lock_per_version_and_reviewer(self, sign_app):
+        cache.add(packaged.get_lock_key(self.version.pk), True)
+        packaged.sign(self.version.pk, reviewer=True)
+        assert sign_app.called
+
+    @mock.patch('lib.crypto.packaged.sign_app')
+    def test_lock_released_on_failure(self, sign_app):
+        sign_app.side_effect = packaged.SigningError
+        with self.assertRaises(packaged.SigningError):
+            packaged.sign(self.version.pk)
+        assert not cache.get(packaged.get_lock_key(self.version.pk))
+
+    @mock.patch('lib.crypto.packaged.sign_app')
+    def test_presign(self, sign_app):
+        packaged.presign(self.version.pk, reviewer=True)
+        eq_(sign_app.call_args[0][1], self.file.signed_reviewer_file_path)
+
+    @mock.patch('lib.crypto.packaged.sign_app')
+    def test_presign_failure(self, sign_app):
+        sign_app.side_effect = packaged.SigningError
+        # Errors are left to whoever needs the signed package next.
+        packaged.presign(self.version.pk, reviewer=True)
+        packaged.presign(self.version.pk + 1, reviewer=True)
+
     @mock.patch('lib.crypto.packaged.sign_app')
     def test_sign_consumer(self, sign_app):
         packaged.sign(self.version.pk)
@@ -2,11 +2,20 @@
 Marketplace ElasticSearch Indexer.
 
 Currently creates the indexes and re-indexes apps and feed elements.
+
+By default the indexing is done by celery tasks. With `--workers=N` it is done
+by N local processes instead, without needing a celery broker, and a summary
+of the throughput and of the objects that failed to index is printed at the
+end.
+
+Completed chunks are recorded in the database: `--resume` picks up an
+interrupted reindexation where it stopped.
 """
 import logging
 import sys
 import time
 from math import ceil
+from multiprocessing import Pool
 from optparse import make_option
 
 import elasticsearch
@@ -14,6 +23,7 @@ from celery import chain, chord, task
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
 
 import mkt.feed.indexers as f_indexers
 from amo.utils import chunked, timestamp_index
@@ -145,22 +155,119 @@ def post_index(new_index, old_index, alias, indexer, settings):
 
 
 @task(ignore_result=False)
-def run_indexing(index, indexer, ids):
+def run_indexing(index, indexer, ids, alias=None):
     """Index the objects.
 
     - index: name of the index
+    - alias: if provided, the chunk is checkpointed for this alias once all
+      the objects are indexed.
 
     Note: `ignore_result=False` is required for the chord to work and trigger
     the callback.
 
     """
-    indexer.run_indexing(ids, ES, index=index)
+    indexed, failed = index_chunk(index, indexer, ids)
+    if alias and not failed:
+        Reindexing.checkpoint(alias, ids)
+
+
+def index_chunk(index, indexer, ids):
+    """
+    Stream the documents of the objects matching `ids` into `index`.
+
+    Returns a tuple of the number of indexed documents and of the list of IDs
+    that failed to index.
+    """
+    _print('Indexing {0} {1}'.format(len(ids),
+                                     indexer.get_model()._meta.model_name))
+    indexed, failed, done = 0, [], set()
+    docs = indexer.iter_documents(ids, failed=failed)
+    try:
+        for ok, item in indexer.streaming_bulk_index(docs, es=ES,
+                                                     index=index):
+            result = item.values()[0]
+            id_ = int(result['_id'])
+            done.add(id_)
+            if ok:
+                indexed += 1
+            else:
+                _print('Failed to index {0}: {1}'.format(
+                    id_, result.get('error')))
+                failed.append(id_)
+    except Exception as e:
+        # Elasticsearch or the extraction of the documents failed as a whole:
+        # none of the documents left was indexed.
+        left = sorted(set(ids) - done - set(failed))
+        _print('Failed to index {0}: {1}'.format(
+            ', '.join(map(str, left)), e))
+        failed.extend(left)
+    return indexed, failed
+
+
+def init_worker():
+    """Give each worker process its own Elasticsearch connections."""
+    global ES
+    ES = elasticsearch.Elasticsearch(hosts=settings.ES_HOSTS)
+
+
+def run_indexing_worker(args):
+    """Index a chunk in a worker process, see `index_chunk`."""
+    index, indexer, ids = args
+    indexed, failed = index_chunk(index, indexer, ids)
+    return ids, indexed, failed
+
+
+def run_local_indexing(index, alias, indexer, chunks, workers):
+    """
+    Index the chunks with a pool of `workers` local processes, checkpointing
+    each completed chunk. IDs that failed are retried once at the end.
+
+    Returns a tuple of the number of indexed documents, the elapsed time and
+    the list of IDs that still failed after the retry.
+    """
+    start = time.time()
+    indexed, retry, retry_chunks = 0, [], []
+
+    # Don't share the database connection with the worker processes.
+    connection.close()
+    pool = Pool(processes=workers, initializer=init_worker)
+    try:
+        results = pool.imap_unordered(
+            run_indexing_worker, [(index, indexer, ids) for ids in chunks])
+        for ids, chunk_indexed, failed in results:
+            indexed += chunk_indexed
+            if failed:
+                retry.extend(failed)
+                retry_chunks.append(ids)
+            else:
+                Reindexing.checkpoint(alias, ids)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    failed = []
+    if retry:
+        _print('Retrying {0} failed items.'.format(len(retry)), alias)
+        retried, failed = index_chunk(index, indexer, retry)
+        indexed += retried
+        # The chunks that are complete after the retry won't be indexed
+        # again by --resume, the others will.
+        for ids in retry_chunks:
+            if not set(ids).intersection(failed):
+                Reindexing.checkpoint(alias, ids)
+
+    return indexed, time.time() - start, failed
 
 
 def chunk_indexing(indexer, chunk_size):
     """Chunk the items to index."""
-    chunks = list(indexer.get_indexable().values_list('id', flat=True))
-    return chunked(chunks, chunk_size), len(chunks)
+    # Order by id so that chunks are the same id ranges when resuming.
+    chunks = list(indexer.get_indexable().order_by('id')
+                  .values_list('id', flat=True))
+    return list(chunked(chunks, chunk_size)), len(chunks)
 
 
 class Command(BaseCommand):
@@ -176,6 +283,14 @@ class Command(BaseCommand):
                     help=('Bypass the database flag that says '
                           'another indexation is ongoing'),
                     default=False),
+        make_option('--resume', action='store_true',
+                    help=('Resume an interrupted indexation, skipping the '
+                          'chunks that were already indexed'),
+                    default=False),
+        make_option('--workers', action='store', type='int',
+                    help=('Index with this many local processes instead '
+                          'of celery tasks'),
+                    default=0),
     )
 
     def handle(self, *args, **kwargs):
@@ -189,20 +304,33 @@ class Command(BaseCommand):
         index_choice = kwargs.get('index', None)
         prefix = kwargs.get('prefix', '')
         force = kwargs.get('force', False)
+        resume = kwargs.get('resume', False)
+        workers = kwargs.get('workers', 0)
 
         if index_choice:
             # If we only want to reindex a subset of indexes.
             INDEXES = INDEX_DICT.get(index_choice, INDEXES)
 
-        if Reindexing.is_reindexing() and not force:
+        if Reindexing.is_reindexing() and not (force or resume):
             raise CommandError('Indexation already occuring - use --force to '
-                               'bypass')
+                               'bypass or --resume to resume it')
         elif force:
             Reindexing.unflag_reindexing()
 
+        summary = []
         for ALIAS, INDEXER, CHUNK_SIZE in INDEXES:
 
             chunks, total = chunk_indexing(INDEXER, CHUNK_SIZE)
+
+            reindexing = None
+            if resume:
+                reindexing = Reindexing.objects.filter(alias=ALIAS).first()
+            if reindexing:
+                chunks = [ids for ids in chunks
+                          if not reindexing.is_completed(ids)]
+                _print('Resuming indexation into {index}, {n} chunks left.'
+                       .format(index=reindexing.new_index, n=len(chunks)),
+                       ALIAS)
             if not total:
                 _print('No items to queue.', ALIAS)
             else:
@@ -218,8 +346,12 @@ class Command(BaseCommand):
                 aliases = []
             old_index = aliases[0] if aliases else None
 
-            # Create a new index, using the index name with a timestamp.
-            new_index = timestamp_index(prefix + ALIAS)
+            if reindexing:
+                # The index was created by the interrupted run.
+                new_index = reindexing.new_index
+            else:
+                # Create a new index, using the index name with a timestamp.
+                new_index = timestamp_index(prefix + ALIAS)
 
             # See how the index is currently configured.
             if old_index:
@@ -247,13 +379,36 @@ class Command(BaseCommand):
                 'refresh_interval': '5s'})
 
             # Ship it.
-            if not total:
-                # If there's no data we still create the index and alias.
-                chain(pre_task, post_task).apply_async()
-            else:
-                index_tasks = [run_indexing.si(new_index, INDEXER, chunk)
+            if workers:
+                if not reindexing:
+                    pre_task()
+                indexed, elapsed, failed = run_local_indexing(
+                    new_index, ALIAS, INDEXER, chunks, workers)
+                post_task()
+                summary.append((ALIAS, indexed, elapsed, failed))
+                continue
+
+            tasks = [] if reindexing else [pre_task]
+            if chunks:
+                index_tasks = [run_indexing.si(new_index, INDEXER, chunk,
+                                               alias=ALIAS)
                                for chunk in chunks]
-                chain(pre_task,
-                      chord(header=index_tasks, body=post_task)).apply_async()
-
-        _print('New index and indexing tasks all queued up.')
+                tasks.append(chord(header=index_tasks, body=post_task))
+            else:
+                # If there's no data we still create the index and alias.
+                tasks.append(post_task)
+            chain(*tasks).apply_async()
+
+        if not workers:
+            _print('New index and indexing tasks all queued up.')
+            return
+
+        for alias, indexed, elapsed, failed in summary:
+            _print('Indexed {n} documents in {s:.1f}s ({rate:.1f} docs/sec).'
+                   .format(n=indexed, s=elapsed,
+                           rate=indexed / elapsed if elapsed else 0), alias)
+            if failed:
+                _print('Failed to index {n} items: {ids}'.format(
+                    n=len(failed), ids=', '.join(map(str, sorted(failed)))),
+                    alias)
+        sys.stdout.write('\n')
@@ -1,6 +1,8 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 
+import json_field
+
 
 class Reindexing(models.Model):
     """Used to flag when an elasticsearch reindexing is occuring."""
@@ -8,6 +10,9 @@ class Reindexing(models.Model):
     alias = models.CharField(max_length=255)
     old_index = models.CharField(max_length=255, null=True)
     new_index = models.CharField(max_length=255)
+    # List of [first id, last id] ranges of objects already indexed into
+    # `new_index`, so that an interrupted reindexing can be resumed.
+    completed = json_field.JSONField(default=[], null=True)
 
     class Meta:
         db_table = 'zadmin_reindexing'
@@ -20,7 +25,7 @@ class Reindexing(models.Model):
     @classmethod
     def flag_reindexing(cls, alias, old_index, new_index):
         """Mark down that we are reindexing."""
-        if cls.is_reindexing():
+        if cls.objects.filter(alias=alias).exists():
             return  # Already flagged.
 
         return cls.objects.create(alias=alias, old_index=old_index,
@@ -47,3 +52,25 @@ class Reindexing(models.Model):
                     if idx is not None]
         except Reindexing.DoesNotExist:
             return [alias]
+
+    @classmethod
+    def checkpoint(cls, alias, ids):
+        """
+        Mark down that the objects with IDs in the range of `ids` have been
+        indexed for the reindexing of `alias`.
+        """
+        # Chunks are indexed concurrently, lock the row while updating it.
+        with transaction.commit_on_success():
+            try:
+                reindex = cls.objects.select_for_update().get(alias=alias)
+            except cls.DoesNotExist:
+                return
+            reindex.completed = (reindex.completed or []) + [
+                [min(ids), max(ids)]]
+            reindex.save()
+
+    def is_completed(self, ids):
+        """Return True if the objects matching `ids` were already indexed."""
+        first, last = min(ids), max(ids)
+        return any(start <= first and last <= end
+                   for start, end in self.completed or [])
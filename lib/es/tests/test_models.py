@@ -61,3 +61,27 @@ class TestReindexing(amo.tests.TestCase):
 
         # Doesn't clash on other aliases.
         self.assertSetEqual(Reindexing.get_indices('other'), ['other'])
+
+    def test_flag_reindexing_other_alias(self):
+        Reindexing.flag_reindexing('foo', 'bar', 'baz')
+        res = Reindexing.flag_reindexing('other', 'bar2', 'baz2')
+        eq_(res.alias, 'other')
+        eq_(Reindexing.objects.count(), 2)
+
+    def test_checkpoint(self):
+        Reindexing.objects.create(alias='foo', new_index='bar',
+                                  old_index='baz')
+        Reindexing.checkpoint('foo', [3, 1, 2])
+        Reindexing.checkpoint('foo', [10, 12])
+
+        reindexing = Reindexing.objects.get(alias='foo')
+        eq_(reindexing.completed, [[1, 3], [10, 12]])
+        assert reindexing.is_completed([1, 2, 3])
+        assert reindexing.is_completed([10, 11])
+        assert not reindexing.is_completed([3, 4])
+        assert not reindexing.is_completed([13])
+
+    def test_checkpoint_not_reindexing(self):
+        # Checkpointing an alias that isn't being reindexed does nothing.
+        Reindexing.checkpoint('foo', [1, 2])
+        assert not Reindexing.objects.exists()
@@ -0,0 +1,34 @@
+import mock
+from nose.tools import eq_
+
+import amo.tests
+from lib.es.management.commands.reindex import index_chunk
+from mkt.webapps.indexers import WebappIndexer
+
+
+class TestIndexChunk(amo.tests.TestCase):
+
+    def setUp(self):
+        self.indexer = mock.Mock()
+        self.indexer.iter_documents.return_value = iter([])
+
+    def test_failed_items(self):
+        self.indexer.streaming_bulk_index.return_value = [
+            (True, {'index': {'_id': '1'}}),
+            (False, {'index': {'_id': '2', 'error': 'MapperParsing'}}),
+            (True, {'index': {'_id': '3'}})]
+        eq_(index_chunk('index', self.indexer, [1, 2, 3]), (2, [2]))
+
+    def test_exception(self):
+        def results(*args, **kwargs):
+            yield True, {'index': {'_id': '1'}}
+            raise Exception('Connection refused')
+
+        self.indexer.streaming_bulk_index.side_effect = results
+        # What wasn't indexed before the exception is failed, for --resume.
+        eq_(index_chunk('index', self.indexer, [1, 2, 3]), (1, [2, 3]))
+
+    @mock.patch('mkt.search.indexers.helpers.streaming_bulk')
+    def test_errors_not_raised(self, streaming_bulk):
+        WebappIndexer.streaming_bulk_index([], es=mock.Mock(), index='index')
+        eq_(streaming_bulk.call_args[1]['raise_on_error'], False)
@@ -1,4 +1,13 @@
+import array
+import bisect
+import collections
+import csv
 import logging
+import os
+import socket
+import struct
+import threading
+import time
 
 import requests
 from django_statsd.clients import statsd
@@ -25,51 +34,199 @@ def is_public(ip):
     return True
 
 
+def ip_to_int(address):
+    """Returns the integer value of an IPv4 address, or None if invalid."""
+    try:
+        return struct.unpack('!I', socket.inet_aton(address))[0]
+    except (socket.error, TypeError):
+        return None
+
+
+class LRUCache(object):
+    """A thread-safe mapping of the `size` most recently used keys."""
+
+    def __init__(self, size):
+        self.size = size
+        self.items = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the value of `key`, or None."""
+        with self.lock:
+            try:
+                value = self.items.pop(key)
+            except KeyError:
+                return None
+            self.items[key] = value
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.items.pop(key, None)
+            self.items[key] = value
+            if len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+class GeoIPDatabase(object):
+    """Resolve IPv4 addresses to country codes from a local CSV file.
+
+    Each row is either "start ip,end ip,country code" or a row of the GeoLite
+    legacy country CSV: "start ip,end ip,start,end,country code,name". The
+    ranges are loaded into sorted arrays searched by bisection, and the file
+    is loaded again when it changes, checked at most every `check_interval`
+    seconds.
+
+    """
+
+    def __init__(self, path, cache_size=10000, check_interval=60):
+        self.path = path
+        self.check_interval = check_interval
+        self.cache = LRUCache(cache_size)
+        self.lock = threading.Lock()
+        self.table = None
+        self.mtime = None
+        self.checked = 0
+
+    def load(self):
+        """Load the ranges of the file, replacing the current ones."""
+        ranges = []
+        with open(self.path, 'rb') as f:
+            for row in csv.reader(f):
+                if len(row) < 3:
+                    continue
+                start, end = ip_to_int(row[0]), ip_to_int(row[1])
+                if start is None or end is None:
+                    # A header or a comment.
+                    continue
+                code = row[4] if len(row) >= 6 else row[2]
+                ranges.append((start, end, code.strip().lower()))
+        ranges.sort()
+
+        codes = sorted(set(code for start, end, code in ranges))
+        index = dict((code, i) for i, code in enumerate(codes))
+        self.table = (array.array('I', (r[0] for r in ranges)),
+                      array.array('I', (r[1] for r in ranges)),
+                      array.array('H', (index[r[2]] for r in ranges)),
+                      codes)
+        self.cache.clear()
+        log.info('Loaded {0} GeoIP ranges from {1}'.format(len(ranges),
+                                                          self.path))
+
+    def check(self):
+        """Load the file if it changed since it was last loaded."""
+        now = time.time()
+        if now - self.checked < self.check_interval:
+            return
+        with self.lock:
+            if now - self.checked < self.check_interval:
+                return
+            self.checked = now
+            try:
+                mtime = os.path.getmtime(self.path)
+                if mtime != self.mtime:
+                    self.load()
+                    self.mtime = mtime
+            except Exception:
+                # Keep the ranges we have, if any.
+                statsd.incr('z.geoip.local.load_error')
+                log.exception('Loading GeoIP ranges from {0} failed'
+                              .format(self.path))
+
+    def search(self, address):
+        """Returns the country code of `address`, without caching."""
+        ip = ip_to_int(address)
+        table = self.table
+        if ip is None or table is None:
+            return None
+        starts, ends, countries, codes = table
+        i = bisect.bisect_right(starts, ip) - 1
+        if i >= 0 and ip <= ends[i]:
+            return codes[countries[i]]
+        return None
+
+    def lookup(self, address):
+        """Returns the country code of `address`, or None if unknown."""
+        self.check()
+        code = self.cache.get(address)
+        if code is None:
+            # Unknown addresses are cached as well, as an empty string.
+            code = self.search(address) or ''
+            self.cache.set(address, code)
+        return code or None
+
+
 class GeoIP:
-    """Call to geodude server to resolve an IP to Geo Info block."""
+    """Resolve an IP to a country code from the local GeoIP database, falling
+    back to the geodude server."""
 
     def __init__(self, settings):
         self.timeout = float(getattr(settings, 'GEOIP_DEFAULT_TIMEOUT', .2))
         self.url = getattr(settings, 'GEOIP_URL', '')
         self.default_val = getattr(settings, 'GEOIP_DEFAULT_VAL',
                                    regions.RESTOFWORLD.slug).lower()
+        self.database = None
+        path = getattr(settings, 'GEOIP_DB_PATH', '')
+        if path:
+            self.database = GeoIPDatabase(
+                path,
+                cache_size=getattr(settings, 'GEOIP_CACHE_SIZE', 10000),
+                check_interval=getattr(settings, 'GEOIP_DB_CHECK_INTERVAL',
+                                       60))
 
     def lookup(self, address):
         """Resolve an IP address to a block of geo information.
 
-        If a given address is unresolvable or the geoip server is not defined,
-        return the default as defined by the settings, or "restofworld".
+        If a given address is unresolvable or neither the local database nor
+        the geoip server are defined, return the default as defined by the
+        settings, or "restofworld".
 
         """
-        public_ip = is_public(address)
-        if self.url and public_ip:
-            with statsd.timer('z.geoip'):
-                res = None
-                try:
-                    res = requests.post('{0}/country.json'.format(self.url),
-                                        timeout=self.timeout,
-                                        data={'ip': address})
-                except requests.Timeout:
-                    statsd.incr('z.geoip.timeout')
-                    log.error(('Geodude timed out looking up: {0}'
-                               .format(address)))
-                except requests.RequestException as e:
-                    statsd.incr('z.geoip.error')
-                    log.error('Geodude connection error: {0}'.format(str(e)))
-                if res and res.status_code == 200:
-                    statsd.incr('z.geoip.success')
-                    country_code = res.json().get('country_code',
-                        self.default_val).lower()
-                    log.info(('Geodude lookup for {0} returned {1}'
-                              .format(address, country_code)))
-                    return country_code
-                    log.info('Geodude lookup returned non-200 response: {0}'
-                             .format(res.status_code))
-        else:
-            if public_ip:
-                log.info('Geodude lookup skipped for public IP: {0}'
-                         .format(address))
-            else:
-                log.info('Geodude lookup skipped for private IP: {0}'
-                         .format(address))
+        if not is_public(address):
+            log.info('Geodude lookup skipped for private IP: {0}'
+                     .format(address))
+            return self.default_val
+
+        if self.database:
+            country_code = self.database.lookup(address)
+            if country_code:
+                statsd.incr('z.geoip.local.success')
+                return country_code
+            statsd.incr('z.geoip.local.miss')
+
+        if self.url:
+            return self.remote_lookup(address)
+
+        log.info('Geodude lookup skipped for public IP: {0}'.format(address))
+        return self.default_val
+
+    def remote_lookup(self, address):
+        """Resolve an IP address with the geodude server."""
+        with statsd.timer('z.geoip'):
+            res = None
+            try:
+                res = requests.post('{0}/country.json'.format(self.url),
+                                    timeout=self.timeout,
+                                    data={'ip': address})
+            except requests.Timeout:
+                statsd.incr('z.geoip.timeout')
+                log.error(('Geodude timed out looking up: {0}'
+                           .format(address)))
+            except requests.RequestException as e:
+                statsd.incr('z.geoip.error')
+                log.error('Geodude connection error: {0}'.format(str(e)))
+            if res and res.status_code == 200:
+                statsd.incr('z.geoip.success')
+                country_code = res.json().get('country_code',
+                    self.default_val).lower()
+                log.info(('Geodude lookup for {0} returned {1}'
+                          .format(address, country_code)))
+                return country_code
+            elif res is not None:
+                log.info('Geodude lookup returned non-200 response: {0}'
+                         .format(res.status_code))
         return self.default_val
@@ -1,3 +1,5 @@
+import os
+import tempfile
 from random import randint
 
 import mock
@@ -6,12 +8,22 @@ from nose.tools import eq_
 
 import amo.tests
 
-from lib.geoip import GeoIP
+from lib.geoip import GeoIP, GeoIPDatabase, LRUCache
 
 
-def generate_settings(url='', default='restofworld', timeout=0.2):
+def generate_settings(url='', default='restofworld', timeout=0.2,
+                      db_path=''):
     return mock.Mock(GEOIP_URL=url, GEOIP_DEFAULT_VAL=default,
-                     GEOIP_DEFAULT_TIMEOUT=timeout)
+                     GEOIP_DEFAULT_TIMEOUT=timeout, GEOIP_DB_PATH=db_path,
+                     GEOIP_CACHE_SIZE=100, GEOIP_DB_CHECK_INTERVAL=60)
+
+
+RANGES = '''\
+"start","end","country"
+"1.0.0.0","1.0.0.255","16777216","16777471","AU","Australia"
+2.0.0.0,2.0.0.255,FR
+2.0.1.0,2.0.1.255,DE
+'''
 
 
 class GeoIPTest(amo.tests.TestCase):
@@ -86,3 +98,86 @@ class GeoIPTest(amo.tests.TestCase):
             result = geoip.lookup(ip)
             assert not mock_post.called
             eq_(result, 'restofworld')
+
+
+class GeoIPDatabaseTest(amo.tests.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.csv')
+        os.write(fd, RANGES)
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+
+    def test_lookup(self):
+        database = GeoIPDatabase(self.path)
+        eq_(database.lookup('1.0.0.0'), 'au')
+        eq_(database.lookup('1.0.0.255'), 'au')
+        eq_(database.lookup('2.0.0.128'), 'fr')
+        eq_(database.lookup('2.0.1.0'), 'de')
+
+    def test_unknown(self):
+        database = GeoIPDatabase(self.path)
+        eq_(database.lookup('0.255.255.255'), None)
+        eq_(database.lookup('1.0.1.0'), None)
+        eq_(database.lookup('3.3.3.3'), None)
+        eq_(database.lookup('not an address'), None)
+
+    def test_missing_file(self):
+        eq_(GeoIPDatabase(self.path + '.missing').lookup('1.0.0.1'), None)
+
+    def test_reload(self):
+        database = GeoIPDatabase(self.path, check_interval=0)
+        eq_(database.lookup('3.3.3.3'), None)
+        with open(self.path, 'a') as f:
+            f.write('3.0.0.0,3.255.255.255,US\n')
+        mtime = os.path.getmtime(self.path) + 1
+        os.utime(self.path, (mtime, mtime))
+        eq_(database.lookup('3.3.3.3'), 'us')
+
+    def test_no_reload_before_interval(self):
+        database = GeoIPDatabase(self.path, check_interval=60)
+        database.lookup('1.0.0.1')
+        with mock.patch.object(database, 'load') as load:
+            database.lookup('1.0.0.1')
+        assert not load.called
+
+    def test_cached(self):
+        database = GeoIPDatabase(self.path)
+        eq_(database.lookup('2.0.0.1'), 'fr')
+        with mock.patch.object(database, 'search') as search:
+            eq_(database.lookup('2.0.0.1'), 'fr')
+        assert not search.called
+
+    @mock.patch('requests.post')
+    def test_geoip(self, mock_post):
+        geoip = GeoIP(generate_settings(url='localhost', db_path=self.path))
+        eq_(geoip.lookup('2.0.1.1'), 'de')
+        assert not mock_post.called
+
+    @mock.patch('requests.post')
+    def test_geoip_fallback(self, mock_post):
+        geoip = GeoIP(generate_settings(url='localhost', db_path=self.path))
+        mock_post.return_value = mock.Mock(status_code=200, json=lambda: {
+            'country_code': 'US',
+            'country_name': 'United States'
+        })
+        eq_(geoip.lookup('3.3.3.3'), 'us')
+        mock_post.assert_called_with('localhost/country.json', timeout=0.2,
+                                     data={'ip': '3.3.3.3'})
+
+    def test_geoip_no_url(self):
+        geoip = GeoIP(generate_settings(db_path=self.path))
+        eq_(geoip.lookup('3.3.3.3'), 'restofworld')
+
+
+class LRUCacheTest(amo.tests.TestCase):
+
+    def test_evict_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        eq_(cache.get('a'), 1)
+        cache.set('c', 3)
+        eq_(cache.get('b'), None)
+        eq_(cache.get('a'), 1)
+        eq_(cache.get('c'), 3)
@@ -229,12 +229,20 @@ function initQueue() {
     var addon_ids = $.map($('.addon-row'), function(el) {
             return $(el).attr('data-addon');
         });
+    // Only what changed since the response the token came with is sent.
+    var token = '';
     if(!(('localStorage' in window) && window.localStorage['dont_poll'])) {
         (function checkCurrentlyViewing() {
-            $.post(url, {'addon_ids': addon_ids.join(',')}, function(data) {
-                $('#addon-queue .locked').removeClass('locked')
-                                         .removeAttr('title');
-                $.each(data, function(k, v) {
+            $.post(url, {'addon_ids': addon_ids.join(','), 'token': token}, function(data) {
+                token = data.token;
+                if (data.reset) {
+                    $('#addon-queue .locked').removeClass('locked')
+                                             .removeAttr('title');
+                }
+                $.each(data.released, function(i, k) {
+                    $('#addon-' + k).removeClass('locked').removeAttr('title');
+                });
+                $.each(data.viewing, function(k, v) {
                     $('#addon-' + k).addClass('locked')
                                     .attr('title',
                                           format(gettext('{name} was viewing this add-on first.'),
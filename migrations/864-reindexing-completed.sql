@@ -0,0 +1,2 @@
+ALTER TABLE zadmin_reindexing
+    ADD COLUMN completed longtext;
@@ -191,17 +191,25 @@ class ESTranslationSerializerField(TranslationSerializerField):
             target_name = source_name
         target_key = '%s%s' % (target_name, cls.suffix)
         source_key = '%s%s' % (source_name, cls.suffix)
-        setattr(obj, target_key, dict((v.get('lang', ''), v.get('string', ''))
-                                      for v in data.get(source_key, {}) or {}))
+        setattr(obj, target_key, cls.get_translations(data, source_key))
+
+    @staticmethod
+    def get_translations(data, key):
+        """Returns the translations stored in ES under `key` as a dict."""
+        return dict((v.get('lang', ''), v.get('string', ''))
+                    for v in data.get(key, {}) or {})
 
     def fetch_all_translations(self, obj, source, field):
         return field or None
 
     def fetch_single_translation(self, obj, source, field):
-        translations = self.fetch_all_translations(obj, source, field) or {}
+        return self.select_translation(
+            self.fetch_all_translations(obj, source, field) or {},
+            getattr(obj, 'default_locale', None))
 
+    def select_translation(self, translations, default_locale):
         return (translations.get(self.requested_language) or
-                translations.get(getattr(obj, 'default_locale', None)) or
+                translations.get(default_locale) or
                 translations.get(settings.LANGUAGE_CODE) or None)
 
     def field_to_native(self, obj, field_name):
@@ -210,6 +218,24 @@ class ESTranslationSerializerField(TranslationSerializerField):
         return super(ESTranslationSerializerField, self).field_to_native(obj,
             field_name)
 
+    def es_source_key(self, field_name):
+        """Returns the ES key holding the translations of the field."""
+        if self.source:
+            return self.source.split('.')[-1]
+        return '%s%s' % (field_name, self.suffix)
+
+    def es_field_to_native(self, data, field_name):
+        """
+        Like `field_to_native`, but straight from the ES document `data`
+        instead of the translations attached to a fake instance.
+        """
+        translations = self.get_translations(
+            data, self.es_source_key(field_name))
+        if self.requested_language:
+            return self.select_translation(translations,
+                                           data.get('default_locale'))
+        return translations or None
+
 
 class SplitField(fields.Field):
     """
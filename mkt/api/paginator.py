@@ -43,6 +43,11 @@ class ESPaginator(Paginator):
         top = bottom + self.per_page
         page = Page(self.object_list[bottom:top], number, self)
 
+        if not hasattr(page.object_list, 'execute'):
+            # Results that were already fetched, e.g. from a cache.
+            self._count = len(self.object_list)
+            return page
+
         # Force the search to evaluate and then attach the count. We want to
         # avoid an extra useless query even if there are no results, so we
         # directly fetch the count from hits.
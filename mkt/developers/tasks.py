@@ -272,11 +272,20 @@ def get_preview_sizes(ids, **kw):
                           % (addon.pk, err))
 
 
-def _fetch_content(url):
+def _fetch_content(url, headers=None):
+    """
+    Fetch `url`. With conditional `headers`, like If-None-Match, a 304 Not
+    Modified response is returned as well.
+    """
     with statsd.timer('developers.tasks.fetch_content'):
         try:
             res = requests.get(url, timeout=30, stream=True,
-                               headers=REQUESTS_HEADERS)
+                               headers=dict(REQUESTS_HEADERS,
+                                            **(headers or {})))
+
+            if headers and res.status_code == 304:
+                statsd.incr('developers.tasks.fetch_content.not_modified')
+                return res
 
             if not 200 <= res.status_code < 300:
                 statsd.incr('developers.tasks.fetch_content.error')
@@ -412,7 +421,19 @@ def failed_validation(*messages, **kwargs):
                        'prelim': True})
 
 
-def _fetch_manifest(url, upload=None):
+class ManifestNotModified(Exception):
+    """The manifest didn't change since it was last fetched."""
+
+
+def _fetch_manifest(url, upload=None, validators=None):
+    """
+    Fetch and check the manifest at `url`.
+
+    If `validators` is given, a dict of the `etag` and `last_modified` of the
+    last fetch, the request is conditional and `ManifestNotModified` is raised
+    if the manifest didn't change. The dict is updated with the ones of the
+    response.
+    """
     def fail(message, upload=None):
         if upload is None:
             # If `upload` is None, that means we're using one of @washort's old
@@ -420,14 +441,28 @@ def _fetch_manifest(url, upload=None):
             raise Exception(message)
         upload.update(validation=failed_validation(message, upload=upload))
 
+    headers = {}
+    if validators:
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+
     try:
-        response = _fetch_content(url)
+        response = _fetch_content(url, headers=headers)
     except Exception, e:
         log.error('Failed to fetch manifest from %r: %s' % (url, e))
         fail(_('No manifest was found at that URL. Check the address and try '
                'again.'), upload=upload)
         return
 
+    if response.status_code == 304:
+        raise ManifestNotModified()
+    if validators is not None:
+        validators.clear()
+        validators.update(etag=response.headers.get('etag'),
+                          last_modified=response.headers.get('last-modified'))
+
     ct = response.headers.get('content-type', '')
     if not ct.startswith('application/x-web-app-manifest+json'):
         fail(_('Manifests must be served with the HTTP header '
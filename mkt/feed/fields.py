@@ -46,9 +46,8 @@ class AppESField(serializers.Field):
         'discoplace': FeedDiscoPlaceESAppSerializer
     }
 
-    @property
-    def serializer_class(self):
-        request = self.context['request']
+    @classmethod
+    def get_serializer_class(cls, request):
         app_serializer = request.GET.get('app_serializer')
 
         # TODO: remove once fireplace is using
@@ -56,7 +55,11 @@ class AppESField(serializers.Field):
         if app_serializer is None and '/fireplace/' in request.path:
             app_serializer = 'fireplace'
 
-        return self.app_serializer_classes.get(app_serializer, ESAppSerializer)
+        return cls.app_serializer_classes.get(app_serializer, ESAppSerializer)
+
+    @property
+    def serializer_class(self):
+        return self.get_serializer_class(self.context['request'])
 
     def __init__(self, *args, **kwargs):
         self.many = kwargs.pop('many', False)
@@ -128,8 +131,8 @@ class AppESHomeField(AppESField):
     ESAppSerializer. For a slimmer homepage since apps/brands only need
     enough to render the market tile.
     """
-    @property
-    def serializer_class(self):
+    @classmethod
+    def get_serializer_class(cls, request):
         return ESAppFeedSerializer
 
 
@@ -139,11 +142,27 @@ class AppESHomePromoCollectionField(AppESField):
     ESAppSerializer. For a slimmer homepage since collection/shelves only
     need icons.
     """
-    @property
-    def serializer_class(self):
+    @classmethod
+    def get_serializer_class(cls, request):
         return ESAppFeedCollectionSerializer
 
 
+def get_app_source_fields(request):
+    """
+    Returns the ES source fields needed to serialize apps with any of the app
+    fields above, or None if the whole documents are needed.
+    """
+    source = set()
+    for field_class in (AppESField, AppESHomeField,
+                        AppESHomePromoCollectionField):
+        fields = field_class.get_serializer_class(
+            request).get_es_source_fields()
+        if fields is None:
+            return None
+        source.update(fields)
+    return sorted(source)
+
+
 class ImageURLField(serializers.Field):
     """
     Takes a URL pointing to an image (intended to be from Aviary's Feather).
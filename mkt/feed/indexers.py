@@ -2,6 +2,10 @@
 Indexers for FeedApp, FeedBrand, FeedCollection, FeedShelf, FeedItem for
 feed homepage and curation tool search.
 """
+import time
+
+from django.core.cache import cache
+
 import mkt.carriers
 import mkt.feed.constants as feed
 import mkt.regions
@@ -11,6 +15,38 @@ from mkt.translations.utils import format_translation_es
 from mkt.webapps.models import Webapp
 
 
+FEED_SNAPSHOT_GENERATION_KEY = 'feed:snapshot-generation'
+
+
+def get_feed_snapshot_generation():
+    """
+    Returns the generation of the feed snapshots. Snapshots built for an older
+    generation are stale.
+    """
+    return cache.get(FEED_SNAPSHOT_GENERATION_KEY) or 0
+
+
+def invalidate_feed_snapshots():
+    """Makes every feed snapshot stale, they are rebuilt when next needed."""
+    try:
+        cache.incr(FEED_SNAPSHOT_GENERATION_KEY)
+    except ValueError:
+        # Start from the time rather than from 1: if the key was evicted,
+        # snapshots of the first generations could still be cached.
+        cache.set(FEED_SNAPSHOT_GENERATION_KEY, int(time.time()), None)
+
+
+class BaseFeedIndexer(BaseIndexer):
+    @classmethod
+    def indexed(cls, ids, es=None):
+        """
+        The feed snapshots are built from the feed indices, make sure the new
+        documents are searchable before invalidating them.
+        """
+        cls.refresh_index(es=es)
+        invalidate_feed_snapshots()
+
+
 def get_slug_multifield():
     # TODO: convert to new syntax on ES 1.0+.
     return {
@@ -22,7 +58,7 @@ def get_slug_multifield():
     }
 
 
-class FeedAppIndexer(BaseIndexer):
+class FeedAppIndexer(BaseFeedIndexer):
     @classmethod
     def get_model(cls):
         """Returns the Django model this MappingType relates to"""
@@ -95,7 +131,7 @@ class FeedAppIndexer(BaseIndexer):
         return doc
 
 
-class FeedBrandIndexer(BaseIndexer):
+class FeedBrandIndexer(BaseFeedIndexer):
     @classmethod
     def get_model(cls):
         from mkt.feed.models import FeedBrand
@@ -135,7 +171,7 @@ class FeedBrandIndexer(BaseIndexer):
         }
 
 
-class FeedCollectionIndexer(BaseIndexer):
+class FeedCollectionIndexer(BaseFeedIndexer):
     @classmethod
     def get_model(cls):
         from mkt.feed.models import FeedCollection
@@ -211,7 +247,7 @@ class FeedCollectionIndexer(BaseIndexer):
         return doc
 
 
-class FeedShelfIndexer(BaseIndexer):
+class FeedShelfIndexer(BaseFeedIndexer):
     @classmethod
     def get_model(cls):
         from mkt.feed.models import FeedShelf
@@ -270,7 +306,7 @@ class FeedShelfIndexer(BaseIndexer):
         return doc
 
 
-class FeedItemIndexer(BaseIndexer):
+class FeedItemIndexer(BaseFeedIndexer):
     @classmethod
     def get_model(cls):
         from mkt.feed.models import FeedItem
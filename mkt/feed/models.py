@@ -439,7 +439,9 @@ def update_search_index(sender, instance, **kw):
 @receiver(models.signals.post_delete, sender=FeedItem,
           dispatch_uid='feeditem.search.unindex')
 def delete_search_index(sender, instance, **kw):
-    instance.get_indexer().unindex(instance.id)
+    indexer = instance.get_indexer()
+    indexer.unindex(instance.id)
+    indexer.indexed([instance.id])
 
 
 # Save translations when saving instance with translated fields.
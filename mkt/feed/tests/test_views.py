@@ -2,7 +2,9 @@
 import json
 import os
 
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
+from django.test.utils import override_settings
 from django.utils.text import slugify
 
 import mock
@@ -1268,6 +1270,30 @@ class TestFeedView(BaseTestFeedESView, BaseTestFeedItemViewSet):
         res, data = self._get(self.client, no_assert_queries=True)
         eq_(res.status_code, 404)
 
+    @override_settings(CACHE_FEED_SNAPSHOT_TIMEOUT=60)
+    @mock.patch('mkt.feed.views.FeedView.build_feed_snapshot')
+    def test_snapshot_cached(self, build_mock):
+        cache.clear()
+        build_mock.return_value = {
+            'feed_items': [],
+            'feed_elements': dict((item_type, {})
+                                  for item_type in FeedView.INDICES)}
+        self._get()
+        res, data = self._get()
+        eq_(res.status_code, 404)
+        eq_(build_mock.call_count, 1)
+
+    @override_settings(CACHE_FEED_SNAPSHOT_TIMEOUT=60)
+    def test_snapshot_invalidated(self):
+        cache.clear()
+        self.feed_item_factory()
+        res, data = self._get()
+        eq_(len(data['objects']), 1)
+
+        self.feed_item_factory()
+        res, data = self._get()
+        eq_(len(data['objects']), 2)
+
     def test_region_only(self):
         feed_items = self.feed_factory()
         res, data = self._get(carrier=None)
@@ -1,4 +1,5 @@
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.storage import default_storage as storage
 from django.db.models import Q
 
@@ -6,6 +7,7 @@ from django_statsd.clients import statsd
 from elasticsearch_dsl import filter as es_filter
 from elasticsearch_dsl import function as es_function
 from elasticsearch_dsl import query, Search
+from elasticsearch_dsl.utils import AttrDict
 from PIL import Image
 from rest_framework import generics, response, status, viewsets
 from rest_framework.exceptions import ParseError
@@ -23,13 +25,13 @@ from mkt.api.paginator import ESPaginator
 from mkt.collections.views import CollectionImageViewSet
 from mkt.constants.applications import DEVICE_LOOKUP
 from mkt.developers.tasks import pngcrush_image
-from mkt.feed.indexers import FeedItemIndexer
+from mkt.feed.indexers import FeedItemIndexer, get_feed_snapshot_generation
 from mkt.operators.authorization import OperatorShelfAuthorization
 from mkt.webapps.indexers import WebappIndexer
 from mkt.webapps.models import Webapp
 
 from .authorization import FeedAuthorization
-from .fields import ImageURLField
+from .fields import get_app_source_fields, ImageURLField
 from .models import FeedApp, FeedBrand, FeedCollection, FeedItem, FeedShelf
 from .serializers import (FeedAppESSerializer, FeedAppSerializer,
                           FeedBrandESSerializer, FeedBrandSerializer,
@@ -426,16 +428,17 @@ class BaseFeedESView(CORSMixin, APIView):
         Takes a list of app_ids. Gets the apps, including filters.
         Returns an app_map for serializer context.
         """
+        sq = WebappIndexer.search(source=get_app_source_fields(request))
         if request.QUERY_PARAMS.get('filtering', '1') == '0':
             # Without filtering.
-            sq = WebappIndexer.search().filter(es_filter.Bool(
+            sq = sq.filter(es_filter.Bool(
                 should=[es_filter.Terms(id=app_ids)]
             ))[0:len(app_ids)]
         else:
             # With filtering.
             sq = WebappIndexer.get_app_filter(request, {
                 'device': self._get_device(request)
-            }, app_ids=app_ids)
+            }, sq=sq, app_ids=app_ids)
 
         # Store the apps to attach to feed elements later.
         apps = sq.execute().hits
@@ -549,15 +552,17 @@ class FeedElementSearchView(BaseFeedESView):
 
 class FeedView(MarketplaceView, BaseFeedESView, generics.GenericAPIView):
     """
-    THE feed view. It hits ES with:
-    - a weighted function score query to get feed items
-    - a filter to deserialize feed elements
+    THE feed view. The feed items and their feed elements of each region and
+    carrier are fetched from a snapshot, see `get_feed_snapshot`, leaving to
+    ES:
     - a filter to deserialize apps
     """
     authentication_classes = []
     cors_allowed_methods = ('get',)
     paginator_class = ESPaginator
     permission_classes = []
+    # Number of feed items fetched at once when building a snapshot.
+    snapshot_size = 100
 
     def get_es_feed_query(self, sq, region=mkt.regions.RESTOFWORLD.id,
                           carrier=None, original_region=None):
@@ -620,6 +625,58 @@ class FeedView(MarketplaceView, BaseFeedESView, generics.GenericAPIView):
 
         return sq.filter(es_filter.Bool(should=filters))[0:len(feed_items)]
 
+    def get_feed_snapshot(self, region, carrier=None, original_region=None):
+        """
+        Return the snapshot of the feed of a region and carrier, building it
+        if it isn't cached yet.
+
+        The snapshots are invalidated whenever a feed item or feed element is
+        indexed, see `BaseFeedIndexer.indexed`.
+        """
+        if not settings.CACHE_FEED_SNAPSHOT_TIMEOUT:
+            return self.build_feed_snapshot(region, carrier, original_region)
+        if carrier is None:
+            # The original region only matters for the operator shelves.
+            original_region = None
+        key = 'feed:snapshot:%s:%s:%s:%s' % (
+            get_feed_snapshot_generation(), region, carrier, original_region)
+        snapshot = cache.get(key)
+        if snapshot is None:
+            statsd.incr('mkt.feed.snapshot.miss')
+            snapshot = self.build_feed_snapshot(region, carrier,
+                                                original_region)
+            cache.set(key, snapshot, settings.CACHE_FEED_SNAPSHOT_TIMEOUT)
+        return snapshot
+
+    def build_feed_snapshot(self, region, carrier=None, original_region=None):
+        """
+        Fetch all the feed items of a region and carrier, in order, and their
+        feed elements.
+
+        The apps are left out: they are filtered for each device and feature
+        profile when the feed is requested.
+        """
+        es = FeedItemIndexer.get_es()
+        sq = self.get_es_feed_query(FeedItemIndexer.search(using=es),
+                                    region=region, carrier=carrier,
+                                    original_region=original_region)
+        hits = sq[0:self.snapshot_size].execute().hits
+        if hits.total > len(hits):
+            hits = sq[0:hits.total].execute().hits
+        # Keep the plain ES documents, they are what gets cached.
+        feed_items = [hit._d_ for hit in hits]
+
+        feed_elements = dict((item_type, {}) for item_type in self.INDICES)
+        if feed_items:
+            sq = self.get_es_feed_element_query(
+                Search(using=es, index=self.get_feed_element_index()),
+                feed_items)
+            for feed_elm in sq.execute().hits:
+                feed_elements[feed_elm['item_type']][feed_elm['id']] = (
+                    feed_elm._d_)
+
+        return {'feed_items': feed_items, 'feed_elements': feed_elements}
+
     def _check_empty_feed(self, items, rest_of_world):
         """
         Return -1 if feed is empty and we are already falling back to RoW.
@@ -647,8 +704,6 @@ class FeedView(MarketplaceView, BaseFeedESView, generics.GenericAPIView):
 
     def _get(self, request, rest_of_world=False, original_region=None,
              *args, **kwargs):
-        es = FeedItemIndexer.get_es()
-
         # Parse region.
         if rest_of_world:
             region = mkt.regions.RESTOFWORLD.id
@@ -661,10 +716,9 @@ class FeedView(MarketplaceView, BaseFeedESView, generics.GenericAPIView):
             carrier = mkt.carriers.CARRIER_MAP[q['carrier']].id
 
         # Fetch FeedItems.
-        sq = self.get_es_feed_query(FeedItemIndexer.search(using=es),
-                                    region=region, carrier=carrier,
-                                    original_region=original_region)
-        feed_items = self.paginate_queryset(sq)
+        snapshot = self.get_feed_snapshot(region, carrier=carrier,
+                                          original_region=original_region)
+        feed_items = self.paginate_queryset(snapshot['feed_items'])
         feed_ok = self._check_empty_feed(feed_items, rest_of_world)
         if feed_ok != 1:
             return self._handle_empty_feed(feed_ok, region, request, args,
@@ -682,13 +736,16 @@ class FeedView(MarketplaceView, BaseFeedESView, generics.GenericAPIView):
             feed.FEED_TYPE_SHELF: {},
         }
 
-        # Fetch feed elements to attach to FeedItems later.
+        # Attach the feed elements of the snapshot to the FeedItems.
         apps = []
-        sq = self.get_es_feed_element_query(
-            Search(using=es, index=self.get_feed_element_index()), feed_items)
-        for feed_elm in sq.execute().hits:
-            # Store the feed elements to attach to FeedItems later.
-            feed_element_map[feed_elm['item_type']][feed_elm['id']] = feed_elm
+        for feed_item in feed_items:
+            item_type = feed_item['item_type']
+            feed_elm = snapshot['feed_elements'][item_type].get(
+                feed_item[item_type])
+            if feed_elm is None:
+                continue
+            feed_elm = AttrDict(feed_elm)
+            feed_element_map[item_type][feed_elm['id']] = feed_elm
             # Store the apps to retrieve later.
             apps += self.get_app_ids(feed_elm)
 
@@ -8,6 +8,9 @@ class BaseFireplaceAppSerializer(object):
         # Fireplace only requires 64px-sized icons.
         return {64: app.get_icon_url(64)}
 
+    def es_icons(self, data):
+        return {64: self.es_icon_url(data, 64)}
+
 
 class FireplaceAppSerializer(BaseFireplaceAppSerializer, SimpleAppSerializer):
 
@@ -34,6 +37,9 @@ class FireplaceESAppSerializer(BaseFireplaceAppSerializer,
         # Fireplace search should always be anonymous for extra-cacheability.
         return None
 
+    def es_user(self, data):
+        return None
+
 
 class FeedFireplaceESAppSerializer(BaseFireplaceAppSerializer,
                                    SimpleESAppSerializer):
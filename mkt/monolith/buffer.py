@@ -0,0 +1,189 @@
+"""
+Buffering of the MonolithRecord rows written by `record_stat`.
+
+The records are queued in memory and written with a single `bulk_create` once
+`MONOLITH_BUFFER_SIZE` of them are queued, or once the oldest one is
+`MONOLITH_BUFFER_WINDOW` seconds old.
+
+If `MONOLITH_SPOOL_DIR` is set, every queued record is also appended to a
+spool file of the process, which is truncated once the records are written.
+The spool files left behind by dead processes are written by the next process
+to flush, so records are written at least once across worker restarts. The
+files are named by pid and a random nonce: a process that is given the pid of
+a dead one never appends to, or truncates, the file of the dead process.
+
+Without a spool directory nothing would survive a killed or recycled process,
+so the queue is written at the end of every request and task instead: the
+records of a request are still written by a single query.
+"""
+import atexit
+import datetime
+import errno
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.signals import request_finished
+
+from celery.signals import task_postrun
+from django_statsd.clients import statsd
+
+from .models import MonolithRecord
+
+
+log = logging.getLogger('z.monolith')
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+def serialize_record(record):
+    return json.dumps({'key': record.key,
+                       'recorded': record.recorded.strftime(DATE_FORMAT),
+                       'user_hash': record.user_hash,
+                       'value': record.value})
+
+
+def deserialize_record(line):
+    data = json.loads(line)
+    data['recorded'] = datetime.datetime.strptime(data['recorded'],
+                                                  DATE_FORMAT)
+    return MonolithRecord(**data)
+
+
+def is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno != errno.ESRCH
+    return True
+
+
+class RecordBuffer(object):
+    """An in-process queue of MonolithRecord to write in bulk."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self.spool_id = None
+        self.records = []
+        self.started = None
+        self.spool = None
+
+    def _check_pid(self):
+        """Start over with an empty buffer in a forked process."""
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.spool_id = '%s-%s' % (self.pid, uuid.uuid4().hex)
+            self.records = []
+            self.spool = None
+
+    def get_spool_path(self, spool_id):
+        return os.path.join(settings.MONOLITH_SPOOL_DIR,
+                            'monolith-%s.spool' % spool_id)
+
+    def add(self, record):
+        """Queue a record, and write the queue if it is full."""
+        with self.lock:
+            self._check_pid()
+            if not self.records:
+                self.started = time.time()
+            self.records.append(record)
+            if settings.MONOLITH_SPOOL_DIR:
+                if self.spool is None:
+                    if not os.path.isdir(settings.MONOLITH_SPOOL_DIR):
+                        try:
+                            os.makedirs(settings.MONOLITH_SPOOL_DIR)
+                        except OSError as e:
+                            # Made by another process in the meantime.
+                            if e.errno != errno.EEXIST:
+                                raise
+                    self.spool = open(self.get_spool_path(self.spool_id), 'a')
+                self.spool.write(serialize_record(record) + '\n')
+                self.spool.flush()
+            full = len(self.records) >= settings.MONOLITH_BUFFER_SIZE
+        if full:
+            self.flush()
+
+    def flush_if_due(self, **kwargs):
+        """
+        Write the queue if its oldest record is old enough, or right away if
+        the records are not spooled.
+        """
+        with self.lock:
+            due = (self.records and self.pid == os.getpid() and
+                   (not settings.MONOLITH_SPOOL_DIR or
+                    time.time() - self.started >=
+                    settings.MONOLITH_BUFFER_WINDOW))
+        if due:
+            self.flush()
+
+    def flush(self, **kwargs):
+        """Write all the queued records, and those of dead processes."""
+        with self.lock:
+            self._check_pid()
+            records = self.records
+            if records:
+                try:
+                    MonolithRecord.objects.bulk_create(records)
+                except Exception:
+                    # Keep them for the next flush.
+                    log.exception('Writing %s monolith records failed.'
+                                  % len(records))
+                    return
+                statsd.timing('monolith.buffer.batch_size', len(records))
+                statsd.timing('monolith.buffer.latency',
+                              int((time.time() - self.started) * 1000))
+                self.records = []
+                if self.spool is not None:
+                    self.spool.truncate(0)
+
+            if settings.MONOLITH_SPOOL_DIR:
+                self.recover()
+
+    def recover(self):
+        """Write the records left in the spool files of dead processes."""
+        for path in glob.glob(self.get_spool_path('*') + '*'):
+            # The file of a process, "monolith-<pid>-<nonce>.spool", or a
+            # file that a process claimed,
+            # "monolith-<pid>-<nonce>.spool.<claiming pid>". If the pid was
+            # given to another process, the file waits for it to exit.
+            parts = os.path.basename(path).split('-', 1)[-1].split('.')
+            owner = parts[-1] if len(parts) == 3 else parts[0].split('-')[0]
+            if not owner.isdigit() or is_running(int(owner)):
+                continue
+            # Claim the file so only one process writes its records.
+            claimed = '%s.%s' % (self.get_spool_path(parts[0]), self.pid)
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue
+            with open(claimed) as spool:
+                records = [deserialize_record(line) for line in spool
+                           if line.strip()]
+            try:
+                MonolithRecord.objects.bulk_create(records)
+            except Exception:
+                log.exception('Recovering monolith records of %s failed.'
+                              % path)
+                continue
+            log.info('Recovered %s monolith records of %s.'
+                     % (len(records), path))
+            statsd.incr('monolith.buffer.recovered', len(records))
+            os.remove(claimed)
+
+
+record_buffer = RecordBuffer()
+
+
+# Check the queue when a request or a task is finished, and write what is left
+# when the process exits.
+request_finished.connect(record_buffer.flush_if_due,
+                         dispatch_uid='request_finished_monolith_buffer')
+task_postrun.connect(record_buffer.flush_if_due,
+                     dispatch_uid='tasks_finished_monolith_buffer')
+atexit.register(record_buffer.flush)
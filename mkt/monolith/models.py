@@ -46,7 +46,12 @@ def record_stat(key, request, **data):
     :para: data:
         The data you want to store. You can pass the data to this function as
         named arguments.
+
+    The record is queued and written later along with others, see
+    `mkt.monolith.buffer`.
     """
+    from .buffer import record_buffer
+
     if '__recorded' in data:
         recorded = data.pop('__recorded')
     else:
@@ -57,5 +62,5 @@ def record_stat(key, request, **data):
 
     record = MonolithRecord(key=key, user_hash=get_user_hash(request),
                             recorded=recorded, value=json.dumps(data))
-    record.save()
+    record_buffer.add(record)
     return record
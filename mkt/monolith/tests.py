@@ -1,5 +1,8 @@
 import datetime
 import json
+import os
+import shutil
+import tempfile
 import uuid
 from collections import namedtuple
 
@@ -8,13 +11,17 @@ from nose.tools import eq_, ok_
 
 from django.core.urlresolvers import reverse
 from django.test import client
+from django.test.utils import override_settings
 
-from amo.tests import TestCase
+from amo.tests import app_factory, TestCase
 from mkt.api.tests.test_oauth import RestOAuth
+from mkt.ratings.models import Review
 from mkt.site.fixtures import fixture
+from mkt.users.models import UserProfile
 
+from .buffer import RecordBuffer, serialize_record
 from .models import MonolithRecord, record_stat
-from .views import daterange
+from .views import _get_query_result, daterange
 
 
 class RequestFactory(client.RequestFactory):
@@ -66,6 +73,118 @@ class TestModels(TestCase):
             record_stat('app.install', self.request)
 
 
+class TestRecordBuffer(TestCase):
+
+    def setUp(self):
+        self.buffer = RecordBuffer()
+        self.spool_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.spool_dir)
+
+    def record(self, value):
+        return MonolithRecord(key='app.install', user_hash='a',
+                              recorded=datetime.datetime(2013, 2, 12, 17, 34),
+                              value=json.dumps({'value': value}))
+
+    @override_settings(MONOLITH_BUFFER_SIZE=3)
+    def test_flush_when_full(self):
+        self.buffer.add(self.record(1))
+        self.buffer.add(self.record(2))
+        eq_(MonolithRecord.objects.count(), 0)
+        with self.assertNumQueries(1):
+            self.buffer.add(self.record(3))
+        eq_(sorted(r.value for r in MonolithRecord.objects.all()),
+            [json.dumps({'value': value}) for value in (1, 2, 3)])
+        eq_(self.buffer.records, [])
+
+    @mock.patch('mkt.monolith.buffer.is_running')
+    def test_flush_when_old(self, is_running):
+        is_running.return_value = True
+        with self.settings(MONOLITH_BUFFER_SIZE=10, MONOLITH_BUFFER_WINDOW=10,
+                           MONOLITH_SPOOL_DIR=self.spool_dir):
+            self.buffer.add(self.record(1))
+            self.buffer.flush_if_due()
+            eq_(MonolithRecord.objects.count(), 0)
+            self.buffer.started -= 10
+            self.buffer.flush_if_due()
+        eq_(MonolithRecord.objects.count(), 1)
+
+    @override_settings(MONOLITH_BUFFER_SIZE=10, MONOLITH_SPOOL_DIR=None)
+    def test_flush_at_request_end_without_spool(self):
+        self.buffer.add(self.record(1))
+        self.buffer.add(self.record(2))
+        eq_(MonolithRecord.objects.count(), 0)
+        with self.assertNumQueries(1):
+            self.buffer.flush_if_due()
+        eq_(MonolithRecord.objects.count(), 2)
+        eq_(self.buffer.records, [])
+
+    @mock.patch('mkt.monolith.buffer.MonolithRecord.objects.bulk_create')
+    def test_flush_failed(self, bulk_create):
+        bulk_create.side_effect = Exception
+        self.buffer.add(self.record(1))
+        eq_(len(self.buffer.records), 1)
+
+    @mock.patch('mkt.monolith.buffer.is_running')
+    def test_spool(self, is_running):
+        is_running.return_value = True
+        with self.settings(MONOLITH_BUFFER_SIZE=10,
+                           MONOLITH_SPOOL_DIR=self.spool_dir):
+            self.buffer.add(self.record(1))
+            spool = self.buffer.get_spool_path(self.buffer.spool_id)
+            eq_(len(open(spool).readlines()), 1)
+            self.buffer.flush()
+            eq_(open(spool).read(), '')
+
+    @mock.patch('mkt.monolith.buffer.is_running')
+    def test_spool_dir_created(self, is_running):
+        is_running.return_value = True
+        spool_dir = os.path.join(self.spool_dir, 'monolith')
+        with self.settings(MONOLITH_BUFFER_SIZE=10,
+                           MONOLITH_SPOOL_DIR=spool_dir):
+            self.buffer.add(self.record(1))
+            ok_(os.path.exists(
+                self.buffer.get_spool_path(self.buffer.spool_id)))
+
+    @mock.patch('mkt.monolith.buffer.is_running')
+    def test_recover(self, is_running):
+        is_running.return_value = False
+        with self.settings(MONOLITH_BUFFER_SIZE=10,
+                           MONOLITH_SPOOL_DIR=self.spool_dir):
+            self.buffer.add(self.record(1))
+            # The records of a process that died before writing them.
+            os.rename(self.buffer.get_spool_path(self.buffer.spool_id),
+                      self.buffer.get_spool_path('12345-abc'))
+            self.buffer.records = []
+            self.buffer.flush()
+        record = MonolithRecord.objects.get()
+        eq_(record.value, json.dumps({'value': 1}))
+        eq_(record.recorded, datetime.datetime(2013, 2, 12, 17, 34))
+        eq_(os.listdir(self.spool_dir), [])
+
+    @mock.patch('mkt.monolith.buffer.is_running')
+    def test_recover_reused_pid(self, is_running):
+        with self.settings(MONOLITH_BUFFER_SIZE=10,
+                           MONOLITH_SPOOL_DIR=self.spool_dir):
+            # The records of a dead process whose pid we were given.
+            dead = self.buffer.get_spool_path('%s-dead' % os.getpid())
+            with open(dead, 'w') as spool:
+                spool.write(serialize_record(self.record(1)) + '\n')
+            is_running.return_value = True
+            self.buffer.add(self.record(2))
+            self.buffer.flush()
+            eq_(len(open(dead).readlines()), 1)
+            eq_([r.value for r in MonolithRecord.objects.all()],
+                [json.dumps({'value': 2})])
+            # Once we exit, the next process writes them.
+            is_running.return_value = False
+            RecordBuffer().flush()
+        eq_(sorted(r.value for r in MonolithRecord.objects.all()),
+            [json.dumps({'value': value}) for value in (1, 2)])
+        ok_(not os.path.exists(dead))
+
+
 class TestMonolithResource(RestOAuth):
     fixtures = fixture('user_2519')
 
@@ -226,3 +345,75 @@ class TestDateRange(TestCase):
         eq_(len(range), 7)
         eq_(range[0], self.week_ago)
         ok_(self.today not in range)
+
+
+class TestQueryResult(TestCase):
+
+    def setUp(self):
+        self.app1 = app_factory()
+        self.app2 = app_factory()
+        self.day = datetime.date(2013, 2, 12)
+
+    def review(self, app, rating, days):
+        user = UserProfile.objects.create()
+        review = Review.objects.create(addon=app, user=user, rating=rating)
+        review.update(created=datetime.datetime(2013, 2, 12, 17, 34) +
+                      datetime.timedelta(days=days))
+
+    def results(self, key, start, end):
+        return [(r['recorded'], r['value']['app-id'], r['value']['count'])
+                for r in _get_query_result(key, start, end)]
+
+    def test_slice(self):
+        self.review(self.app1, 5, -1)
+        self.review(self.app1, 5, 0)
+        self.review(self.app1, 4, 0)
+        self.review(self.app2, 1, 0)
+        self.review(self.app2, 1, 2)
+        self.review(self.app2, 1, 3)
+
+        start = self.day
+        end = self.day + datetime.timedelta(days=3)
+        with self.assertNumQueries(1):
+            eq_(self.results('apps_ratings', start, end),
+                [(self.day, self.app1.id, 2),
+                 (self.day, self.app2.id, 1),
+                 (self.day + datetime.timedelta(days=2), self.app2.id, 1)])
+
+    def test_total(self):
+        self.review(self.app1, 5, -1)
+        self.review(self.app1, 2, 0)
+        self.review(self.app2, 1, 1)
+        self.review(self.app2, 4, 3)
+
+        start = self.day
+        end = self.day + datetime.timedelta(days=3)
+        # One query for the sums before the range, one for the range.
+        with self.assertNumQueries(2):
+            eq_(self.results('apps_average_rating', start, end),
+                [(self.day, self.app1.id, 3.5),
+                 (self.day + datetime.timedelta(days=1), self.app1.id, 3.5),
+                 (self.day + datetime.timedelta(days=1), self.app2.id, 1.0),
+                 (self.day + datetime.timedelta(days=2), self.app1.id, 3.5),
+                 (self.day + datetime.timedelta(days=2), self.app2.id, 1.0)])
+
+    def test_total_before_range(self):
+        self.review(self.app1, 5, -30)
+        self.review(self.app1, 2, -1)
+
+        start = self.day
+        end = self.day + datetime.timedelta(days=2)
+        eq_(self.results('apps_average_rating', start, end),
+            [(self.day, self.app1.id, 3.5),
+             (self.day + datetime.timedelta(days=1), self.app1.id, 3.5)])
+
+    def test_slicing(self):
+        for days in range(5):
+            self.review(self.app1, 5, days)
+        results = _get_query_result(
+            'apps_ratings', self.day, self.day + datetime.timedelta(days=5))
+        eq_(len(results), 5)
+        eq_([r['recorded'] for r in results[1:3]],
+            [self.day + datetime.timedelta(days=1),
+             self.day + datetime.timedelta(days=2)])
+        eq_(results[4]['recorded'], self.day + datetime.timedelta(days=4))
@@ -1,7 +1,8 @@
 import datetime
+import itertools
 import logging
 
-from django.db.models import Avg, Count
+from django.db.models import Avg, Count, Sum
 from rest_framework import status
 from rest_framework.exceptions import ParseError
 from rest_framework.generics import ListAPIView
@@ -24,32 +25,24 @@ log = logging.getLogger('z.monolith')
 # apps/stats/tasks.py here.
 STATS = {
     'apps_ratings': {
-        'qs': Review.objects
-            .filter(editorreview=0)
-            .values('addon')
-            .annotate(count=Count('addon')),
+        'qs': Review.objects.filter(editorreview=0),
         'type': 'slice',
         'field_map': {
-            'count': 'count',
+            'count': Count('addon'),
             'app-id': 'addon'},
     },
     'apps_average_rating': {
-        'qs': Review.objects
-            .filter(editorreview=0)
-            .values('addon')
-            .annotate(avg=Avg('rating')),
+        'qs': Review.objects.filter(editorreview=0),
         'type': 'total',
         'field_map': {
-            'count': 'avg',
+            'count': Avg('rating'),
             'app-id': 'addon'},
     },
     'apps_abuse_reports': {
-        'qs': AbuseReport.objects
-            .values('addon')
-            .annotate(count=Count('addon')),
+        'qs': AbuseReport.objects.all(),
         'type': 'slice',
         'field_map': {
-            'count': 'count',
+            'count': Count('addon'),
             'app-id': 'addon'},
     }
 }
@@ -60,14 +53,122 @@ def daterange(start, end):
         yield start + datetime.timedelta(n)
 
 
+class DailyStatResults(object):
+    """
+    The results of an on-the-fly stat, as if they were calculated daily: for
+    each day of the range, a result per app.
+
+    The days of the range are aggregated in a single query grouped by day and
+    app, which is streamed in date order when the results are iterated or
+    sliced: only the results of the current day are held in memory, and each
+    iteration or slice runs the query again from the start of the range.
+
+    For "total" stats, the result of a day is an aggregate of everything up
+    to the end of this day. The running sum of each app is started from one
+    more query grouped by app, for everything before the range, and the days
+    of the range are added to it as they are streamed.
+    """
+
+    def __init__(self, key, start, end):
+        self.key = key
+        self.start = start
+        self.end = end
+        self.stat = STATS[key]
+        self._len = None
+
+    def group(self, qs, *fields):
+        """
+        Returns `qs` grouped by `fields` and app, annotated with `num`, the
+        number of aggregated rows, and with `sum` unless the stat is a count.
+        """
+        aggregate = self.stat['field_map']['count']
+        annotations = {'num': Count(aggregate.lookup)}
+        if not isinstance(aggregate, Count):
+            annotations['sum'] = Sum(aggregate.lookup)
+        fields += (self.stat['field_map']['app-id'],)
+        return qs.values(*fields).annotate(**annotations).order_by(*fields)
+
+    def get_totals(self):
+        """Returns a dict of the `(sum, num)` of each app before the range."""
+        app_field = self.stat['field_map']['app-id']
+        qs = self.group(self.stat['qs'].filter(created__lt=self.start))
+        return dict((row[app_field], (row.get('sum', row['num']) or 0,
+                                      row['num']))
+                    for row in qs.iterator())
+
+    def get_rows(self):
+        """
+        Yields the `(day, app_id, sum, num)` of the range ordered by day and
+        app, where `num` is the number of rows aggregated in `sum`.
+        """
+        app_field = self.stat['field_map']['app-id']
+        qs = (self.stat['qs'].filter(created__gte=self.start,
+                                     created__lt=self.end)
+              .extra(select={'day': 'DATE(created)'}))
+        for row in self.group(qs, 'day').iterator():
+            day = row['day']
+            if isinstance(day, basestring):
+                day = datetime.datetime.strptime(day, '%Y-%m-%d').date()
+            yield (day, row[app_field], row.get('sum', row['num']),
+                   row['num'])
+
+    def get_value(self, sum_, num):
+        aggregate = self.stat['field_map']['count']
+        if isinstance(aggregate, Avg):
+            return float(sum_) / num if num else None
+        return sum_
+
+    def iter_days(self):
+        """Yields the `(day, [(app_id, value), ...])` of each day."""
+        if self.stat['type'] == 'total':
+            totals = self.get_totals()
+        rows = self.get_rows()
+        row = next(rows, None)
+
+        for day in daterange(self.start, self.end):
+            if self.stat['type'] == 'total':
+                # Add the day to everything that comes before it.
+                while row and row[0] <= day:
+                    sum_, num = totals.get(row[1], (0, 0))
+                    totals[row[1]] = (sum_ + (row[2] or 0), num + row[3])
+                    row = next(rows, None)
+                yield day, [(app_id, self.get_value(*totals[app_id]))
+                            for app_id in sorted(totals)]
+            else:
+                values = []
+                while row and row[0] == day:
+                    values.append((row[1], self.get_value(row[2], row[3])))
+                    row = next(rows, None)
+                yield day, values
+
+    def __iter__(self):
+        for day, values in self.iter_days():
+            for app_id, value in values:
+                yield {
+                    'key': self.key,
+                    'recorded': day,
+                    'user_hash': None,
+                    'value': {'count': value, 'app-id': app_id}}
+
+    def __len__(self):
+        if self._len is None:
+            self._len = sum(len(values) for day, values in self.iter_days())
+        return self._len
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(itertools.islice(self, index.start, index.stop,
+                                         index.step))
+        try:
+            return next(itertools.islice(self, index, None))
+        except StopIteration:
+            raise IndexError(index)
+
+
 def _get_query_result(key, start, end):
     # To do on-the-fly queries we have to produce results as if they
-    # were calculated daily, which means we need to iterate over each
-    # day in the range and perform an aggregation on this date.
-
-    data = []
+    # were calculated daily, see `DailyStatResults`.
     today = datetime.date.today()
-    stat = STATS[key]
 
     # Choose start and end dates that make sense if none provided.
     if not start:
@@ -75,29 +176,7 @@ def _get_query_result(key, start, end):
     if not end:
         end = today
 
-    for day in daterange(start, end):
-        if stat['type'] == 'total':
-            # If it's a totalling queryset, we want to filter by the
-            # end date until the beginning of time to get the total
-            # objects up until this point in time.
-            date_filtered = stat['qs'].filter(
-                created__lt=(day + datetime.timedelta(days=1)))
-        else:
-            # Otherwise, we want to filter by both start/end to get
-            # counts on a specific day.
-            date_filtered = stat['qs'].filter(
-                created__gte=day,
-                created__lt=(day + datetime.timedelta(days=1)))
-
-        data.extend([{
-            'key': key,
-            'recorded': day,
-            'user_hash': None,
-            'value': {'count': d.get(stat['field_map']['count']),
-                      'app-id': d.get(stat['field_map']['app-id'])}}
-            for d in date_filtered])
-
-    return data
+    return DailyStatResults(key, start, end)
 
 
 class MonolithView(CORSMixin, MarketplaceView, ListAPIView):
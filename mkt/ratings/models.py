@@ -86,11 +86,13 @@ class Review(ModelBase):
         if update_denorm:
             pair = self.addon_id, self.user_id
             # Do this immediately so is_latest is correct. Use default
-            # to avoid slave lag.
+            # to avoid slave lag. This also updates the review counts.
             tasks.update_denorm(pair, using='default')
-
-        # Review counts have changed, so run the task and trigger a reindex.
-        tasks.addon_review_aggregates.delay(self.addon_id, using='default')
+        else:
+            # Review counts have changed, so run the task and trigger a
+            # reindex.
+            tasks.addon_review_aggregates.delay(self.addon_id,
+                                                using='default')
 
     @staticmethod
     def transformer(reviews):
@@ -1,10 +1,13 @@
+import collections
 import logging
 
-from django.db.models import Count, Avg, F
+from django.db import connection
+from django.db.models import Avg, F
 
 import caching.base as caching
 from celeryutils import task
 
+from mkt.webapps.indexers import WebappIndexer
 from mkt.webapps.models import Webapp
 
 from .models import Review
@@ -17,49 +20,101 @@ log = logging.getLogger('z.task')
 def update_denorm(*pairs, **kw):
     """
     Takes a bunch of (addon, user) pairs and sets the denormalized fields for
-    all reviews matching that pair.
+    all reviews matching that pair, then updates the review aggregates of the
+    addons.
+
+    The reviews of all the pairs are fetched by a single query, and written by
+    one UPDATE per number of previous reviews plus one for the latest ones.
     """
     log.info('[%s@%s] Updating review denorms.' %
              (len(pairs), update_denorm.rate_limit))
     using = kw.get('using')
-    for addon, user in pairs:
-        reviews = list(Review.objects.valid().no_cache().using(using)
-                       .filter(addon=addon, user=user).order_by('created'))
-        if not reviews:
+    pairs = set(pairs)
+    if not pairs:
+        return
+
+    reviews = (Review.objects.valid().no_cache().using(using)
+               .filter(addon__in=set(addon for addon, user in pairs),
+                       user__in=set(user for addon, user in pairs))
+               .order_by('created').values_list('id', 'addon', 'user'))
+    previous_counts = collections.defaultdict(list)
+    seen = collections.defaultdict(int)
+    latest = {}
+    ids = []
+    for id_, addon, user in reviews:
+        pair = addon, user
+        if pair not in pairs:
             continue
+        ids.append(id_)
+        previous_counts[seen[pair]].append(id_)
+        seen[pair] += 1
+        latest[pair] = id_
 
-        for idx, review in enumerate(reviews):
-            review.previous_count = idx
-            review.is_latest = False
-        reviews[-1].is_latest = True
+    for previous_count, count_ids in previous_counts.items():
+        Review.objects.filter(id__in=count_ids).update(
+            previous_count=previous_count, is_latest=False)
+    if latest:
+        Review.objects.filter(id__in=latest.values()).update(is_latest=True)
+    # The UPDATEs send no post_save, invalidate the cached reviews by hand.
+    Review.objects.invalidate(*[Review(id=id_) for id_ in ids])
 
-        for review in reviews:
-            review.save()
+    addon_review_aggregates.delay(*set(addon for addon, user in pairs),
+                                  using=using)
 
 
 @task
 def addon_review_aggregates(*addons, **kw):
+    """
+    Sets the number of reviews and the average rating of the addons, then
+    their bayesian rating, and reindexes them.
+
+    The aggregates of all the addons are computed and written by one UPDATE.
+    """
     log.info('[%s@%s] Updating total reviews and average ratings.' %
              (len(addons), addon_review_aggregates.rate_limit))
-    using = kw.get('using')
-    addon_objs = list(Webapp.objects.filter(pk__in=addons))
-    stats = dict((x[0], x[1:]) for x in
-                 Review.objects.valid().no_cache().using(using)
-                 .filter(addon__in=addons, is_latest=True)
-                 .values_list('addon')
-                 .annotate(Avg('rating'), Count('addon')))
-    for addon in addon_objs:
-        rating, reviews = stats.get(addon.id, [0, 0])
-        addon.update(total_reviews=reviews, average_rating=rating)
+    addons = sorted(set(addons))
+    if not addons:
+        return
 
-    # Delay bayesian calculations to avoid slave lag.
-    addon_bayesian_rating.apply_async(args=addons, countdown=5)
+    ids = ', '.join(['%s'] * len(addons))
+    cursor = connection.cursor()
+    cursor.execute(
+        'UPDATE {apps} LEFT JOIN ('
+        'SELECT addon_id, AVG(rating) AS rating, COUNT(addon_id) AS total '
+        'FROM {reviews} WHERE reply_to IS NULL AND is_latest = 1 '
+        'AND addon_id IN ({ids}) GROUP BY addon_id'
+        ') AS stats ON stats.addon_id = {apps}.id '
+        'SET {apps}.total_reviews = COALESCE(stats.total, 0), '
+        '{apps}.average_rating = COALESCE(stats.rating, 0) '
+        'WHERE {apps}.id IN ({ids})'.format(
+            apps=Webapp._meta.db_table, reviews=Review._meta.db_table,
+            ids=ids),
+        addons + addons)
+
+    # The bayesian ratings are computed from the columns written above, in
+    # the same database, so they don't need to wait for slave lag.
+    _update_bayesian_ratings(addons)
+    _invalidate_apps(addons)
+    WebappIndexer.index_ids(addons)
 
 
 @task
 def addon_bayesian_rating(*addons, **kw):
     log.info('[%s@%s] Updating bayesian ratings.' %
              (len(addons), addon_bayesian_rating.rate_limit))
+    _update_bayesian_ratings(addons)
+    _invalidate_apps(addons)
+    WebappIndexer.index_ids(list(addons))
+
+
+def _invalidate_apps(addons):
+    """
+    Invalidates the cached apps, the set-based UPDATEs send no post_save.
+    """
+    Webapp.objects.invalidate(*[Webapp(id=pk) for pk in addons])
+
+
+def _update_bayesian_ratings(addons):
     f = lambda: Webapp.objects.aggregate(rating=Avg('average_rating'),
                                          reviews=Avg('total_reviews'))
     avg = caching.cached(f, 'task.bayes.avg', 60 * 60 * 60)
@@ -67,15 +122,9 @@ def addon_bayesian_rating(*addons, **kw):
     if avg['rating'] is None:
         return
     mc = avg['reviews'] * avg['rating']
-    for addon in Webapp.objects.no_cache().filter(id__in=addons):
-        if addon.average_rating is None:
-            # Ignoring addons with no average rating.
-            continue
-
-        q = Webapp.objects.filter(id=addon.id)
-        if addon.total_reviews:
-            num = mc + F('total_reviews') * F('average_rating')
-            denom = avg['reviews'] + F('total_reviews')
-            q.update(bayesian_rating=num / denom)
-        else:
-            q.update(bayesian_rating=0)
+    # Ignoring addons with no average rating.
+    apps = Webapp.objects.filter(id__in=addons, average_rating__isnull=False)
+    num = mc + F('total_reviews') * F('average_rating')
+    denom = avg['reviews'] + F('total_reviews')
+    apps.filter(total_reviews__gt=0).update(bayesian_rating=num / denom)
+    apps.filter(total_reviews=0).update(bayesian_rating=0)
@@ -25,9 +25,8 @@ class TestSpamTest(amo.tests.TestCase):
     def test_add(self):
         assert Spam().add(Review.objects.all()[0], 'numbers')
 
-    @patch('mkt.webapps.tasks.index_webapps.original_apply_async')
-    def test_refresh_triggers_reindex(self, index_webapps_apply_async):
-        index_webapps_apply_async.reset_mock()
+    @patch('mkt.ratings.tasks.WebappIndexer.index_ids')
+    def test_refresh_triggers_reindex(self, index_ids):
         review = Review.objects.latest('pk')
         review.refresh()
-        assert index_webapps_apply_async.called
+        index_ids.assert_called_once_with([self.app.pk])
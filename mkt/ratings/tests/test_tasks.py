@@ -0,0 +1,90 @@
+from mock import patch
+from nose.tools import eq_
+
+import amo.tests
+from mkt.ratings.models import Review
+from mkt.ratings.tasks import (addon_bayesian_rating, addon_review_aggregates,
+                               update_denorm)
+from mkt.site.fixtures import fixture
+from mkt.users.models import UserProfile
+from mkt.webapps.models import Webapp
+
+
+@patch('mkt.ratings.tasks.WebappIndexer.index_ids')
+class TestRatingTasks(amo.tests.TestCase):
+    fixtures = fixture('user_999', 'user_2519')
+
+    def setUp(self):
+        self.apps = [amo.tests.app_factory(), amo.tests.app_factory()]
+        self.user = UserProfile.objects.get(pk=999)
+        self.user2 = UserProfile.objects.get(pk=2519)
+
+    def review(self, app, user, rating, days_ago=0):
+        review = Review.objects.create(addon=app, user=user, rating=rating)
+        review.update(created=self.days_ago(days_ago), _signal=False)
+        return review
+
+    def test_update_denorm(self, index_ids):
+        first = self.review(self.apps[0], self.user, 1, days_ago=2)
+        second = self.review(self.apps[0], self.user, 3, days_ago=1)
+        other = self.review(self.apps[1], self.user2, 5)
+        Review.objects.update(is_latest=True, previous_count=0)
+        index_ids.reset_mock()
+
+        update_denorm((self.apps[0].pk, self.user.pk),
+                      (self.apps[1].pk, self.user2.pk))
+        eq_([(r.previous_count, r.is_latest) for r in
+             Review.objects.no_cache().filter(pk__in=[first.pk, second.pk,
+                                                      other.pk])
+                                      .order_by('pk')],
+            [(0, False), (1, True), (0, True)])
+        index_ids.assert_called_once_with(sorted([self.apps[0].pk,
+                                                  self.apps[1].pk]))
+
+    def test_addon_review_aggregates(self, index_ids):
+        self.review(self.apps[0], self.user, 2)
+        self.review(self.apps[0], self.user2, 4)
+        Webapp.objects.filter(pk=self.apps[1].pk).update(total_reviews=3,
+                                                          average_rating=5)
+        index_ids.reset_mock()
+
+        addon_review_aggregates(self.apps[0].pk, self.apps[1].pk)
+        apps = Webapp.objects.no_cache().in_bulk([app.pk for app in self.apps])
+        eq_(apps[self.apps[0].pk].total_reviews, 2)
+        eq_(apps[self.apps[0].pk].average_rating, 3)
+        assert apps[self.apps[0].pk].bayesian_rating > 0
+        eq_(apps[self.apps[1].pk].total_reviews, 0)
+        eq_(apps[self.apps[1].pk].average_rating, 0)
+        eq_(apps[self.apps[1].pk].bayesian_rating, 0)
+        index_ids.assert_called_once_with(sorted([self.apps[0].pk,
+                                                  self.apps[1].pk]))
+
+    def test_addon_bayesian_rating(self, index_ids):
+        Webapp.objects.filter(pk=self.apps[0].pk).update(
+            total_reviews=2, average_rating=4, bayesian_rating=0)
+        Webapp.objects.filter(pk=self.apps[1].pk).update(
+            total_reviews=0, average_rating=4, bayesian_rating=3)
+
+        addon_bayesian_rating(self.apps[0].pk, self.apps[1].pk)
+        apps = Webapp.objects.no_cache().in_bulk([app.pk for app in self.apps])
+        assert apps[self.apps[0].pk].bayesian_rating > 0
+        eq_(apps[self.apps[1].pk].bayesian_rating, 0)
+        index_ids.assert_called_once_with([self.apps[0].pk, self.apps[1].pk])
+
+    def test_cached_objects_invalidated(self, index_ids):
+        first = self.review(self.apps[0], self.user, 2, days_ago=1)
+        second = self.review(self.apps[0], self.user, 4)
+        Review.objects.update(is_latest=True, previous_count=0)
+        Webapp.objects.filter(pk=self.apps[0].pk).update(total_reviews=0,
+                                                          average_rating=0)
+        # Cache the stale reviews and app.
+        eq_(Review.objects.get(pk=first.pk).is_latest, True)
+        eq_(Review.objects.get(pk=second.pk).previous_count, 0)
+        eq_(Webapp.objects.get(pk=self.apps[0].pk).total_reviews, 0)
+
+        update_denorm((self.apps[0].pk, self.user.pk))
+        eq_(Review.objects.get(pk=first.pk).is_latest, False)
+        eq_(Review.objects.get(pk=second.pk).previous_count, 1)
+        app = Webapp.objects.get(pk=self.apps[0].pk)
+        eq_(app.total_reviews, 1)
+        eq_(app.average_rating, 4)
@@ -0,0 +1,119 @@
+"""
+Benchmarks signing receipts against a local stub signing server.
+
+Starts a signing server answering after `--latency` seconds, signs
+`--requests` receipts with `--concurrency` threads, first with the pooled
+connections to the signing server and then with a new connection for each
+receipt, and reports the requests per second and latencies of both.
+
+Call like:
+
+    ./manage.py benchmark_signing --requests=1000 --concurrency=20
+
+"""
+import json
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from optparse import make_option
+from SocketServer import ThreadingMixIn
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+import requests
+
+from lib.crypto import receipt
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Keep-alive needs HTTP/1.1.
+    protocol_version = 'HTTP/1.1'
+    latency = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        time.sleep(self.latency)
+        body = json.dumps({'receipt': 'signed'})
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class NewConnections(object):
+    """Signs without the pool, with a new connection for each receipt."""
+    post = staticmethod(requests.post)
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option('--requests', type='int', default=1000,
+                    help='Number of receipts to sign.'),
+        make_option('--concurrency', type='int', default=20,
+                    help='Number of receipts signed at the same time.'),
+        make_option('--latency', type='float', default=0.01,
+                    help='Seconds the stub signing server takes to answer.'),
+    )
+
+    help = __doc__
+
+    def _run(self, num_requests, concurrency):
+        latencies = []
+        remaining = iter(xrange(num_requests))
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                start = time.time()
+                receipt.sign({'typ': 'purchase-receipt'})
+                latencies.append(time.time() - start)
+
+        start = time.time()
+        threads = [threading.Thread(target=worker)
+                   for i in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - start
+
+        latencies.sort()
+        return (len(latencies) / elapsed,
+                latencies[len(latencies) / 2],
+                latencies[int(len(latencies) * 0.99)])
+
+    def handle(self, *args, **kw):
+        StubHandler.latency = kw['latency']
+        server = StubServer(('127.0.0.1', 0), StubHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        settings.SIGNING_SERVER = 'http://127.0.0.1:%s' % server.server_port
+        self.stdout.write('Signing %s receipts, %s at a time, with %s '
+                          'connections to the signing server.' %
+                          (kw['requests'], kw['concurrency'],
+                           settings.SIGNING_SERVER_MAX_CONNECTIONS))
+        pooled = receipt.session
+        for name, session in (('pooled', pooled),
+                              ('new', NewConnections)):
+            receipt.session = session
+            try:
+                rate, p50, p99 = self._run(kw['requests'], kw['concurrency'])
+            finally:
+                receipt.session = pooled
+            self.stdout.write('%-8s %8.1f req/s  p50 %6.1fms  p99 %6.1fms' %
+                              (name, rate, p50 * 1000, p99 * 1000))
+        server.shutdown()
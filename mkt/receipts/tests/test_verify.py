@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import calendar
+import json
 import time
 import uuid
 from urllib import urlencode
@@ -44,6 +45,8 @@ class ReceiptTest(amo.tests.TestCase):
                                                  webapp=self.app)
         self.inapp.save()  # generates a GUID
         self.user = UserProfile.objects.get(pk=999)
+        verify.receipt_cache.clear()
+        verify.issuers_cache.clear()
 
     def sample_app_receipt(self):
         return create_receipt_data(self.app, self.user, 'some-uuid')
@@ -247,6 +250,51 @@ class TestVerify(ReceiptTest):
         res = self.verify_receipt_data(self.sample_inapp_receipt(contribution))
         eq_(res['status'], 'ok', res)
 
+    @mock.patch.object(verify, 'decode_receipt')
+    def verify_batch_data(self, batch_data, decode_receipt):
+        # The receipts are the indexes of their unsigned data, None being a
+        # receipt that can't be decoded.
+        def decode(receipt):
+            if batch_data[int(receipt)] is None:
+                raise verify.VerificationError()
+            return batch_data[int(receipt)]
+        decode_receipt.side_effect = decode
+        return verify.check_full_batch(
+            [str(i) for i in range(len(batch_data))],
+            RequestFactory().get('/verifyme/').META,
+            cursor=connection.cursor())
+
+    def test_batch_app(self):
+        self.app.update(premium_type=amo.ADDON_PREMIUM)
+        self.make_purchase()
+        not_purchased = self.sample_app_receipt()
+        not_purchased['user']['value'] = 'other-uuid'
+        with self.assertNumQueries(1):
+            res = self.verify_batch_data(
+                [self.sample_app_receipt(), None, not_purchased])
+        eq_([r['status'] for r in res], ['ok', 'invalid', 'invalid'])
+        eq_(res[2]['reason'], 'NO_PURCHASE')
+
+    def test_batch_inapp(self):
+        refunded = self.make_inapp_contribution(type=amo.CONTRIB_REFUND)
+        purchased = self.make_inapp_contribution()
+        with self.assertNumQueries(1):
+            res = self.verify_batch_data(
+                [self.sample_inapp_receipt(refunded),
+                 self.sample_inapp_receipt(purchased)])
+        eq_([r['status'] for r in res], ['refunded', 'ok'])
+
+    def test_batch_same_as_single(self):
+        self.make_purchase()
+        receipt = self.sample_app_receipt()
+        eq_(self.verify_batch_data([receipt]),
+            [self.verify_receipt_data(receipt)])
+
+    def test_batch_nothing_to_look_up(self):
+        with self.assertNumQueries(0):
+            res = self.verify_batch_data([None])
+        eq_(res[0]['status'], 'invalid')
+
     def test_premium_app_contribution(self):
         self.app.update(premium_type=amo.ADDON_PREMIUM)
         # There's no purchase, but the last entry we have is a sale.
@@ -383,6 +431,91 @@ class TestVerify(ReceiptTest):
         assert ('Cache-Control', 'no-cache') in hdrs, 'No cache header needed'
 
 
+@mock.patch.object(utils.settings, 'WEBAPPS_RECEIPT_KEY',
+                   amo.tests.AMOPaths.sample_key())
+class TestReceiptCache(ReceiptTest):
+
+    def setUp(self):
+        super(TestReceiptCache, self).setUp()
+        self.receipt = create_receipt(self.app, self.user, 'some-uuid')
+
+    @mock.patch.object(verify, 'verify_receipt')
+    def test_verified_once(self, verify_receipt):
+        verify_receipt.return_value = {'typ': 'purchase-receipt'}
+        eq_(verify.decode_receipt(self.receipt), {'typ': 'purchase-receipt'})
+        eq_(verify.decode_receipt(self.receipt), {'typ': 'purchase-receipt'})
+        eq_(verify_receipt.call_count, 1)
+
+    @mock.patch.object(verify, 'verify_receipt')
+    def test_not_verified_not_cached(self, verify_receipt):
+        verify_receipt.side_effect = verify.VerificationError
+        for x in range(2):
+            with self.assertRaises(verify.VerificationError):
+                verify.decode_receipt(self.receipt)
+        eq_(verify_receipt.call_count, 2)
+
+    def test_copy(self):
+        verify.decode_receipt(self.receipt)['exp'] = 0
+        ok_(verify.decode_receipt(self.receipt)['exp'])
+
+    @mock.patch('services.verify.statsd')
+    def test_stats(self, statsd):
+        verify.decode_receipt(self.receipt)
+        verify.decode_receipt(self.receipt)
+        eq_([c[0][0] for c in statsd.incr.call_args_list],
+            ['services.receipt.cache.miss', 'services.receipt.cache.hit'])
+
+    def test_refund_invalidates(self):
+        purchase = AddonPurchase.objects.create(
+            addon=self.app, user=self.user, uuid='some-uuid',
+            type=amo.CONTRIB_REFUND)
+        verifier = verify.Verify(self.receipt, {})
+        verifier.cursor = connection.cursor()
+        verify.decode_receipt(self.receipt)
+        with self.assertRaises(verify.RefundedReceipt):
+            verifier.check_purchase_type(purchase.type)
+        eq_(verify.receipt_cache.get(verify.get_receipt_key(self.receipt)),
+            None)
+
+    @mock.patch.object(utils.settings, 'SIGNING_SERVER_ACTIVE', True)
+    @mock.patch('services.verify.receipts.certs.ReceiptVerifier')
+    def test_verifier_reused(self, verifier):
+        for x in range(2):
+            verify.decode_receipt('jwt_public_key~' + create_receipt(
+                self.app, self.user, str(uuid.uuid4())))
+        eq_(verifier.call_count, 1)
+        eq_(verifier.return_value.verify.call_count, 2)
+
+
+class TestLRUCache(amo.tests.TestCase):
+
+    def setUp(self):
+        self.cache = verify.LRUCache('test', 2, 60)
+
+    def test_evicts_least_recently_used(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        eq_(self.cache.get('a'), 1)
+        self.cache.set('c', 3)
+        eq_(self.cache.get('b'), None)
+        eq_(self.cache.get('a'), 1)
+        eq_(self.cache.get('c'), 3)
+
+    @mock.patch('services.verify.time')
+    def test_expires(self, time):
+        time.return_value = 100
+        self.cache.set('a', 1)
+        time.return_value = 159
+        eq_(self.cache.get('a'), 1)
+        time.return_value = 160
+        eq_(self.cache.get('a'), None)
+
+    def test_delete(self):
+        self.cache.set('a', 1)
+        self.cache.delete('a')
+        eq_(self.cache.get('a'), None)
+
+
 class TestBase(amo.tests.TestCase):
 
     def create(self, data, request=None):
@@ -443,3 +576,23 @@ class TestServices(amo.tests.TestCase):
     def test_wrong_settings(self):
         with self.settings(SIGNING_SERVER_ACTIVE=''):
             eq_(verify.status_check({})[0], 500)
+
+    def get_environ(self, data):
+        return RequestFactory().post('/verifyme/', data,
+                                     content_type='application/json').environ
+
+    @mock.patch.object(verify, 'check_full_batch')
+    def test_batch(self, check_full_batch):
+        check_full_batch.return_value = [{'status': 'ok'}]
+        status, body = verify.receipt_check(self.get_environ('["x"]'))
+        eq_(status, 200)
+        eq_(json.loads(body), [{'status': 'ok'}])
+        eq_(check_full_batch.call_args[0][0], ['x'])
+
+    def test_batch_not_receipts(self):
+        eq_(verify.receipt_check(self.get_environ('[1]'))[0], 400)
+        eq_(verify.receipt_check(self.get_environ('['))[0], 400)
+
+    @mock.patch.object(utils.settings, 'WEBAPPS_RECEIPT_BATCH_SIZE', 1)
+    def test_batch_too_big(self):
+        eq_(verify.receipt_check(self.get_environ('["x", "y"]'))[0], 400)
@@ -1,9 +1,13 @@
+import bisect
+import contextlib
 import datetime
+import time
+import uuid
 
 from django.conf import settings
 from django.core.cache import cache
 from django.db import models
-from django.db.models import Sum
+from django.db.models import Max, Sum
 
 import commonware.log
 import waffle
@@ -12,17 +16,26 @@ import amo
 import mkt.constants.comm as comm
 from amo.utils import cache_ns_key
 from mkt.comm.utils import create_comm_note
+from mkt.files.models import File
+from mkt.ratings.models import Review, ReviewFlag
 from mkt.site.mail import send_mail_jinja
 from mkt.site.models import ManagerBase, ModelBase, skip_cache
 from mkt.tags.models import Tag
 from mkt.translations.fields import save_signal, TranslatedField
 from mkt.users.models import UserProfile
+from mkt.versions.models import Version
 from mkt.webapps.indexers import WebappIndexer
-from mkt.webapps.models import Webapp
+from mkt.webapps.models import Geodata, Webapp
 
 
 user_log = commonware.log.getLogger('z.users')
 QUEUE_TARAKO = 'tarako'
+# Cache key of `mkt.reviewers.utils.get_queue_stats()`.
+QUEUE_STATS_KEY = 'reviewers:queue-stats'
+# Cache key of the display name of a reviewer, by user id.
+REVIEWER_NAME_KEY = 'reviewers:name:%s'
+# Cache key of the total points of a reviewer, by user id.
+REVIEWER_TOTAL_KEY = 'reviewers:total:%s'
 
 
 class CannedResponse(ModelBase):
@@ -64,8 +77,11 @@ class ReviewerScore(ModelBase):
         ordering = ('-created',)
 
     @classmethod
-    def get_key(cls, key=None, invalidate=False):
+    def get_key(cls, key=None, invalidate=False, user_id=None):
         namespace = 'riscore'
+        if user_id is not None:
+            # Points only invalidate the caches of the user they went to.
+            namespace = 'riscore:%s' % user_id
         if not key:  # Assuming we're invalidating the namespace.
             cache_ns_key(namespace, invalidate)
             return
@@ -108,9 +124,9 @@ class ReviewerScore(ModelBase):
         event = cls.get_event(addon, status, **kwargs)
         score = amo.REVIEWED_SCORES.get(event)
         if score:
+            # Caches and totals are updated by `update_reviewer_totals`.
             cls.objects.create(user=user, addon=addon, score=score,
                                note_key=event)
-            cls.get_key(invalidate=True)
             user_log.info(
                 (u'Awarding %s points to user %s for "%s" for addon %s'
                  % (score, user, amo.REVIEWED_CHOICES[event], addon.id))
@@ -124,7 +140,6 @@ class ReviewerScore(ModelBase):
         score = amo.REVIEWED_SCORES.get(event)
 
         cls.objects.create(user=user, addon=addon, score=score, note_key=event)
-        cls.get_key(invalidate=True)
         user_log.info(
             u'Awarding %s points to user %s for "%s" for review %s' % (
                 score, user, amo.REVIEWED_CHOICES[event], review_id))
@@ -132,7 +147,7 @@ class ReviewerScore(ModelBase):
     @classmethod
     def get_total(cls, user):
         """Returns total points by user."""
-        key = cls.get_key('get_total:%s' % user.id)
+        key = REVIEWER_TOTAL_KEY % user.id
         val = cache.get(key)
         if val is not None:
             return val
@@ -143,13 +158,13 @@ class ReviewerScore(ModelBase):
         if val is None:
             val = 0
 
-        cache.set(key, val, None)
+        cache.set(key, val, settings.CACHE_REVIEWER_LEADERBOARD_TIMEOUT)
         return val
 
     @classmethod
     def get_recent(cls, user, limit=5):
         """Returns most recent ReviewerScore records."""
-        key = cls.get_key('get_recent:%s' % user.id)
+        key = cls.get_key('get_recent:%s' % user.id, user_id=user.id)
         val = cache.get(key)
         if val is not None:
             return val
@@ -163,7 +178,7 @@ class ReviewerScore(ModelBase):
     @classmethod
     def get_performance(cls, user):
         """Returns sum of reviewer points."""
-        key = cls.get_key('get_performance:%s' % user.id)
+        key = cls.get_key('get_performance:%s' % user.id, user_id=user.id)
         val = cache.get(key)
         if val is not None:
             return val
@@ -186,7 +201,9 @@ class ReviewerScore(ModelBase):
         """
         Returns sum of reviewer points since the given datetime.
         """
-        key = cls.get_key('get_performance:%s:%s' % (user.id, since.isoformat()))
+        key = cls.get_key(
+            'get_performance:%s:%s' % (user.id, since.isoformat()),
+            user_id=user.id)
         val = cache.get(key)
         if val is not None:
             return val
@@ -213,8 +230,8 @@ class ReviewerScore(ModelBase):
         query = (cls.objects
                     .values_list('user__id', 'user__display_name')
                     .annotate(total=Sum('score'))
-                    .exclude(user__groups__name__in=('No Reviewer Incentives',
-                                                     'Staff', 'Admins'))
+                    .exclude(user__groups__name__in=(
+                        ReviewerLeaderboard.excluded_groups))
                     .order_by('-total'))
 
         if since is not None:
@@ -240,64 +257,31 @@ class ReviewerScore(ModelBase):
         elements instead of the normal 3.
 
         """
-        key = cls.get_key('get_leaderboards:%s' % user.id)
-        val = cache.get(key)
-        if val is not None:
-            return val
-
-        week_ago = datetime.date.today() - datetime.timedelta(days=days)
-
-        leader_top = []
+        leaderboard = ReviewerLeaderboard.get(days=days, types=types)
+        user_rank = leaderboard.get_rank(user.id)
         leader_near = []
-
-        query = cls._leaderboard_query(since=week_ago, types=types)
-        scores = []
-
-        user_rank = 0
-        in_leaderboard = False
-        for rank, row in enumerate(query, 1):
-            user_id, name, total = row
-            scores.append({
-                'user_id': user_id,
-                'name': name,
-                'rank': rank,
-                'total': int(total),
-            })
-            if user_id == user.id:
-                user_rank = rank
-                in_leaderboard = True
-
-        if not in_leaderboard:
-            leader_top = scores[:5]
+        if user_rank <= 5:  # User is in top 5 or not ranked, show top 5.
+            leader_top = leaderboard.get_scores(0, 5)
         else:
-            if user_rank <= 5:  # User is in top 5, show top 5.
-                leader_top = scores[:5]
-            else:
-                leader_top = scores[:3]
-                leader_near = [scores[user_rank - 2], scores[user_rank - 1]]
-                try:
-                    leader_near.append(scores[user_rank])
-                except IndexError:
-                    pass  # User is last on the leaderboard.
-
-        val = {
+            leader_top = leaderboard.get_scores(0, 3)
+            # Stops at the last user on the leaderboard.
+            leader_near = leaderboard.get_scores(user_rank - 2, user_rank + 1)
+
+        return {
             'leader_top': leader_top,
             'leader_near': leader_near,
             'user_rank': user_rank,
         }
-        cache.set(key, val, None)
-        return val
 
     @classmethod
     def all_users_by_score(cls):
         """
         Returns reviewers ordered by highest total points first.
         """
-        query = cls._leaderboard_query()
         scores = []
 
-        for row in query:
-            user_id, name, total = row
+        for row in ReviewerLeaderboard.get().get_scores():
+            total = row['total']
             user_level = len(amo.REVIEWED_LEVELS) - 1
             for i, level in enumerate(amo.REVIEWED_LEVELS):
                 if total < level['points']:
@@ -311,9 +295,9 @@ class ReviewerScore(ModelBase):
                 level = amo.REVIEWED_LEVELS[user_level]['name']
 
             scores.append({
-                'user_id': user_id,
-                'name': name,
-                'total': int(total),
+                'user_id': row['user_id'],
+                'name': row['name'],
+                'total': total,
                 'level': level,
             })
 
@@ -327,6 +311,176 @@ class ReviewerScore(ModelBase):
         return scores
 
 
+class ReviewerLeaderboard(object):
+    """
+    Reviewers sorted by their total points of the last `days` days, or of all
+    time, counting only the `types` of points if given.
+
+    Leaderboards are built by a single aggregation of the scores, then kept in
+    the cache and updated as points are awarded so ranking a reviewer never
+    scans the scores table again. Building, registering and updating them
+    is done under a lock, so concurrent awards can't overwrite each other: an
+    award that can't get the lock drops the leaderboards instead of losing its
+    points. The leaderboard of the last days is built again when its window
+    moves the next day.
+
+    A lookup loads the whole leaderboard from the cache, and an award moves
+    the reviewer in a sorted list: both take time linear in the number of
+    reviewers, the ranking itself is a bisection.
+    """
+    namespace = 'riscore-leaderboards'
+    # Reviewers in these groups are left out of the leaderboards.
+    excluded_groups = ('No Reviewer Incentives', 'Staff', 'Admins')
+    # How long the lock of the leaderboards can be held, in seconds, and how
+    # many times to try taking it, every `lock_wait` seconds.
+    lock_timeout = 30
+    lock_attempts = 50
+    lock_wait = 0.1
+
+    def __init__(self, days=None, types=None):
+        self.days = days
+        self.types = tuple(sorted(types)) if types is not None else None
+        self.since = None
+        if days is not None:
+            self.since = datetime.date.today() - datetime.timedelta(days=days)
+        # Total points and name of each reviewer, by user id.
+        self.totals = {}
+        # (-total, user id) of each reviewer, in the order of their ranks.
+        self.ranking = []
+        # The id of the last score counted when the leaderboard was built.
+        self.last_score_id = 0
+
+    @property
+    def name(self):
+        types = ','.join(map(str, self.types)) if self.types else 'all'
+        return '%s:%s:%s' % (self.days, types, self.since)
+
+    @classmethod
+    @contextlib.contextmanager
+    def lock(cls, ns_key):
+        """
+        Holds the lock of the leaderboards in the namespace `ns_key` for the
+        block, which is given whether it could be taken.
+        """
+        key = '%s:lock' % ns_key
+        # Only the holder of this token may release the lock.
+        token = uuid.uuid4().hex
+        for attempt in range(cls.lock_attempts):
+            if cache.add(key, token, cls.lock_timeout):
+                break
+            time.sleep(cls.lock_wait)
+        else:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            if cache.get(key) == token:
+                cache.delete(key)
+
+    @classmethod
+    def get(cls, days=None, types=None):
+        """Returns the leaderboard, from the cache if possible."""
+        leaderboard = cls(days, types)
+        ns_key = cache_ns_key(cls.namespace)
+        key = '%s:%s' % (ns_key, leaderboard.name)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+        with cls.lock(ns_key) as locked:
+            if not locked:
+                # It couldn't be kept up to date, don't cache it.
+                leaderboard.build()
+                return leaderboard
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+            leaderboard.build()
+            # Keep track of the leaderboards to update when points are
+            # awarded.
+            registry_key = '%s:registry' % ns_key
+            registry = cache.get(registry_key) or set()
+            registry.add((days, leaderboard.types))
+            cache.set(registry_key, registry, None)
+            cache.set(key, leaderboard,
+                      settings.CACHE_REVIEWER_LEADERBOARD_TIMEOUT)
+        return leaderboard
+
+    @classmethod
+    def add_score(cls, score):
+        """Adds a newly created `ReviewerScore` to the cached leaderboards."""
+        if score.user.groups.filter(name__in=cls.excluded_groups).exists():
+            return
+
+        ns_key = cache_ns_key(cls.namespace)
+        with cls.lock(ns_key) as locked:
+            registry = cache.get('%s:registry' % ns_key)
+            if not locked or registry is None:
+                # The leaderboards can't be updated, or can't be found
+                # anymore: they'll be built again with these points.
+                cls.invalidate()
+                return
+
+            keys = []
+            for days, types in registry:
+                if types is None or score.note_key in types:
+                    keys.append('%s:%s' % (ns_key, cls(days, types).name))
+            leaderboards = cache.get_many(keys)
+            if not leaderboards:
+                return
+            for leaderboard in leaderboards.values():
+                leaderboard.add(score.id, score.user_id,
+                                score.user.display_name, score.score)
+            cache.set_many(leaderboards,
+                           settings.CACHE_REVIEWER_LEADERBOARD_TIMEOUT)
+
+    @classmethod
+    def invalidate(cls):
+        """Drops every leaderboard, they are built again when needed."""
+        cache_ns_key(cls.namespace, True)
+
+    def build(self):
+        query = ReviewerScore._leaderboard_query(since=self.since,
+                                                 types=self.types)
+        self.totals = dict((user_id, (int(total), name))
+                           for user_id, name, total in query)
+        self.ranking = sorted((-total, user_id) for user_id, (total, name)
+                              in self.totals.items())
+        self.last_score_id = (ReviewerScore.objects.no_cache()
+                              .aggregate(id=Max('id'))['id'] or 0)
+
+    def add(self, score_id, user_id, name, points):
+        if score_id <= self.last_score_id:
+            # Already counted when the leaderboard was built.
+            return
+        total = 0
+        if user_id in self.totals:
+            total = self.totals[user_id][0]
+            del self.ranking[self._index(user_id, total)]
+        total += points
+        self.totals[user_id] = (total, name)
+        bisect.insort(self.ranking, (-total, user_id))
+
+    def _index(self, user_id, total):
+        return bisect.bisect_left(self.ranking, (-total, user_id))
+
+    def get_rank(self, user_id):
+        """Returns the rank of the user, 0 if they're not on the board."""
+        if user_id not in self.totals:
+            return 0
+        return self._index(user_id, self.totals[user_id][0]) + 1
+
+    def get_scores(self, start=0, stop=None):
+        """Returns the reviewers ranked from `start` to `stop`."""
+        return [{'user_id': user_id,
+                 'name': self.totals[user_id][1],
+                 'rank': rank,
+                 'total': -negative_total}
+                for rank, (negative_total, user_id)
+                in enumerate(self.ranking[start:stop], start + 1)]
+
+
 class EscalationQueue(ModelBase):
     addon = models.ForeignKey(Webapp)
 
@@ -452,3 +606,46 @@ def cleanup_queues(sender, instance, **kwargs):
 
 models.signals.post_delete.connect(cleanup_queues, sender=Webapp,
                                    dispatch_uid='queue-addon-cleanup')
+
+
+def invalidate_queue_stats(sender, **kwargs):
+    cache.delete(QUEUE_STATS_KEY)
+
+
+# Anything that can move an item in or out of a reviewer queue.
+for model in (AdditionalReview, EscalationQueue, File, Geodata,
+              RereviewQueue, Review, ReviewFlag, Version, Webapp):
+    for signal in (models.signals.post_save, models.signals.post_delete):
+        signal.connect(invalidate_queue_stats, sender=model,
+                       dispatch_uid='queue-stats-%s' % model.__name__)
+
+
+def invalidate_reviewer_name(sender, instance, **kwargs):
+    cache.delete(REVIEWER_NAME_KEY % instance.pk)
+
+
+models.signals.post_save.connect(invalidate_reviewer_name, sender=UserProfile,
+                                 dispatch_uid='reviewer-name-invalidate')
+
+
+def update_reviewer_totals(sender, instance, created=False, **kwargs):
+    """Keeps the cached totals and leaderboards up to date with the scores."""
+    ReviewerScore.get_key(user_id=instance.user_id, invalidate=True)
+    total_key = REVIEWER_TOTAL_KEY % instance.user_id
+    if created and instance.score >= 0:
+        try:
+            cache.incr(total_key, instance.score)
+        except ValueError:
+            pass  # The total isn't cached, it will be computed when needed.
+        ReviewerLeaderboard.add_score(instance)
+    else:
+        # Scores changed or deleted by hand, count everything again.
+        cache.delete(total_key)
+        ReviewerLeaderboard.invalidate()
+
+
+models.signals.post_save.connect(update_reviewer_totals, sender=ReviewerScore,
+                                 dispatch_uid='reviewer-totals-save')
+models.signals.post_delete.connect(update_reviewer_totals,
+                                   sender=ReviewerScore,
+                                   dispatch_uid='reviewer-totals-delete')
@@ -25,16 +25,23 @@ class ReviewersESAppSerializer(ESAppSerializer):
     latest_version = serializers.SerializerMethodField('get_latest_version')
     is_escalated = serializers.BooleanField()
 
+    es_sources = dict(ESAppSerializer.es_sources, is_escalated='is_escalated')
+    es_source_fields = dict(ESAppSerializer.es_source_fields,
+                            latest_version=('latest_version',))
+
     class Meta(ESAppSerializer.Meta):
         fields = SEARCH_FIELDS + ['latest_version', 'is_escalated']
 
     def get_latest_version(self, obj):
-        v = obj.es_data.latest_version
+        return self.es_latest_version(obj.es_data)
+
+    def es_latest_version(self, data):
+        v = data.get('latest_version')
         return {
-            'has_editor_comment': v.has_editor_comment,
-            'has_info_request': v.has_info_request,
-            'is_privileged': v.is_privileged,
-            'status': v.status,
+            'has_editor_comment': v['has_editor_comment'],
+            'has_info_request': v['has_info_request'],
+            'is_privileged': v['is_privileged'],
+            'status': v['status'],
         }
 
 
@@ -3,6 +3,7 @@ import time
 
 from django.conf import settings
 from django.core import mail
+from django.core.cache import cache
 
 import mock
 from nose.tools import eq_, ok_
@@ -194,18 +195,91 @@ class TestReviewerScore(amo.tests.TestCase):
         with self.assertNumQueries(0):
             ReviewerScore.get_performance(self.user)
 
-        # New points invalidates all caches.
+        # New points update the totals and leaderboards, and invalidate the
+        # other caches of the user.
         self._give_points()
 
-        with self.assertNumQueries(1):
-            ReviewerScore.get_total(self.user)
+        with self.assertNumQueries(0):
+            eq_(ReviewerScore.get_total(self.user),
+                amo.REVIEWED_SCORES[amo.REVIEWED_WEBAPP_HOSTED] * 2)
         with self.assertNumQueries(1):
             ReviewerScore.get_recent(self.user)
-        with self.assertNumQueries(1):
+        with self.assertNumQueries(0):
             ReviewerScore.get_leaderboards(self.user)
         with self.assertNumQueries(1):
             ReviewerScore.get_performance(self.user)
 
+    def test_caching_other_users(self):
+        user2 = UserProfile.objects.get(email='regular@mozilla.com')
+        self._give_points()
+        ReviewerScore.get_recent(self.user)
+        self._give_points(user=user2)
+        with self.assertNumQueries(0):
+            ReviewerScore.get_recent(self.user)
+
+    def test_leaderboards_updated(self):
+        user2 = UserProfile.objects.get(email='regular@mozilla.com')
+        self._give_points()
+        eq_(ReviewerScore.get_leaderboards(user2)['user_rank'], 0)
+        eq_(len(ReviewerScore.all_users_by_score()), 1)
+
+        self._give_points(user=user2)
+        self._give_points(user=user2)
+        with self.assertNumQueries(0):
+            leaders = ReviewerScore.get_leaderboards(user2)
+            users = ReviewerScore.all_users_by_score()
+        eq_(leaders['user_rank'], 1)
+        eq_([l['user_id'] for l in leaders['leader_top']],
+            [user2.id, self.user.id])
+        eq_(leaders['leader_top'][0]['total'],
+            amo.REVIEWED_SCORES[amo.REVIEWED_WEBAPP_HOSTED] * 2)
+        eq_([u['user_id'] for u in users], [user2.id, self.user.id])
+
+    @mock.patch('mkt.reviewers.models.time.sleep')
+    def test_leaderboards_interleaved_awards(self, sleep):
+        user2 = UserProfile.objects.get(email='regular@mozilla.com')
+        self._give_points()
+        ReviewerScore.get_leaderboards(self.user)
+
+        get_many = cache.get_many
+        awarded = []
+
+        def concurrent_award(keys):
+            # Another worker awards points while this one updates the
+            # leaderboards.
+            if not awarded:
+                awarded.append(True)
+                self._give_points(user=user2)
+            return get_many(keys)
+
+        with mock.patch('mkt.reviewers.models.cache.get_many',
+                        side_effect=concurrent_award):
+            self._give_points()
+        ok_(awarded)
+        points = amo.REVIEWED_SCORES[amo.REVIEWED_WEBAPP_HOSTED]
+        leaders = ReviewerScore.get_leaderboards(self.user)['leader_top']
+        eq_(dict((l['user_id'], l['total']) for l in leaders),
+            {self.user.id: points * 2, user2.id: points})
+        eq_(ReviewerScore.get_total(self.user), points * 2)
+        eq_(ReviewerScore.get_total(user2), points)
+
+    def test_leaderboards_rebuilt_on_change(self):
+        self._give_points()
+        eq_(ReviewerScore.get_total(self.user),
+            amo.REVIEWED_SCORES[amo.REVIEWED_WEBAPP_HOSTED])
+        eq_(ReviewerScore.get_leaderboards(self.user)['user_rank'], 1)
+
+        ReviewerScore.objects.get().delete()
+        eq_(ReviewerScore.get_total(self.user), 0)
+        eq_(ReviewerScore.get_leaderboards(self.user)['user_rank'], 0)
+
+    def test_leaderboards_skip_excluded_groups(self):
+        admin = UserProfile.objects.get(email='admin@mozilla.com')
+        self._give_points()
+        ReviewerScore.get_leaderboards(self.user)
+        self._give_points(user=admin)
+        eq_(ReviewerScore.get_leaderboards(admin)['user_rank'], 0)
+
 
 class TestAdditionalReview(amo.tests.TestCase):
     fixtures = fixture('webapp_337141')
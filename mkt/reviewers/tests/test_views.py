@@ -8,6 +8,7 @@ from os import path
 
 from django.conf import settings
 from django.core import mail
+from django.core.cache import cache
 from django.core.files.storage import default_storage as storage
 from django.core.urlresolvers import reverse
 from django.test.client import RequestFactory
@@ -44,8 +45,9 @@ from mkt.ratings.models import Review, ReviewFlag
 from mkt.reviewers.models import (CannedResponse, EscalationQueue,
                                   QUEUE_TARAKO, RereviewQueue, ReviewerScore)
 from mkt.reviewers.views import (_progress, app_review, queue_apps,
-                                 route_reviewer)
-from mkt.reviewers.utils import ReviewersQueuesHelper
+                                 queue_counts, route_reviewer)
+from mkt.reviewers.utils import (QueueViewing, ReviewersQueuesHelper,
+                                 viewing_key)
 from mkt.site.fixtures import fixture
 from mkt.site.helpers import absolutify
 from mkt.submit.tests.test_views import BasePackagedAppTest
@@ -249,6 +251,28 @@ class TestReviewersHome(AppReviewerTest, AccessMixin):
         self.assertAlmostEqual(percentages['updates']['old'], 33.333333333333)
         self.assertAlmostEqual(percentages['updates']['med'], 33.333333333333)
 
+    def test_progress_cached(self):
+        counts, percentages = _progress()
+        with self.assertNumQueries(0):
+            eq_(_progress(), (counts, percentages))
+
+    def test_queue_counts(self):
+        counts = queue_counts(RequestFactory().get('/'))
+        eq_(counts['pending'], 3)
+        eq_(counts['rereview'], 1)
+        eq_(counts['updates'], 1)
+        eq_(counts['escalated'], 1)
+        eq_(counts['moderated'], 0)
+        with self.assertNumQueries(0):
+            eq_(queue_counts(RequestFactory().get('/')), counts)
+
+    def test_queue_counts_invalidated(self):
+        eq_(queue_counts(RequestFactory().get('/'))['escalated'], 1)
+        EscalationQueue.objects.create(addon=self.apps[0])
+        counts = queue_counts(RequestFactory().get('/'))
+        eq_(counts['escalated'], 2)
+        eq_(counts['pending'], 2)
+
     def test_stats_waiting(self):
         self.apps[0].latest_version.update(nomination=self.days_ago(1))
         self.apps[1].latest_version.update(nomination=self.days_ago(5))
@@ -404,6 +428,47 @@ class TestAppQueue(AppReviewerTest, AccessMixin, FlagsMixin, SearchMixin,
         eq_(self.client.post(reverse('reviewers.queue_viewing')).status_code,
             200)
 
+    def view_queue(self, **data):
+        data['addon_ids'] = ','.join(str(app.id) for app in self.apps)
+        res = self.client.post(reverse('reviewers.queue_viewing'), data)
+        eq_(res.status_code, 200)
+        return json.loads(res.content)
+
+    def test_queue_viewing(self):
+        editor = UserProfile.objects.get(email='editor@mozilla.com')
+        other = UserProfile.objects.get(id=999)
+        cache.set(viewing_key(self.apps[0].id), editor.id)
+        cache.set(viewing_key(self.apps[1].id), other.id)
+        eq_(self.view_queue(), {str(self.apps[1].id): other.display_name})
+
+    def test_queue_viewing_changes(self):
+        editor = UserProfile.objects.get(email='editor@mozilla.com')
+        other = UserProfile.objects.get(id=999)
+        cache.set(viewing_key(self.apps[0].id), other.id)
+        data = self.view_queue(token='')
+        eq_(data['reset'], True)
+        eq_(data['viewing'], {str(self.apps[0].id): other.display_name})
+        eq_(data['released'], [])
+
+        # Nothing changed, the reviewer names don't need to be looked up.
+        with self.assertNumQueries(0):
+            unchanged = QueueViewing(mock.Mock(user=editor)).get_changes(
+                [str(app.id) for app in self.apps], data['token'])
+        eq_(unchanged['reset'], False)
+        eq_(unchanged['viewing'], {})
+
+        cache.delete(viewing_key(self.apps[0].id))
+        cache.set(viewing_key(self.apps[1].id), other.id)
+        changed = self.view_queue(token=data['token'])
+        eq_(changed['reset'], False)
+        eq_(changed['viewing'], {str(self.apps[1].id): other.display_name})
+        eq_(changed['released'], [str(self.apps[0].id)])
+
+    def test_queue_viewing_unknown_token(self):
+        data = self.view_queue(token='unknown')
+        eq_(data['reset'], True)
+        eq_(data['viewing'], {})
+
     def test_template_links(self):
         r = self.client.get(self.url)
         eq_(r.status_code, 200)
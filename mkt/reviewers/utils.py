@@ -1,10 +1,12 @@
+import hashlib
 import json
 import urllib
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from django.conf import settings
 from django.core.cache import cache
 from django.core.urlresolvers import reverse
+from django.db import connection
 from django.db.models import Q
 from django.utils import translation
 from django.utils.datastructures import SortedDict
@@ -14,6 +16,7 @@ import waffle
 from tower import ugettext_lazy as _lazy
 
 import amo
+import mkt
 from amo.utils import JSONEncoder
 from mkt.access import acl
 from mkt.comm.utils import create_comm_note
@@ -21,12 +24,16 @@ from mkt.constants import comm
 from mkt.constants.features import FeatureProfile
 from mkt.files.models import File
 from mkt.ratings.models import Review
-from mkt.reviewers.models import EscalationQueue, RereviewQueue, ReviewerScore
+from mkt.reviewers.models import (AdditionalReview, EscalationQueue,
+                                  QUEUE_STATS_KEY, QUEUE_TARAKO,
+                                  RereviewQueue, REVIEWER_NAME_KEY,
+                                  ReviewerScore)
 from mkt.site.helpers import absolutify, product_as_dict
 from mkt.site.mail import send_mail_jinja
 from mkt.site.models import manual_order
 from mkt.translations.query import order_by_translation
 from mkt.translations.utils import to_language
+from mkt.users.models import UserProfile
 from mkt.versions.models import Version
 from mkt.webapps.models import Webapp
 from mkt.webapps.tasks import set_storefront_data
@@ -630,11 +637,9 @@ class AppsReviewing(object):
         ids = []
         my_apps = cache.get(self.key)
         if my_apps:
-            for id in my_apps.split(','):
-                valid = cache.get(
-                    '%s:review_viewing:%s' % (settings.CACHE_PREFIX, id))
-                if valid and valid == self.user_id:
-                    ids.append(id)
+            viewing = get_viewing(my_apps.split(','))
+            ids = [id for id, user_id in viewing.items()
+                   if user_id == self.user_id]
 
         apps = []
         for app in Webapp.objects.filter(id__in=ids):
@@ -657,6 +662,114 @@ class AppsReviewing(object):
                   amo.EDITOR_VIEWING_INTERVAL * 2)
 
 
+def viewing_key(addon_id):
+    """Cache key of the id of the reviewer viewing the app `addon_id`."""
+    return '%s:review_viewing:%s' % (settings.CACHE_PREFIX, addon_id)
+
+
+def get_viewing(addon_ids):
+    """
+    Returns a dict of the id of the reviewer viewing each of the apps in
+    `addon_ids` that someone is viewing, in a single cache lookup.
+    """
+    keys = dict((viewing_key(addon_id), addon_id) for addon_id in addon_ids)
+    return dict((keys[key], user_id)
+                for key, user_id in cache.get_many(keys.keys()).items()
+                if user_id)
+
+
+def get_reviewer_names(user_ids):
+    """
+    Returns a dict of the display name of each reviewer in `user_ids`.
+
+    Names are cached, the missing ones are fetched with a single query.
+    """
+    keys = dict((REVIEWER_NAME_KEY % user_id, user_id) for user_id in user_ids)
+    names = dict((keys[key], name)
+                 for key, name in cache.get_many(keys.keys()).items())
+    missing = set(user_ids) - set(names)
+    if missing:
+        fetched = dict(UserProfile.objects.filter(id__in=missing)
+                                  .values_list('id', 'display_name'))
+        cache.set_many(dict((REVIEWER_NAME_KEY % user_id, name)
+                            for user_id, name in fetched.items()),
+                       settings.CACHE_REVIEWER_NAMES_TIMEOUT)
+        names.update(fetched)
+    return names
+
+
+class QueueViewing(object):
+    """
+    Tells a reviewer who else is viewing the apps of a queue page.
+
+    The queue page polls with the token of the last response it got, and only
+    receives what changed since then. The states the tokens stand for are
+    kept in the cache, a client whose token expired or is unknown receives
+    the whole state again.
+    """
+
+    def __init__(self, request):
+        self.user_id = request.user.id
+
+    def state_key(self, token):
+        return '%s:queue_viewing_state:%s' % (settings.CACHE_PREFIX, token)
+
+    def get_state(self, addon_ids):
+        """Returns a dict of who else is viewing each of `addon_ids`."""
+        return dict((addon_id, user_id) for addon_id, user_id
+                    in get_viewing(addon_ids).items()
+                    if user_id != self.user_id)
+
+    def get_names(self, addon_ids):
+        """
+        Returns a dict of the name of who else is viewing each of
+        `addon_ids`, the response to a queue page not sending a token.
+        """
+        state = self.get_state(addon_ids)
+        names = get_reviewer_names(set(state.values()))
+        return dict((addon_id, names.get(user_id))
+                    for addon_id, user_id in state.items())
+
+    def get_changes(self, addon_ids, token):
+        """
+        Returns what changed since the response `token` came with:
+
+            {'token': 'f2a3...', 'reset': False,
+             'viewing': {'337141': 'Reviewer Name'}, 'released': ['337142']}
+
+        `viewing` holds the apps someone else started viewing and `released`
+        the ones they stopped viewing. When `reset` is true, `viewing` holds
+        every app someone else is viewing instead.
+        """
+        keys = dict((viewing_key(addon_id), addon_id)
+                    for addon_id in addon_ids)
+        state_key = self.state_key(token)
+        cached = cache.get_many(keys.keys() + ([state_key] if token else []))
+        previous = cached.pop(state_key, None)
+        state = dict((keys[key], user_id) for key, user_id in cached.items()
+                     if user_id and user_id != self.user_id)
+
+        new_token = hashlib.md5(repr(sorted(state.items()))).hexdigest()
+        if new_token != token:
+            cache.set(self.state_key(new_token), state,
+                      amo.EDITOR_VIEWING_INTERVAL * 10)
+
+        reset = previous is None
+        if reset:
+            previous = {}
+        changed = dict((addon_id, user_id) for addon_id, user_id
+                       in state.items() if previous.get(addon_id) != user_id)
+        names = get_reviewer_names(set(changed.values()))
+        return {
+            'token': new_token,
+            'reset': reset,
+            'viewing': dict((addon_id, names.get(user_id))
+                            for addon_id, user_id in changed.items()),
+            'released': [addon_id for addon_id in previous
+                         if addon_id not in state],
+        }
+
+
 def device_queue_search(request):
     """
     Returns a queryset that can be used as a base for searching the device
@@ -780,3 +893,86 @@ class ReviewersQueuesHelper(object):
                             .values_list('addon', flat=True))
         qs = Webapp.objects.filter(id__in=sorted_app_ids)
         return manual_order(qs, sorted_app_ids, 'addons.id')
+
+
+def _queue_stats_select(name, qs, field, now):
+    """
+    Returns the SQL and the params of a SELECT of the name of the queue, the
+    number of items in `qs`, then the number of them whose `field` falls in
+    each bucket of `get_queue_stats()`.
+    """
+    days_ago = lambda n: now - timedelta(days=n)
+    sql, params = (qs.order_by().values_list(field or 'pk')
+                   .query.sql_with_params())
+    if field:
+        column = connection.ops.quote_name(
+            qs.model._meta.get_field(field).column)
+        buckets = (
+            ('%s > %%s', [days_ago(5)]),
+            ('%s BETWEEN %%s AND %%s', [days_ago(10), days_ago(5)]),
+            ('%s < %%s', [days_ago(10)]),
+            ('%s >= %%s', [days_ago(7)]),
+        )
+        sums = ['SUM(CASE WHEN %s THEN 1 ELSE 0 END)' % (condition % column)
+                for condition, values in buckets]
+        bucket_params = [v for condition, values in buckets for v in values]
+    else:
+        sums, bucket_params = ['0'] * 4, []
+    select = 'SELECT %%s, COUNT(*), %s FROM (%s) AS queue_%s' % (
+        ', '.join(sums), sql, name)
+    return select, [name] + bucket_params + list(params)
+
+
+def _compute_queue_stats():
+    helper = ReviewersQueuesHelper()
+    # The date the items of each queue are aged by, None to only count them.
+    queues = (
+        ('pending', helper.get_pending_queue(), 'nomination'),
+        ('rereview', helper.get_rereview_queue(), 'created'),
+        ('updates', helper.get_updates_queue(), 'nomination'),
+        ('escalated', helper.get_escalated_queue(), 'created'),
+        ('moderated', helper.get_moderated_queue(), None),
+        ('region_cn', Webapp.objects.pending_in_region(mkt.regions.CN), None),
+        ('additional_tarako',
+         AdditionalReview.objects.unreviewed(queue=QUEUE_TARAKO,
+                                             and_approved=True), None),
+    )
+    now = datetime.now()
+    selects, params = [], []
+    for name, qs, field in queues:
+        select, select_params = _queue_stats_select(name, qs, field, now)
+        selects.append(select)
+        params.extend(select_params)
+
+    cursor = connection.cursor()
+    cursor.execute(' UNION ALL '.join(selects), params)
+    stats = {}
+    for row in cursor.fetchall():
+        # SUM() is NULL for empty queues and a Decimal otherwise.
+        values = [int(value or 0) for value in row[1:]]
+        stats[row[0]] = dict(zip(('count', 'new', 'med', 'old', 'week'),
+                                 values))
+    return stats
+
+
+def get_queue_stats():
+    """
+    Returns the number of items in each reviewer queue, and for the queues
+    that are sorted by date how many of them are new (less than 5 days old),
+    med (between 5 and 10 days old), old (more than 10 days old) and from the
+    last week:
+
+        {'pending': {'count': 3, 'new': 1, 'med': 1, 'old': 1, 'week': 1},
+         'moderated': {'count': 2, 'new': 0, 'med': 0, 'old': 0, 'week': 0},
+         ...}
+
+    Every queue is counted by a single query. The result is cached until one
+    of the models the queues are built from is saved or deleted, the timeout
+    only keeps the buckets from drifting and catches bulk updates.
+    """
+    stats = cache.get(QUEUE_STATS_KEY)
+    if stats is None:
+        stats = _compute_queue_stats()
+        cache.set(QUEUE_STATS_KEY, stats,
+                  settings.CACHE_REVIEWER_QUEUE_STATS_TIMEOUT)
+    return stats
@@ -35,7 +35,6 @@ from tower import ugettext as _
 from waffle.decorators import waffle_switch
 
 import amo
-import mkt
 from amo.helpers import urlparams
 from amo.utils import (escape_all, HttpResponseSendFile, JSONEncoder, paginate,
                        redirect_for_login, smart_decode)
@@ -55,8 +54,7 @@ from mkt.regions.utils import parse_region
 from mkt.reviewers.forms import (ApiReviewersSearchForm, ApproveRegionForm,
                                  MOTDForm)
 from mkt.reviewers.models import (AdditionalReview, CannedResponse,
-                                  EditorSubscription, QUEUE_TARAKO,
-                                  ReviewerScore)
+                                  EditorSubscription, ReviewerScore)
 from mkt.reviewers.serializers import (AdditionalReviewSerializer,
                                        CannedResponseSerializer,
                                        ReviewerAdditionalReviewSerializer,
@@ -64,7 +62,9 @@ from mkt.reviewers.serializers import (AdditionalReviewSerializer,
                                        ReviewingSerializer,
                                        ReviewerScoreSerializer,)
 from mkt.reviewers.utils import (AppsReviewing, device_queue_search,
-                                 log_reviewer_action, ReviewersQueuesHelper)
+                                 get_queue_stats, log_reviewer_action,
+                                 QueueViewing, ReviewersQueuesHelper,
+                                 viewing_key)
 from mkt.search.views import search_form_to_es_fields, SearchView
 from mkt.site.decorators import json_view, login_required, permission_required
 from mkt.site.helpers import absolutify, product_as_dict
@@ -139,31 +139,13 @@ def home(request):
 
 
 def queue_counts(request):
-    queues_helper = ReviewersQueuesHelper()
-
-    counts = {
-        'pending': queues_helper.get_pending_queue().count(),
-        'rereview': queues_helper.get_rereview_queue().count(),
-        'updates': queues_helper.get_updates_queue().count(),
-        'escalated': queues_helper.get_escalated_queue().count(),
-        'moderated': queues_helper.get_moderated_queue().count(),
-        'region_cn': Webapp.objects.pending_in_region(mkt.regions.CN).count(),
-        'additional_tarako': (
-            AdditionalReview.objects
-                            .unreviewed(queue=QUEUE_TARAKO, and_approved=True)
-                            .count()),
-    }
+    counts = dict((queue, stats['count'])
+                  for queue, stats in get_queue_stats().items())
 
     if 'pro' in request.GET:
         counts.update({'device': device_queue_search(request).count()})
 
-    rv = {}
-    if isinstance(type, basestring):
-        return counts[type]
-    for k, v in counts.items():
-        if not isinstance(type, list) or k in type:
-            rv[k] = v
-    return rv
+    return counts
 
 
 def _progress():
@@ -172,41 +154,12 @@ def _progress():
     Return the number of apps still unreviewed for a given period of time and
     the percentage.
     """
-
-    queues_helper = ReviewersQueuesHelper()
-
-    days_ago = lambda n: datetime.datetime.now() - datetime.timedelta(days=n)
-
-    base_filters = {
-        'pending': (queues_helper.get_pending_queue(),
-                    'nomination'),
-        'rereview': (queues_helper.get_rereview_queue(),
-                     'created'),
-        'escalated': (queues_helper.get_escalated_queue(),
-                      'created'),
-        'updates': (queues_helper.get_updates_queue(),
-                    'nomination')
-    }
-
-    operators_and_values = {
-        'new': ('gt', days_ago(5)),
-        'med': ('range', (days_ago(10), days_ago(5))),
-        'old': ('lt', days_ago(10)),
-        'week': ('gte', days_ago(7))
-    }
-
-    types = base_filters.keys()
+    stats = get_queue_stats()
+    types = ('pending', 'rereview', 'escalated', 'updates')
     progress = {}
-
     for t in types:
-        tmp = {}
-        base_query, field = base_filters[t]
-        for k in operators_and_values.keys():
-            operator, value = operators_and_values[k]
-            filter_ = {}
-            filter_['%s__%s' % (field, operator)] = value
-            tmp[k] = base_query.filter(**filter_).count()
-        progress[t] = tmp
+        progress[t] = dict((k, stats[t][k])
+                           for k in ('new', 'med', 'old', 'week'))
 
     # Return the percent of (p)rogress out of (t)otal.
     pct = lambda p, t: (p / float(t)) * 100 if p > 0 else 0
@@ -959,6 +912,7 @@ class ReviewersSearchView(SearchView):
     permission_classes = [GroupPermission('Apps', 'Review')]
     form_class = ApiReviewersSearchForm
     serializer_class = ReviewersESAppSerializer
+    cache_results = False
 
     def search(self, request):
         # Parse form.
@@ -973,7 +927,7 @@ class ReviewersSearchView(SearchView):
             data.update(status=form_data.get('status'))
 
         # Do filter.
-        sq = apply_reviewer_filters(request, WebappIndexer.search(),
+        sq = apply_reviewer_filters(request, self.get_search(),
                                     data=form_data)
         sq = WebappIndexer.get_app_filter(request, data, sq=sq, no_filter=True)
 
@@ -1126,7 +1080,7 @@ def review_viewing(request):
     user_id = request.user.id
     current_name = ''
     is_user = 0
-    key = '%s:review_viewing:%s' % (settings.CACHE_PREFIX, addon_id)
+    key = viewing_key(addon_id)
     interval = amo.EDITOR_VIEWING_INTERVAL
 
     # Check who is viewing.
@@ -1156,19 +1110,13 @@ def queue_viewing(request):
     if 'addon_ids' not in request.POST:
         return {}
 
-    viewing = {}
-    user_id = request.user.id
-
-    for addon_id in request.POST['addon_ids'].split(','):
-        addon_id = addon_id.strip()
-        key = '%s:review_viewing:%s' % (settings.CACHE_PREFIX, addon_id)
-        currently_viewing = cache.get(key)
-        if currently_viewing and currently_viewing != user_id:
-            viewing[addon_id] = (UserProfile.objects
-                                            .get(id=currently_viewing)
-                                            .display_name)
-
-    return viewing
+    addon_ids = [addon_id.strip()
+                 for addon_id in request.POST['addon_ids'].split(',')]
+    viewing = QueueViewing(request)
+    # Clients sending a token only want what changed since their last poll.
+    if 'token' in request.POST:
+        return viewing.get_changes(addon_ids, request.POST['token'])
+    return viewing.get_names(addon_ids)
 
 
 class CannedResponseViewSet(CORSMixin, MarketplaceView, viewsets.ModelViewSet):
@@ -1,21 +1,29 @@
 import logging
 import sys
+import threading
+import time
 
 from django.conf import settings
+from django.core.signals import got_request_exception, request_finished
 
 import elasticsearch
+from celery.signals import task_postrun
 from celeryutils import task
+from django_statsd.clients import statsd
 from elasticsearch import helpers
 from elasticsearch_dsl import Search
 
 import amo
 from lib.es.models import Reindexing
+from lib.post_request_task.task import PostRequestTask
 from lib.post_request_task.task import task as post_request_task
 from mkt.site.decorators import write
 
 
 task_log = logging.getLogger('z.task')
 
+_locals = threading.local()
+
 
 class BaseIndexer(object):
     """
@@ -78,17 +86,43 @@ class BaseIndexer(object):
         index = index or cls.get_index()
         type = cls.get_mapping_type_name()
 
-        actions = [
+        actions = (
             {'_index': index, '_type': type, '_id': d['id'], '_source': d}
-            for d in documents]
+            for d in documents)
 
         helpers.bulk(es, actions)
 
+    @classmethod
+    def streaming_bulk_index(cls, documents, es=None, index=None,
+                             chunk_size=500):
+        """
+        Index a bunch of documents, consuming them lazily.
+
+        `documents` can be any iterable, e.g. a generator returned by
+        `iter_documents`: at most `chunk_size` documents are held in memory.
+        Yields an `(ok, item)` tuple per document, `item` being the result of
+        the bulk API for that document: documents that failed to index are
+        yielded with `ok` False instead of raising `BulkIndexError`.
+        """
+        es = es or cls.get_es()
+        index = index or cls.get_index()
+        type = cls.get_mapping_type_name()
+
+        actions = (
+            {'_index': index, '_type': type, '_id': d['id'], '_source': d}
+            for d in documents)
+
+        return helpers.streaming_bulk(es, actions, chunk_size=chunk_size,
+                                      raise_on_error=False)
+
     @classmethod
     def index_ids(cls, ids, no_delay=False):
         """
         Start task to index instances of indexer class matching the IDs.
         Calls the helper method outside this BaseIndexer class.
+
+        Unless `no_delay` is passed, the IDs are coalesced with the other IDs
+        queued for this indexer, see `IndexTask`.
         """
         if no_delay:
             index(ids, cls)
@@ -114,13 +148,28 @@ class BaseIndexer(object):
         es.indices.refresh(index=index)
 
     @classmethod
-    def search(cls, using=None):
+    def indexed(cls, ids, es=None):
+        """
+        Called once the documents of the objects matching the IDs have been
+        indexed or unindexed. Does nothing by default.
+        """
+        pass
+
+    @classmethod
+    def search(cls, using=None, source=None):
         """
         Returns a `Search` object from elasticsearch_dsl.
+
+        If `source` is a list of fields, only those fields of the `_source` of
+        the documents are returned, see `get_es_source_fields` on the ES
+        serializers.
         """
-        return Search(using=using or cls.get_es(),
-                      index=cls.get_index(),
-                      doc_type=cls.get_mapping_type_name())
+        sq = Search(using=using or cls.get_es(),
+                    index=cls.get_index(),
+                    doc_type=cls.get_mapping_type_name())
+        if source is not None:
+            sq = sq.extra(_source=list(source))
+        return sq
 
     @classmethod
     def get_index(cls):
@@ -279,28 +328,33 @@ class BaseIndexer(object):
                     # Ignore if it's not there.
                     task_log.info(u'[%s:%s] object not found in index' %
                                   (cls.get_model()._meta.model_name, id_))
+        cls.indexed(ids, es=es)
 
     @classmethod
-    def run_indexing(cls, ids, ES, index=None, **kw):
-        """Used in reindex."""
-        sys.stdout.write('Indexing {0} {1}\n'.format(
-            len(ids), cls.get_model()._meta.model_name))
-
-        # Fetch QS given the IDs.
-        docs = []
-        qs = cls.get_model().objects.filter(id__in=ids)
+    def iter_documents(cls, ids, failed=None):
+        """
+        Yields the documents of the objects matching the IDs, one at a time.
 
-        # For each object, extract document.
-        for obj in qs:
+        failed -- if provided, a list the IDs of objects whose document
+                  couldn't be extracted are appended to.
+        """
+        for obj in cls.get_model().objects.filter(id__in=ids):
             try:
-                docs.append(cls.extract_document(obj.id, obj=obj))
+                yield cls.extract_document(obj.id, obj=obj)
             except Exception as e:
                 sys.stdout.write('Failed to index {0} {1}: {2}\n'.format(
                     cls.get_model()._meta.model_name, obj.id, e))
+                if failed is not None:
+                    failed.append(obj.id)
 
-        # Index.
-        if docs:
-            cls.bulk_index(docs, es=ES, index=index or cls.get_index())
+    @classmethod
+    def run_indexing(cls, ids, ES, index=None, **kw):
+        """Used in reindex."""
+        sys.stdout.write('Indexing {0} {1}\n'.format(
+            len(ids), cls.get_model()._meta.model_name))
+
+        cls.bulk_index(cls.iter_documents(ids), es=ES,
+                       index=index or cls.get_index())
 
     @classmethod
     def attach_translation_mappings(cls, mapping, field_names):
@@ -323,12 +377,98 @@ class BaseIndexer(object):
         return mapping
 
 
-@post_request_task(acks_late=True)
+def _get_index_queue():
+    """
+    Returns the calling thread's index queue, a dict of the set of IDs
+    waiting to be indexed, keyed by the task, its other arguments and its
+    execution options.
+    """
+    return _locals.__dict__.setdefault('index_queue', {})
+
+
+def flush_index_queue(**kwargs):
+    """Sends one task for all the IDs queued for each task and arguments."""
+    queue = _get_index_queue()
+    while queue:
+        (task, args, kwargs, options), ids = queue.popitem()
+        statsd.incr('search.index_queue.flushed', len(ids))
+        task.original_apply_async(args=(sorted(ids),) + args,
+                                  kwargs=dict(kwargs), **dict(options))
+
+
+def discard_index_queue(**kwargs):
+    """Discards all the queued IDs."""
+    _get_index_queue().clear()
+
+
+class IndexTask(PostRequestTask):
+    """A post request task indexing a list of IDs, whose calls are coalesced.
+
+    The IDs, which have to be the first argument of the task, are queued and
+    deduped with the IDs of the other calls of the task with the same other
+    arguments (e.g. the same indexer) and execution options (e.g. the same
+    `countdown` or `queue`). A single task per indexer and options is sent
+    with all of them when the request or the task is finished. Calls with
+    options that can't be compared, like dicts, aren't coalesced.
+
+    The queue is also flushed as soon as it holds `ES_INDEX_QUEUE_SIZE` IDs or
+    is older than `ES_INDEX_QUEUE_WINDOW` seconds. The tasks are then handed
+    over to the post request queue, which sends them once the request is
+    finished.
+
+    """
+    abstract = True
+
+    def apply_async(self, args=None, kwargs=None, **options):
+        key = (self, tuple(args[1:]), tuple(sorted((kwargs or {}).items())),
+               tuple(sorted(options.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return super(IndexTask, self).apply_async(
+                args=args, kwargs=kwargs, **options)
+        ids = args[0]
+
+        queue = _get_index_queue()
+        if not queue:
+            _locals.index_queue_start = time.time()
+        pending = queue.setdefault(key, set())
+        new_ids = set(ids) - pending
+        pending.update(new_ids)
+        if len(new_ids) < len(ids):
+            statsd.incr('search.index_queue.coalesced',
+                        len(ids) - len(new_ids))
+
+        if (sum(len(v) for v in queue.values()) >= settings.ES_INDEX_QUEUE_SIZE
+            or time.time() - _locals.index_queue_start >=
+                settings.ES_INDEX_QUEUE_WINDOW):
+            while queue:
+                (task, args, kwargs, options), ids = queue.popitem()
+                statsd.incr('search.index_queue.flushed', len(ids))
+                super(IndexTask, task).apply_async(
+                    args=(sorted(ids),) + args, kwargs=dict(kwargs),
+                    **dict(options))
+
+
+# Send the queued IDs when the request or the task is finished, and discard
+# them when there was an exception in the request-response cycle, like the
+# post request tasks do.
+request_finished.connect(flush_index_queue,
+                         dispatch_uid='request_finished_index_queue')
+task_postrun.connect(flush_index_queue,
+                     dispatch_uid='tasks_finished_index_queue')
+got_request_exception.connect(discard_index_queue,
+                              dispatch_uid='request_exception_index_queue')
+
+
+@post_request_task(base=IndexTask, acks_late=True)
 @write
 def index(ids, indexer, **kw):
     """
     Given a list of IDs and an indexer, index into ES.
     If an reindexation is currently occurring, index on both the old and new.
+
+    Documents are extracted once and sent with one bulk request per index.
     """
     task_log.info('Indexing {0} {1}-{2}. [{3}]'.format(
         indexer.get_model()._meta.model_name, ids[0], ids[-1], len(ids)))
@@ -337,7 +477,7 @@ def index(ids, indexer, **kw):
     indices = Reindexing.get_indices(indexer.get_index())
 
     es = indexer.get_es(urls=settings.ES_URLS)
-    for obj in indexer.get_indexable().filter(id__in=ids):
-        doc = indexer.extract_document(obj.id, obj)
-        for idx in indices:
-            indexer.index(doc, id_=obj.id, es=es, index=idx)
+    docs = list(indexer.iter_documents(ids))
+    for idx in indices:
+        indexer.bulk_index(docs, es=es, index=idx)
+    indexer.indexed(ids, es=es)
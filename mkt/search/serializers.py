@@ -39,11 +39,30 @@ class BaseESSerializer(serializers.ModelSerializer):
     fake_object) is populated with the ES data in order to work well with
     the parent model serializer (e.g., AppSerializer).
 
+    Subclasses can skip the fake instance by describing how to get every
+    field straight from the ES data: `es_sources` maps field names to the ES
+    keys holding their value, and an `es_<field_name>` method returns the
+    value of any other field. The accessors are compiled once per serializer
+    and used whenever every field has one and `can_serialize_es()` accepts
+    the data.
+
     """
     # In base classes add the field names we want converted to Python
     # date/datetime from the Elasticsearch date strings.
     datetime_fields = ()
 
+    # In base classes map the field names to the ES keys we can serialize
+    # them from directly.
+    es_sources = None
+    _es_accessors = None
+
+    # In base classes map the names of the other fields to the ES keys they
+    # need, and list the keys needed whatever the fields (e.g. by
+    # fake_object), so that searches only fetch those from ES.
+    es_source_fields = None
+    es_source_fields_required = ()
+    _es_source_fields_cache = {}
+
     def __init__(self, *args, **kwargs):
         super(BaseESSerializer, self).__init__(*args, **kwargs)
 
@@ -78,6 +97,13 @@ class BaseESSerializer(serializers.ModelSerializer):
     def to_native(self, data):
         data = (data._source if hasattr(data, '_source') else
                 data.get('_source', data))
+        if self._es_accessors is None:
+            self._es_accessors = self.compile_es_accessors() or []
+        if self._es_accessors and self.can_serialize_es(data):
+            ret = self._dict_class()
+            for key, accessor in self._es_accessors:
+                ret[key] = accessor(data)
+            return ret
         obj = self.fake_object(data)
         return super(BaseESSerializer, self).to_native(obj)
 
@@ -88,6 +114,97 @@ class BaseESSerializer(serializers.ModelSerializer):
         """
         raise NotImplementedError
 
+    @classmethod
+    def get_es_source_fields(cls):
+        """
+        Return the sorted list of ES keys needed to serialize documents, or
+        None if the whole documents are needed.
+        """
+        if cls not in cls._es_source_fields_cache:
+            cls._es_source_fields_cache[cls] = cls()._get_es_source_fields()
+        return cls._es_source_fields_cache[cls]
+
+    def _get_es_source_fields(self):
+        if self.es_sources is None or self.es_source_fields is None:
+            return None
+        keys = set(self.es_source_fields_required)
+        for field_name, field in self.fields.items():
+            if hasattr(field, 'es_source_key'):
+                keys.update([field.es_source_key(field_name),
+                             'default_locale'])
+            elif field_name in self.es_sources:
+                keys.add(self.es_sources[field_name])
+            elif field_name in self.es_source_fields:
+                keys.update(self.es_source_fields[field_name])
+            else:
+                return None
+        return sorted(keys)
+
+    def can_serialize_es(self, data):
+        """
+        Return False if `data` needs the fake instance to be serialized, e.g.
+        because some fields would query the database through it.
+        """
+        return True
+
+    def compile_es_accessors(self):
+        """
+        Return a list of (key, accessor) pairs, each accessor returning the
+        serialized value of a field given the ES data, or None if some fields
+        can't be serialized without the fake instance.
+        """
+        if self.es_sources is None:
+            return None
+        accessors = []
+        for field_name, field in self.fields.items():
+            if callable(getattr(self, 'transform_%s' % field_name, None)):
+                return None
+            field.initialize(parent=self, field_name=field_name)
+            accessor = self._es_accessor(field_name, field)
+            if accessor is None:
+                return None
+            accessors.append((self.get_field_key(field_name), accessor))
+        return accessors
+
+    def _es_accessor(self, field_name, field):
+        if hasattr(field, 'es_field_to_native'):
+            return lambda data: field.es_field_to_native(data, field_name)
+
+        method_field = isinstance(field, serializers.SerializerMethodField)
+        if field_name in self.es_sources and not method_field:
+            key = self.es_sources[field_name]
+            if field_name in self.datetime_fields:
+                return lambda data: field.to_native(
+                    self.to_datetime(data.get(key)))
+            return lambda data: field.to_native(data.get(key))
+
+        method_name = 'es_%s' % field_name
+        method = getattr(self, method_name, None)
+        if method is None:
+            return None
+        if method_field and (self._defined_in(field.method_name) <
+                             self._defined_in(method_name)):
+            # The serializer method was overridden, but not its ES version.
+            return None
+
+        # Nested serializers get a list of objects, related fields the object
+        # they link to, other fields the value they would have read on the
+        # fake instance.
+        if isinstance(field, serializers.BaseSerializer):
+            return lambda data: [field.to_native(item)
+                                 for item in method(data)]
+        if isinstance(field, (serializers.RelatedField,
+                              serializers.HyperlinkedIdentityField)):
+            return lambda data: field.field_to_native(method(data),
+                                                      field_name)
+        return lambda data: field.to_native(method(data))
+
+    def _defined_in(self, name):
+        """Return the position in the MRO of the class defining `name`."""
+        for i, cls in enumerate(type(self).__mro__):
+            if name in cls.__dict__:
+                return i
+
     def _attach_fields(self, obj, data, field_names):
         """Attach fields to fake instance."""
         for field_name in field_names:
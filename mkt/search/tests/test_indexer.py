@@ -1,7 +1,13 @@
+from django.core.signals import request_finished
+from django.test.utils import override_settings
+
+import mock
 from nose.tools import eq_
 
 import amo
-from mkt.search.indexers import BaseIndexer
+from lib.post_request_task import task as post_request_task
+from mkt.search.indexers import (BaseIndexer, discard_index_queue,
+                                 flush_index_queue, index)
 
 
 class TestBaseIndexer(amo.tests.TestCase):
@@ -13,3 +19,77 @@ class TestBaseIndexer(amo.tests.TestCase):
         es1 = self.indexer().get_es()
         es2 = self.indexer().get_es()
         eq_(id(es1), id(es2))
+
+
+@mock.patch('mkt.search.indexers.statsd')
+@mock.patch('mkt.search.indexers.index.original_apply_async')
+class TestIndexQueue(amo.tests.TestCase):
+
+    def tearDown(self):
+        discard_index_queue()
+        post_request_task._discard_tasks()
+        super(TestIndexQueue, self).tearDown()
+
+    def test_coalesce(self, apply_async, statsd):
+        BaseIndexer.index_ids([3, 1])
+        BaseIndexer.index_ids([1, 2])
+        index.delay([2], BaseIndexer)
+        assert not apply_async.called
+        request_finished.send(sender=self)
+        apply_async.assert_called_once_with(args=([1, 2, 3], BaseIndexer),
+                                            kwargs={})
+        eq_(statsd.incr.call_args_list,
+            [mock.call('search.index_queue.coalesced', 1),
+             mock.call('search.index_queue.coalesced', 1),
+             mock.call('search.index_queue.flushed', 3)])
+
+    def test_one_task_per_indexer(self, apply_async, statsd):
+        class OtherIndexer(BaseIndexer):
+            pass
+
+        BaseIndexer.index_ids([1])
+        OtherIndexer.index_ids([1])
+        flush_index_queue()
+        eq_(sorted(c[1]['args'] for c in apply_async.call_args_list),
+            sorted([([1], BaseIndexer), ([1], OtherIndexer)]))
+
+    def test_options(self, apply_async, statsd):
+        index.apply_async(args=([1], BaseIndexer), countdown=5,
+                          queue='priority')
+        index.apply_async(args=([2], BaseIndexer), countdown=5,
+                          queue='priority')
+        index.delay([3], BaseIndexer)
+        flush_index_queue()
+        eq_(sorted((c[1]['args'], c[1].get('countdown'), c[1].get('queue'))
+                   for c in apply_async.call_args_list),
+            [(([1, 2], BaseIndexer), 5, 'priority'),
+             (([3], BaseIndexer), None, None)])
+
+    def test_unhashable_options(self, apply_async, statsd):
+        index.apply_async(args=([1], BaseIndexer), headers={'a': 1})
+        post_request_task._send_tasks()
+        apply_async.assert_called_once_with(args=([1], BaseIndexer),
+                                            kwargs=None, headers={'a': 1})
+
+    def test_discard(self, apply_async, statsd):
+        BaseIndexer.index_ids([1])
+        discard_index_queue()
+        flush_index_queue()
+        assert not apply_async.called
+
+    @override_settings(ES_INDEX_QUEUE_SIZE=2)
+    def test_flush_when_full(self, apply_async, statsd):
+        BaseIndexer.index_ids([1])
+        BaseIndexer.index_ids([2])
+        # Handed over to the post request queue, not sent yet.
+        assert not apply_async.called
+        BaseIndexer.index_ids([3])
+        request_finished.send(sender=self)
+        eq_([c[1]['args'] for c in apply_async.call_args_list],
+            [([1, 2], BaseIndexer), ([3], BaseIndexer)])
+
+    def test_no_delay(self, apply_async, statsd):
+        with mock.patch('mkt.search.indexers.index') as index_mock:
+            BaseIndexer.index_ids([1], no_delay=True)
+        index_mock.assert_called_once_with([1], BaseIndexer)
+        assert not apply_async.called
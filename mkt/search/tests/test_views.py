@@ -12,6 +12,7 @@ from django.test.utils import override_settings
 from elasticsearch_dsl import Search
 from mock import patch
 from nose.tools import eq_, ok_
+from rest_framework.response import Response
 
 import amo
 import mkt
@@ -35,6 +36,7 @@ from mkt.translations.helpers import truncate
 from mkt.users.models import UserProfile
 from mkt.webapps.indexers import WebappIndexer
 from mkt.webapps.models import AddonDeviceType, AddonUpsell, Installed, Webapp
+from mkt.webapps.serializers import ESAppSerializer
 from mkt.webapps.tasks import unindex_webapps
 
 
@@ -117,6 +119,62 @@ class TestGetRegion(TestCase):
         eq_(self.region_for('worldwide'), regions.RESTOFWORLD)
 
 
+@override_settings(CACHE_SEARCH_API_TIMEOUT=60, CACHE_SEARCH_API_STALE=300)
+@patch('mkt.search.views.SearchView.get_response')
+class TestSearchCache(RestOAuth):
+
+    def setUp(self):
+        super(TestSearchCache, self).setUp()
+        self.url = reverse('search-api')
+        self.count = 0
+
+    def respond(self, *args, **kwargs):
+        self.count += 1
+        return Response({'count': self.count})
+
+    def get(self, client=None, **data):
+        res = (client or self.anon).get(self.url, data=data)
+        eq_(res.status_code, 200)
+        return res.json['count']
+
+    def test_cached(self, get_response):
+        get_response.side_effect = self.respond
+        eq_(self.get(q='foo', cat='games'), 1)
+        eq_(self.get(cat='games', q='foo'), 1)
+        eq_(get_response.call_count, 1)
+
+    def test_key(self, get_response):
+        get_response.side_effect = self.respond
+        eq_(self.get(q='foo'), 1)
+        eq_(self.get(q='bar'), 2)
+        eq_(self.get(q='foo', region='br'), 3)
+        eq_(self.get(q='foo', lang='fr'), 4)
+
+    def test_not_cached_authenticated(self, get_response):
+        get_response.side_effect = self.respond
+        eq_(self.get(self.client, q='foo'), 1)
+        eq_(self.get(self.client, q='foo'), 2)
+
+    def test_not_cached_unfiltered(self, get_response):
+        get_response.side_effect = self.respond
+        eq_(self.get(q='foo', filtering='0'), 1)
+        eq_(self.get(q='foo', filtering='0'), 2)
+
+    @patch('mkt.search.views.time')
+    def test_stale_while_revalidate(self, time, get_response):
+        get_response.side_effect = self.respond
+        time.time.return_value = 1000
+        eq_(self.get(q='foo'), 1)
+        time.time.return_value = 1061
+        # Another request is refreshing the results, serve the stale ones.
+        with patch('mkt.search.views.cache.add') as add:
+            add.return_value = False
+            eq_(self.get(q='foo'), 1)
+        # This one refreshes them.
+        eq_(self.get(q='foo'), 2)
+        eq_(self.get(q='foo'), 2)
+
+
 @patch('mkt.versions.models.Version.is_privileged', False)
 class TestSearchView(RestOAuth, ESTestCase):
     fixtures = fixture('user_2519', 'webapp_337141')
@@ -153,6 +211,14 @@ class TestSearchView(RestOAuth, ESTestCase):
         self.anon.get(self.url)
         assert _mock.called
 
+    @patch.object(WebappIndexer, 'search', wraps=WebappIndexer.search)
+    def test_source_fields(self, search):
+        res = self.anon.get(self.url)
+        eq_(res.status_code, 200)
+        search.assert_called_with(
+            source=ESAppSerializer.get_es_source_fields())
+        eq_(res.json['objects'][0]['id'], self.webapp.id)
+
     def test_search_published_apps(self):
         res = self.anon.get(self.url)
         eq_(res.status_code, 200)
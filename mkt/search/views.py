@@ -1,11 +1,15 @@
 from __future__ import absolute_import
 
+import hashlib
 import json
+import time
 
 from django.conf import settings
+from django.core.cache import cache
 from django.http import HttpResponse
 from django.utils import translation
 
+from django_statsd.clients import statsd
 from elasticsearch_dsl import query
 from rest_framework.generics import GenericAPIView
 from rest_framework.permissions import AllowAny
@@ -157,6 +161,8 @@ def search_form_to_es_fields(form_data):
 class SearchView(CORSMixin, MarketplaceView, GenericAPIView):
     """
     Base app search view based on a single-string query.
+
+    Anonymous searches are cached, see `get`.
     """
     cors_allowed_methods = ['get']
     authentication_classes = [RestSharedSecretAuthentication,
@@ -165,6 +171,7 @@ class SearchView(CORSMixin, MarketplaceView, GenericAPIView):
     serializer_class = ESAppSerializer
     form_class = ApiSearchForm
     paginator_class = ESPaginator
+    cache_results = True
 
     def search(self, request):
         """
@@ -182,7 +189,8 @@ class SearchView(CORSMixin, MarketplaceView, GenericAPIView):
             request.GET.get('filtering', '1') == '0' and
             acl.action_allowed(request, 'Feed', 'Curate'))
         sq = WebappIndexer.get_app_filter(
-            request, search_form_to_es_fields(form_data), no_filter=no_filter)
+            request, search_form_to_es_fields(form_data),
+            sq=self.get_search(), no_filter=no_filter)
 
         # Sort.
         sq = _sort_search(request, sq, form_data)
@@ -191,10 +199,79 @@ class SearchView(CORSMixin, MarketplaceView, GenericAPIView):
         page = self.paginate_queryset(sq)
         return self.get_pagination_serializer(page), form_data.get('q', '')
 
-    def get(self, request):
+    def get_search(self):
+        """
+        Returns the base search, only fetching the fields the serializer needs
+        from the documents.
+        """
+        return WebappIndexer.search(
+            source=self.get_serializer_class().get_es_source_fields())
+
+    def get(self, request, *args, **kwargs):
+        """
+        Returns the search results, from the cache for anonymous requests.
+
+        Results are fresh for `CACHE_SEARCH_API_TIMEOUT` seconds. Then for
+        `CACHE_SEARCH_API_STALE` seconds, the stale results keep being served
+        while a single request refreshes them.
+        """
+        if not self.use_cache(request):
+            return self.get_response(request, *args, **kwargs)
+
+        key = self.get_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            data, headers, fresh_until = cached
+            if fresh_until > time.time():
+                statsd.incr('search.api.cache.hit')
+                return self.get_cached_response(data, headers)
+            if not cache.add(key + ':refresh', 1,
+                             settings.CACHE_SEARCH_API_TIMEOUT):
+                statsd.incr('search.api.cache.stale')
+                return self.get_cached_response(data, headers)
+
+        statsd.incr('search.api.cache.miss')
+        response = self.get_response(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, (response.data, dict(response.items()),
+                            time.time() + settings.CACHE_SEARCH_API_TIMEOUT),
+                      settings.CACHE_SEARCH_API_TIMEOUT +
+                      settings.CACHE_SEARCH_API_STALE)
+        cache.delete(key + ':refresh')
+        return response
+
+    def get_response(self, request, *args, **kwargs):
         serializer, _ = self.search(request)
         return Response(serializer.data)
 
+    def use_cache(self, request):
+        """
+        Only anonymous searches are cached, and never the unfiltered ones of
+        curators.
+        """
+        return (self.cache_results and settings.CACHE_SEARCH_API_TIMEOUT and
+                not request.user.is_authenticated() and
+                request.GET.get('filtering', '1') != '0')
+
+    def get_cache_key(self, request):
+        """
+        Returns the cache key of a search, from its sorted parameters and
+        what else the results depend on: the region, locale and device.
+        """
+        region = self.get_region_from_request(request)
+        parts = [request.path, sorted(request.GET.lists()),
+                 getattr(region, 'id', None), translation.get_language(),
+                 getattr(request, 'GAIA', False),
+                 getattr(request, 'MOBILE', False),
+                 getattr(request, 'TABLET', False)]
+        return 'search:api:%s' % hashlib.md5(json.dumps(parts)).hexdigest()
+
+    def get_cached_response(self, data, headers):
+        response = Response(data)
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
 
 class FeaturedSearchView(SearchView):
     collections_serializer_class = CollectionSerializer
@@ -218,7 +295,7 @@ class FeaturedSearchView(SearchView):
         )
         return serializer.data, getattr(qs, 'filter_fallback', None)
 
-    def get(self, request, *args, **kwargs):
+    def get_response(self, request, *args, **kwargs):
         serializer, _ = self.search(request)
         data, filter_fallbacks = self.add_featured_etc(request,
                                                        serializer.data)
@@ -548,6 +548,27 @@ CACHE_PREFIX = 'marketplace:%s' % build_id
 # Cache timeout on the /search/featured API.
 CACHE_SEARCH_FEATURED_API_TIMEOUT = 60 * 60  # 1 hour.
 
+# How long anonymous API searches are cached, then for how long the stale
+# results keep being served while they are refreshed, in seconds.
+CACHE_SEARCH_API_TIMEOUT = 60
+CACHE_SEARCH_API_STALE = 60 * 5
+
+# How long the snapshots of the feed of each region and carrier are cached.
+# They are also invalidated whenever the feed changes.
+CACHE_FEED_SNAPSHOT_TIMEOUT = 60 * 60
+
+# How long the counts of the reviewer queues are cached. They are also
+# invalidated whenever the models the queues are built from change.
+CACHE_REVIEWER_QUEUE_STATS_TIMEOUT = 60 * 5
+
+# How long the display names of the reviewers viewing queue pages are cached.
+# They are also invalidated whenever the user is saved.
+CACHE_REVIEWER_NAMES_TIMEOUT = 60 * 60
+
+# How long the reviewer leaderboards and point totals are cached. They are
+# updated as points are awarded, expiring them makes up for lost updates.
+CACHE_REVIEWER_LEADERBOARD_TIMEOUT = 60 * 60
+
 # jingo-minify settings
 CACHEBUST_IMGS = True
 try:
@@ -692,6 +713,11 @@ ES_INDEXES = {
 ES_URLS = ['http://%s' % h for h in ES_HOSTS]
 ES_USE_PLUGINS = False
 ES_TIMEOUT = 30
+# Objects to reindex after a save are coalesced in a queue, flushed at the end
+# of the request or task, or when it holds this many IDs or is older than this
+# many seconds.
+ES_INDEX_QUEUE_SIZE = 500
+ES_INDEX_QUEUE_WINDOW = 10
 
 # When True include full tracebacks in JSON. This is useful for QA on preview.
 EXPOSE_VALIDATOR_TRACEBACKS = True
@@ -730,6 +756,14 @@ GEOIP_URL = ''
 GEOIP_DEFAULT_VAL = 'restofworld'
 GEOIP_DEFAULT_TIMEOUT = .2
 
+# Path to a CSV file of IP ranges and their country code to resolve addresses
+# locally, only falling back to the GeoIP server for unknown addresses. The
+# file is loaded again when it changes, checked every GEOIP_DB_CHECK_INTERVAL
+# seconds, and the GEOIP_CACHE_SIZE most recent lookups are cached.
+GEOIP_DB_PATH = ''
+GEOIP_DB_CHECK_INTERVAL = 60
+GEOIP_CACHE_SIZE = 10000
+
 # Credentials for accessing Google Analytics stats.
 GOOGLE_ANALYTICS_CREDENTIALS = {}
 
@@ -900,6 +934,15 @@ MARKETPLACE_GUID = 'e6a59937-29e4-456a-b636-b69afa8693b4'
 MARKETPLACE_USER_AGENT = ('UA for marketplace.firefox.com; '
                           'bug? http://mzl.la/1mZ9F3a')
 
+# How many manifests `update_manifests` fetches at the same time, and at most
+# from the same host.
+MANIFEST_FETCH_WORKERS = 10
+MANIFEST_FETCH_PER_HOST = 2
+
+# How long the ETag and Last-Modified of the fetched manifests are kept to
+# make conditional requests on the next fetch, in seconds.
+MANIFEST_VALIDATORS_TIMEOUT = 60 * 60 * 24 * 30
+
 # If the users's Firefox has a version number greater than this we consider it
 # a beta.
 MIN_BETA_VERSION = '3.7'
@@ -918,6 +961,17 @@ MONOLITH_SERVER = None
 MONOLITH_INDEX = 'time_*'
 MONOLITH_MAX_DATE_RANGE = 365
 
+# Records of `record_stat` are written in bulk once this many are queued, or
+# once the oldest one is this many seconds old.
+MONOLITH_BUFFER_SIZE = 100
+MONOLITH_BUFFER_WINDOW = 10
+# Directory of the spool files of the queued records. They are written from
+# there if a process dies before writing them. It must be local to the host,
+# the processes of the files are looked up by pid. If None, nothing is spooled
+# and the records are written at the end of every request and task instead of
+# waiting for MONOLITH_BUFFER_WINDOW.
+MONOLITH_SPOOL_DIR = path('tmp', 'monolith')
+
 # The issuer for unverified Persona email addresses.
 # We only trust one issuer to grant us unverified emails.
 # If UNVERIFIED_ISSUER is set to None, forceIssuer will not
@@ -1067,6 +1121,14 @@ SIGNED_APPS_SERVER_TIMEOUT = 10
 # Send the more terse manifest signatures to the app signing server.
 SIGNED_APPS_OMIT_PER_FILE_SIGS = True
 
+# How long a version is locked while it is being signed. Other requests to
+# sign the same version wait for the lock instead of signing it again.
+SIGNED_APPS_LOCK_TIMEOUT = 60
+
+# How long the receipt verifier keeps the receipt issuers certificates it
+# fetched and verified, in seconds.
+SIGNING_ISSUERS_CACHE_TIMEOUT = 60 * 60
+
 # This is the signing REST server for signing receipts.
 SIGNING_SERVER = ''
 
@@ -1077,6 +1139,10 @@ SIGNING_SERVER_ACTIVE = False
 # And how long we'll give the server to respond.
 SIGNING_SERVER_TIMEOUT = 10
 
+# How many connections to the signing server a process keeps open, which is
+# also the number of receipts it signs at the same time.
+SIGNING_SERVER_MAX_CONNECTIONS = 10
+
 # The domains that we will accept certificate issuers for receipts.
 SIGNING_VALID_ISSUERS = []
 
@@ -1194,6 +1260,14 @@ WEBAPPS_RECEIPT_EXPIRY_SECONDS = 60 * 60 * 24 * 182
 # The key we'll use to sign webapp receipts.
 WEBAPPS_RECEIPT_KEY = os.path.join(ROOT, 'mkt/webapps/tests/sample.key')
 
+# The maximum number of receipts in a batch sent to the receipt verifier.
+WEBAPPS_RECEIPT_BATCH_SIZE = 100
+
+# How many receipts the receipt verifier remembers the verified signature of,
+# and for how long, in seconds. The purchase is checked every time regardless.
+WEBAPPS_RECEIPT_CACHE_SIZE = 10000
+WEBAPPS_RECEIPT_CACHE_TIMEOUT = 60 * 60
+
 WEBAPPS_UNIQUE_BY_DOMAIN = False
 
 # Whitelist IP addresses of the allowed clients that can post email
@@ -1,6 +1,10 @@
 import json
 import logging
 import datetime
+from collections import defaultdict
+from functools import partial
+
+from django.db.models import Count
 
 from celeryutils import task
 
@@ -9,7 +13,7 @@ from mkt.constants.regions import REGIONS_CHOICES_SLUG
 from mkt.monolith.models import MonolithRecord
 from mkt.site.decorators import write
 from mkt.ratings.models import Review
-from mkt.webapps.models import AddonUser, Webapp
+from mkt.webapps.models import AddonExcludedRegion, AddonUser, Webapp
 from mkt.users.models import UserProfile
 
 
@@ -23,6 +27,7 @@ def update_monolith_stats(metric, date, **kw):
 
     jobs = _get_monolith_jobs(date)[metric]
 
+    records = []
     for job in jobs:
         try:
             # Only record if count is greater than zero.
@@ -32,8 +37,8 @@ def update_monolith_stats(metric, date, **kw):
                 if 'dimensions' in job:
                     value.update(job['dimensions'])
 
-                MonolithRecord.objects.create(recorded=date, key=metric,
-                                              value=json.dumps(value))
+                records.append(MonolithRecord(recorded=date, key=metric,
+                                              value=json.dumps(value)))
 
                 log.info('Monolith stats details: (%s) has (%s) for (%s). '
                          'Value: %s' % (metric, count, date, value))
@@ -45,8 +50,119 @@ def update_monolith_stats(metric, date, **kw):
             log.critical('Update of monolith table failed: (%s): %s'
                          % ([metric, date], e))
 
+    try:
+        MonolithRecord.objects.bulk_create(records)
+    except Exception as e:
+        log.critical('Update of monolith table failed: (%s): %s'
+                     % ([metric, date], e))
+
+
+class GroupedAppCounts(object):
+    """
+    Counts of the apps of a queryset by package type and premium type, in
+    each region.
+
+    Two GROUP BY queries are made the first time a count is needed: one for
+    the totals by package and premium type, one for the apps excluded from
+    each region. A region's count is the total minus the excluded apps.
+    """
+
+    def __init__(self, apps):
+        self.apps = apps
+        self._totals = None
+        self._excluded = None
+
+    def _fetch(self):
+        self._totals = defaultdict(int)
+        for row in (self.apps.order_by()
+                    .values('is_packaged', 'premium_type')
+                    .annotate(num=Count('id'))):
+            self._totals[(bool(row['is_packaged']),
+                          row['premium_type'])] += row['num']
+
+        self._excluded = defaultdict(int)
+        for row in (AddonExcludedRegion.objects
+                    .filter(addon__in=self.apps.values('id'))
+                    .order_by()
+                    .values('region', 'addon__is_packaged',
+                            'addon__premium_type')
+                    .annotate(num=Count('addon', distinct=True))):
+            self._excluded[(row['region'], bool(row['addon__is_packaged']),
+                            row['addon__premium_type'])] += row['num']
+
+    def count(self, region, is_packaged=None, premium_type=None):
+        """
+        Returns the number of apps not excluded from `region`, optionally
+        only the packaged or hosted ones, or the ones of a premium type.
+        """
+        if self._totals is None:
+            self._fetch()
+
+        def matches(key):
+            return ((is_packaged is None or key[0] == is_packaged) and
+                    (premium_type is None or key[1] == premium_type))
+
+        total = sum(num for key, num in self._totals.items() if matches(key))
+        excluded = sum(num for key, num in self._excluded.items()
+                       if key[0] == region and matches(key[1:]))
+        return total - excluded
+
+
+def _get_app_dimension_jobs(apps, grouped=True):
+    """
+    Return the jobs counting `apps` by region and package type, and by
+    region and premium type.
+
+    If `grouped` is False, every count is a separate COUNT query rather than
+    a lookup in `GroupedAppCounts`.
+    """
+    package_counts = []
+    premium_counts = []
+
+    # privileged==packaged for our consideration.
+    package_types = amo.ADDON_WEBAPP_TYPES.copy()
+    package_types.pop(amo.ADDON_WEBAPP_PRIVILEGED)
+
+    counts = GroupedAppCounts(apps)
+
+    for region_slug, region in REGIONS_CHOICES_SLUG:
+        # Apps by package type and region.
+        for package_type in package_types.values():
+            is_packaged = package_type == 'packaged'
+            if grouped:
+                count = partial(counts.count, region.id,
+                                is_packaged=is_packaged)
+            else:
+                count = (apps
+                         .filter(is_packaged=is_packaged)
+                         .exclude(addonexcludedregion__region=region.id)
+                         .count)
+            package_counts.append({
+                'count': count,
+                'dimensions': {'region': region_slug,
+                               'package_type': package_type},
+            })
+
+        # Apps by premium type and region.
+        for premium_type, pt_name in amo.ADDON_PREMIUM_API.items():
+            if grouped:
+                count = partial(counts.count, region.id,
+                                premium_type=premium_type)
+            else:
+                count = (apps
+                         .filter(premium_type=premium_type)
+                         .exclude(addonexcludedregion__region=region.id)
+                         .count)
+            premium_counts.append({
+                'count': count,
+                'dimensions': {'region': region_slug,
+                               'premium_type': pt_name},
+            })
 
-def _get_monolith_jobs(date=None):
+    return package_counts, premium_counts
+
+
+def _get_monolith_jobs(date=None, grouped=True):
     """
     Return a dict of Monolith based statistics queries.
 
@@ -59,6 +175,9 @@ def _get_monolith_jobs(date=None):
 
     If a date is specified and applies to the job it will be used.  Otherwise
     the date will default to today().
+
+    The counts by region are computed with a few GROUP BY queries, unless
+    `grouped` is False, see `_get_app_dimension_jobs`.
     """
     if not date:
         date = datetime.date.today()
@@ -103,37 +222,7 @@ def _get_monolith_jobs(date=None):
 
     # Add various "Apps Added" for all the dimensions we need.
     apps = Webapp.objects.filter(created__range=(date, next_date))
-
-    package_counts = []
-    premium_counts = []
-
-    # privileged==packaged for our consideration.
-    package_types = amo.ADDON_WEBAPP_TYPES.copy()
-    package_types.pop(amo.ADDON_WEBAPP_PRIVILEGED)
-
-    for region_slug, region in REGIONS_CHOICES_SLUG:
-        # Apps added by package type and region.
-        for package_type in package_types.values():
-            package_counts.append({
-                'count': (apps
-                          .filter(is_packaged=package_type == 'packaged')
-                          .exclude(addonexcludedregion__region=region.id)
-                          .count),
-                'dimensions': {'region': region_slug,
-                               'package_type': package_type},
-            })
-
-        # Apps added by premium type and region.
-        for premium_type, pt_name in amo.ADDON_PREMIUM_API.items():
-            premium_counts.append({
-                'count': (apps
-                          .filter(premium_type=premium_type)
-                          .exclude(addonexcludedregion__region=region.id)
-                          .count),
-                'dimensions': {'region': region_slug,
-                               'premium_type': pt_name},
-            })
-
+    package_counts, premium_counts = _get_app_dimension_jobs(apps, grouped)
     stats.update({'apps_added_by_package_type': package_counts})
     stats.update({'apps_added_by_premium_type': premium_counts})
 
@@ -141,32 +230,7 @@ def _get_monolith_jobs(date=None):
     apps = Webapp.objects.filter(_current_version__reviewed__lt=next_date,
                                  status__in=amo.LISTED_STATUSES,
                                  disabled_by_user=False)
-    package_counts = []
-    premium_counts = []
-
-    for region_slug, region in REGIONS_CHOICES_SLUG:
-        # Apps available by package type and region.
-        for package_type in package_types.values():
-            package_counts.append({
-                'count': (apps
-                          .filter(is_packaged=package_type == 'packaged')
-                          .exclude(addonexcludedregion__region=region.id)
-                          .count),
-                'dimensions': {'region': region_slug,
-                               'package_type': package_type},
-            })
-
-        # Apps available by premium type and region.
-        for premium_type, pt_name in amo.ADDON_PREMIUM_API.items():
-            premium_counts.append({
-                'count': (apps
-                          .filter(premium_type=premium_type)
-                          .exclude(addonexcludedregion__region=region.id)
-                          .count),
-                'dimensions': {'region': region_slug,
-                               'premium_type': pt_name},
-            })
-
+    package_counts, premium_counts = _get_app_dimension_jobs(apps, grouped)
     stats.update({'apps_available_by_package_type': package_counts})
     stats.update({'apps_available_by_premium_type': premium_counts})
 
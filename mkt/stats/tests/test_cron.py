@@ -20,8 +20,8 @@ class TestMonolithStats(amo.tests.TestCase):
         metric = 'mmo_user_count_total'
 
         tasks.update_monolith_stats(metric, datetime.date.today())
-        self.assertTrue(record.objects.create.called)
-        eq_(record.objects.create.call_args[1]['value'], '{"count": 1}')
+        self.assertTrue(record.objects.bulk_create.called)
+        eq_(record.call_args[1]['value'], '{"count": 1}')
 
     def test_app_new(self):
         Webapp.objects.create()
@@ -154,3 +154,38 @@ class TestMonolithStats(amo.tests.TestCase):
 
         eq_(tasks._get_monolith_jobs()
             ['mmo_developer_count_total'][0]['count'](), 2)
+
+    def test_grouped_counts_match(self):
+        today = datetime.date(2013, 1, 25)
+        apps = [Webapp.objects.create(premium_type=premium_type,
+                                      is_packaged=is_packaged)
+                for premium_type in amo.ADDON_PREMIUM_API
+                for is_packaged in (True, False)]
+        regions = dict(REGIONS_CHOICES_SLUG)
+        for i, app in enumerate(apps):
+            app.update(_current_version=Version.objects.create(
+                           addon=app, reviewed=today),
+                       status=amo.STATUS_PUBLIC, created=today)
+            app.addonexcludedregion.create(region=regions['br'].id)
+            if i % 2:
+                app.addonexcludedregion.create(region=regions['us'].id)
+        # Not added or available on this day, excluded regions don't count.
+        Webapp.objects.create().addonexcludedregion.create(
+            region=regions['us'].id)
+
+        grouped = tasks._get_monolith_jobs(today)
+        ungrouped = tasks._get_monolith_jobs(today, grouped=False)
+        for metric in ('apps_added_by_package_type',
+                       'apps_added_by_premium_type',
+                       'apps_available_by_package_type',
+                       'apps_available_by_premium_type'):
+            eq_([(job['dimensions'], job['count']())
+                 for job in grouped[metric]],
+                [(job['dimensions'], job['count']())
+                 for job in ungrouped[metric]])
+
+    def test_grouped_counts_queries(self):
+        jobs = tasks._get_monolith_jobs()['apps_added_by_package_type']
+        with self.assertNumQueries(2):
+            for job in jobs:
+                job['count']()
@@ -0,0 +1,69 @@
+"""
+Benchmarks loading the translations of a page of apps.
+
+Attaches the translations of `--page-size` public apps, the size of an API
+listing page, with nothing cached, from the cache, and from the translations
+already loaded during the request. Reports the number of queries and the time
+each one needed.
+
+Call like:
+
+    ./manage.py benchmark_translations --page-size=25
+
+"""
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+import amo
+from mkt.translations.models import (attach_trans_dict, forget_translations,
+                                     start_loading_translations,
+                                     stop_loading_translations)
+from mkt.webapps.models import Webapp
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option('--page-size', type='int', default=25,
+                    help='Number of apps to load the translations of.'),
+    )
+
+    help = __doc__
+
+    def _measure(self, fn):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.time()
+            fn()
+            elapsed = time.time() - start
+        return len(queries), elapsed
+
+    def handle(self, *args, **kw):
+        apps = list(Webapp.objects.no_cache().no_transforms()
+                    .filter(status=amo.STATUS_PUBLIC)
+                    .order_by('-id')[:kw['page_size']])
+        fields = Webapp._meta.translated_fields
+        ids = [getattr(app, f.attname) for f in fields for app in apps
+               if getattr(app, f.attname, None) is not None]
+
+        def attach():
+            attach_trans_dict(Webapp, apps)
+
+        def uncached():
+            forget_translations(ids)
+            attach()
+
+        self.stdout.write('Loading the translations of %s apps.' % len(apps))
+        try:
+            for name, fn in (('uncached', uncached), ('cached', attach),
+                             ('loaded', attach)):
+                if name != 'loaded':
+                    # Only the last run reuses what was loaded.
+                    start_loading_translations(sender=None)
+                num_queries, elapsed = self._measure(fn)
+                self.stdout.write('%-9s %6s queries %8.2fms' %
+                                  (name, num_queries, elapsed * 1000))
+        finally:
+            stop_loading_translations(sender=None)
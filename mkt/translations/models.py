@@ -1,6 +1,8 @@
 import collections
-from itertools import groupby
+from threading import local
 
+from django.core.cache import cache
+from django.core.signals import request_finished, request_started
 from django.db import connections, models, router
 from django.db.models.deletion import Collector
 from django.utils import encoding
@@ -16,6 +18,11 @@ from . import utils
 
 log = commonware.log.getLogger('z.translations')
 
+# How long the strings of translations are cached, see get_translation_rows.
+TRANSLATIONS_CACHE_TIMEOUT = 60 * 60
+
+_loaded = local()
+
 
 class TranslationManager(ManagerBase):
 
@@ -25,6 +32,7 @@ class TranslationManager(ManagerBase):
         qs = Translation.objects.filter(id__in=filter(None, ids),
                                         locale=locale)
         qs.update(localized_string=None, localized_string_clean=None)
+        forget_translations(filter(None, ids))
 
 
 class Translation(ModelBase):
@@ -262,8 +270,72 @@ def delete_translation(obj, fieldname):
         Translation.objects.filter(id=trans_id).delete()
 
 
-def _sorted_groupby(seq, key):
-    return groupby(sorted(seq, key=key), key=key)
+def _translation_key(trans_id):
+    return 'translations:%s' % trans_id
+
+
+def get_translation_rows(ids):
+    """
+    Return a dict of the `(locale, localized_string, localized_string_clean)`
+    tuples of the translations with those ids, keyed by id.
+
+    The rows are looked up in the ones already loaded during the request,
+    then in the cache, and only the missing ones are fetched, in one query.
+    """
+    ids = set(ids)
+    loaded = getattr(_loaded, 'translations', None)
+    rows = {}
+    if loaded is not None:
+        rows.update((trans_id, loaded[trans_id]) for trans_id in ids
+                    if trans_id in loaded)
+
+    missing = ids.difference(rows)
+    if missing:
+        keys = dict((_translation_key(trans_id), trans_id)
+                    for trans_id in missing)
+        rows.update((keys[key], value)
+                    for key, value in cache.get_many(keys.keys()).items())
+        missing.difference_update(rows)
+
+    if missing:
+        fetched = dict((trans_id, []) for trans_id in missing)
+        qs = (Translation.objects
+              .filter(id__in=missing, localized_string__isnull=False)
+              .values_list('id', 'locale', 'localized_string',
+                           'localized_string_clean'))
+        for trans_id, locale, string, clean in qs:
+            fetched[trans_id].append((locale, string, clean))
+        cache.set_many(dict((_translation_key(trans_id), value)
+                            for trans_id, value in fetched.items()),
+                       TRANSLATIONS_CACHE_TIMEOUT)
+        rows.update(fetched)
+
+    if loaded is not None:
+        loaded.update(rows)
+    return rows
+
+
+def forget_translations(ids):
+    """Remove translations from the caches of get_translation_rows."""
+    loaded = getattr(_loaded, 'translations', None)
+    if loaded is not None:
+        for trans_id in ids:
+            loaded.pop(trans_id, None)
+    cache.delete_many([_translation_key(trans_id) for trans_id in ids])
+
+
+def translation_string(cls, locale, string, clean):
+    """
+    Return what unicode() would for a translation of class `cls` with those
+    values, without building it when the string is known.
+    """
+    if not issubclass(cls, PurifiedTranslation):
+        return string and unicode(string) or u''
+    if clean:
+        return unicode(clean)
+    # Let the class clean the string.
+    return unicode(cls(locale=locale, localized_string=string,
+                       localized_string_clean=clean))
 
 
 def attach_trans_dict(model, objs):
@@ -273,28 +345,51 @@ def attach_trans_dict(model, objs):
     ids = [getattr(obj, f.attname) for f in fields
            for obj in objs if getattr(obj, f.attname, None) is not None]
 
-    # Get translations in a dict, ids will be the keys. It's important to
-    # consume the result of groupby, which is an iterator.
-    qs = Translation.objects.filter(id__in=ids, localized_string__isnull=False)
-    all_translations = dict((k, list(v)) for k, v in
-                            _sorted_groupby(qs, lambda trans: trans.id))
-
-    def get_locale_and_string(translation, new_class):
-        """Convert the translation to new_class (making PurifiedTranslations
-           and LinkifiedTranslations work) and return locale / string tuple."""
-        converted_translation = new_class()
-        converted_translation.__dict__ = translation.__dict__
-        return (converted_translation.locale.lower(),
-                unicode(converted_translation))
-
-    # Build and attach translations for each field on each object.
+    all_translations = get_translation_rows(ids)
+
+    # Build and attach translations for each field on each object, as
+    # locale / string tuples. The string is the one of the translation class
+    # of the field (making PurifiedTranslations and LinkifiedTranslations
+    # work).
     for obj in objs:
         obj.translations = collections.defaultdict(list)
         for field in fields:
             t_id = getattr(obj, field.attname, None)
             field_translations = all_translations.get(t_id, None)
-            if not t_id or field_translations is None:
+            if not t_id or not field_translations:
                 continue
 
-            obj.translations[t_id] = [get_locale_and_string(t, field.rel.to)
-                                      for t in field_translations]
+            obj.translations[t_id] = [
+                (locale.lower(),
+                 translation_string(field.rel.to, locale, string, clean))
+                for locale, string, clean in field_translations]
+
+
+def start_loading_translations(sender, **kwargs):
+    """Keep the translations loaded during a request, for that request."""
+    _loaded.translations = {}
+
+
+def stop_loading_translations(sender, **kwargs):
+    _loaded.translations = None
+
+
+def translation_changed(sender, instance, **kwargs):
+    if not kwargs.get('raw'):
+        forget_translations([instance.id])
+
+
+request_started.connect(start_loading_translations,
+                        dispatch_uid='start_loading_translations')
+request_finished.connect(stop_loading_translations,
+                         dispatch_uid='stop_loading_translations')
+
+# Signals are sent with the proxy classes as senders.
+for cls in (Translation, PurifiedTranslation, LinkifiedTranslation,
+            NoLinksTranslation, NoLinksNoMarkupTranslation):
+    models.signals.post_save.connect(
+        translation_changed, sender=cls,
+        dispatch_uid='translation_saved_%s' % cls.__name__)
+    models.signals.post_delete.connect(
+        translation_changed, sender=cls,
+        dispatch_uid='translation_deleted_%s' % cls.__name__)
@@ -20,8 +20,10 @@ from mkt.translations import widgets
 from mkt.translations.models import (attach_trans_dict, LinkifiedTranslation,
                                      NoLinksTranslation,
                                      NoLinksNoMarkupTranslation,
-                                     PurifiedTranslation, Translation,
-                                     TranslationSequence)
+                                     PurifiedTranslation,
+                                     start_loading_translations,
+                                     stop_loading_translations, Translation,
+                                     translation_string, TranslationSequence)
 from mkt.translations.query import order_by_translation
 from testapp.models import TranslatedModel, UntranslatedModel, FancyModel
 
@@ -956,3 +958,45 @@ class TestAttachTransDict(TestCase):
             set([('en-us', 'English 2 Linkified'),
                  ('es', 'Spanish 2 Linkified'),
                  ('fr', 'French 2 Linkified')]))
+
+    def test_cached(self):
+        obj = FancyModel.objects.create(purified='Purified <b>bold</b>',
+                                        linkified='Linkified')
+        attach_trans_dict(FancyModel, [obj])
+        expected = dict(obj.translations)
+        with self.assertNumQueries(0):
+            attach_trans_dict(FancyModel, [obj])
+        eq_(dict(obj.translations), expected)
+
+    def test_cache_invalidated(self):
+        obj = FancyModel.objects.create(purified='Purified')
+        attach_trans_dict(FancyModel, [obj])
+        obj.purified = 'Purified again'
+        obj.save()
+        attach_trans_dict(FancyModel, [obj])
+        eq_(obj.translations[obj.purified_id], [('en-us', 'Purified again')])
+
+        Translation.objects.remove_for(obj, 'en-us')
+        attach_trans_dict(FancyModel, [obj])
+        eq_(obj.translations[obj.purified_id], [])
+
+    def test_loaded_during_request(self):
+        obj = FancyModel.objects.create(purified='Purified')
+        start_loading_translations(sender=None)
+        try:
+            attach_trans_dict(FancyModel, [obj])
+            with patch('mkt.translations.models.cache') as cache:
+                attach_trans_dict(FancyModel, [obj])
+            ok_(not cache.get_many.called)
+        finally:
+            stop_loading_translations(sender=None)
+        eq_(obj.translations[obj.purified_id], [('en-us', 'Purified')])
+
+    def test_translation_string(self):
+        eq_(translation_string(Translation, 'en-us', '<b>x</b>', None),
+            '<b>x</b>')
+        eq_(translation_string(PurifiedTranslation, 'en-us', '<b>x</b>',
+                               'clean'), 'clean')
+        eq_(translation_string(PurifiedTranslation, 'en-us', '<script>',
+                               None),
+            unicode(PurifiedTranslation(localized_string='<script>')))
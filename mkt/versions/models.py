@@ -113,6 +113,16 @@ class Version(ModelBase):
         if send_signal:
             version_uploaded.send(sender=v)
 
+        if addon.is_packaged:
+            # Sign the reviewer copy in the background so it's ready when a
+            # reviewer installs it. The public copy is signed on approval.
+            # To avoid circular import.
+            from lib.crypto.packaged import presign
+            presign.apply_async(
+                args=[v.pk], kwargs={'reviewer': True},
+                eta=datetime.datetime.now() +
+                    datetime.timedelta(seconds=settings.NFS_LAG_DELAY))
+
         # If packaged app and app is blocked, put in escalation queue.
         if addon.is_packaged and addon.status == amo.STATUS_BLOCKED:
             # To avoid circular import.
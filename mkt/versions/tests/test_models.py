@@ -61,6 +61,23 @@ class TestVersion(BaseUploadTest, amo.tests.TestCase):
         eq_(version.version, '42.1')
         eq_(version.developer_name, truncated_developer_name)
 
+    @mock.patch('lib.crypto.packaged.presign.apply_async')
+    @mock.patch('mkt.files.utils.parse_addon')
+    def test_presign_from_upload(self, parse_addon, presign):
+        parse_addon.return_value = {'version': '42.0'}
+        addon = Webapp.objects.get(pk=337141)
+        path = os.path.join(settings.ROOT, 'mkt', 'developers', 'tests',
+                            'addons', 'mozball.webapp')
+        upload = self.get_upload(abspath=path)
+        Version.from_upload(upload, addon)
+        assert not presign.called
+
+        addon.update(is_packaged=True)
+        upload = self.get_upload(abspath=path)
+        version = Version.from_upload(upload, addon)
+        eq_(presign.call_args[1]['args'], [version.pk])
+        eq_(presign.call_args[1]['kwargs'], {'reviewer': True})
+
     def test_is_privileged_hosted_app(self):
         addon = Webapp.objects.get(pk=337141)
         eq_(addon.current_version.is_privileged, False)
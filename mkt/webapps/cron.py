@@ -130,12 +130,13 @@ def update_app_trending():
     """
     Update trending for all published apps.
 
-    Spread these tasks out successively by 15 seconds so they don't hit
-    Monolith all at once.
+    Each task makes a single Monolith query for its chunk of apps. Spread
+    these tasks out successively by 5 seconds so they don't hit Monolith all
+    at once.
 
     """
-    chunk_size = 50
-    seconds_between = 15
+    chunk_size = 500
+    seconds_between = 5
 
     all_ids = list(Webapp.objects.filter(status=amo.STATUS_PUBLIC)
                    .values_list('id', flat=True))
@@ -174,11 +175,12 @@ def update_app_downloads():
     """
     Update download/install stats for all apps.
 
-    Spread these tasks out successively by `seconds_between` seconds so they
-    don't hit Monolith all at once.
+    Each task makes two Monolith queries for its chunk of apps. Spread these
+    tasks out successively by `seconds_between` seconds so they don't hit
+    Monolith all at once.
 
     """
-    chunk_size = 50
+    chunk_size = 500
     seconds_between = 2
 
     all_ids = list(Webapp.objects.filter(status=amo.STATUS_PUBLIC)
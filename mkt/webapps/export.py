@@ -0,0 +1,351 @@
+"""
+Streaming export of the public data: apps, collections and user installs.
+
+The objects are read in batches ordered by ID, serialized, optionally in a
+pool of local processes, and streamed straight into a gzipped tarball laid out
+like the one of `export_data`, or into a newline-delimited JSON file. No file
+is written per object.
+"""
+import datetime
+import json
+import logging
+import os
+import tarfile
+import time
+from multiprocessing import Pool
+from StringIO import StringIO
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.template import Context, loader
+
+import pytz
+from elasticsearch.serializer import JSONSerializer
+from test_utils import RequestFactory
+
+from amo.utils import chunked, JSONEncoder
+from mkt.constants.regions import RESTOFWORLD
+from mkt.files.models import File
+from mkt.users.models import UserProfile
+from mkt.versions.models import Version
+from mkt.webapps.models import Installed, Preview, Webapp
+
+
+log = logging.getLogger('z.webapps.export')
+
+
+def get_export_request():
+    """Anonymous, rest of world request to serialize the exported data."""
+    request = RequestFactory().get('/')
+    request.user = AnonymousUser()
+    request.REGION = RESTOFWORLD
+    return request
+
+
+def object_path(pk):
+    return os.path.join(str(pk / 1000), '{pk}.json'.format(pk=pk))
+
+
+def serialize_apps(ids):
+    """
+    Serialize the apps matching `ids`.
+
+    The related data of the whole batch is fetched like for bulk indexing,
+    with one query per related table, into the Elasticsearch documents of the
+    apps. Those are serialized by `ESAppSerializer` like search results, so
+    the number of queries doesn't grow with the size of the batch. Premium
+    apps still need their prices from the database.
+
+    Returns a list of `(path, json)` tuples ordered by ID.
+    """
+    from mkt.webapps.indexers import WebappIndexer
+    from mkt.webapps.serializers import ESAppSerializer
+    apps = list(Webapp.objects.no_cache().no_transforms()
+                .filter(pk__in=ids).order_by('pk'))
+    # Round-trip the documents through JSON like Elasticsearch would, the
+    # serializer expects its dates as strings.
+    documents = json.loads(JSONSerializer().dumps(
+        WebappIndexer.extract_documents(apps)))
+    serializer = ESAppSerializer(context={'request': get_export_request()})
+    return [(os.path.join('apps', object_path(document['id'])),
+             json.dumps(serializer.to_native(document), cls=JSONEncoder))
+            for document in documents]
+
+
+def get_user_installs_data(users):
+    """
+    Returns the data exported for the installs of each user of `users`, with
+    a single query for all their installs and one for the apps.
+    """
+    installs = list(Installed.objects.filter(user__in=[u.pk for u in users])
+                    .order_by('pk')
+                    .values_list('user', 'addon', 'created'))
+    # Deleted apps are left out, we can't recommend them.
+    slugs = dict(Webapp.objects.filter(pk__in=set(i[1] for i in installs))
+                 .values_list('pk', 'app_slug'))
+
+    zone = pytz.timezone(settings.TIME_ZONE)
+    installed = dict((user.pk, []) for user in users)
+    for user_id, app_id, created in installs:
+        if app_id not in slugs:
+            continue
+        installed[user_id].append({
+            'id': app_id,
+            'slug': slugs[app_id],
+            'installed': pytz.utc.normalize(
+                zone.localize(created)).strftime('%Y-%m-%dT%H:%M:%S')
+        })
+
+    return [{'user': user.recommendation_hash,
+             'region': user.region,
+             'lang': user.lang,
+             'installed_apps': installed[user.pk]} for user in users]
+
+
+def serialize_user_installs(ids):
+    """
+    Serialize the installs of the users matching `ids`.
+
+    Returns a list of `(path, json)` tuples ordered by user ID.
+    """
+    users = list(UserProfile.objects.filter(pk__in=ids).order_by('pk'))
+    return [(os.path.join('users', data['user'][0],
+                          '%s.json' % data['user']),
+             json.dumps(data, cls=JSONEncoder))
+            for data in get_user_installs_data(users)]
+
+
+def iter_serialized(serialize, ids, batch_size=100, workers=1):
+    """
+    Yields the `(path, json)` tuples of `serialize` for each batch of `ids`,
+    in order.
+
+    With more than one worker, the batches are serialized by a pool of local
+    processes.
+    """
+    batches = chunked(ids, batch_size)
+    if workers <= 1:
+        for batch in batches:
+            for item in serialize(batch):
+                yield item
+        return
+
+    # Don't share the database connection with the worker processes.
+    connection.close()
+    pool = Pool(processes=workers)
+    try:
+        for items in pool.imap(serialize, batches):
+            for item in items:
+                yield item
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+class TarWriter(object):
+    """Writes files to a gzipped tarball, from memory."""
+
+    def __init__(self, path):
+        self.tarball = tarfile.open(path, 'w:gz')
+
+    def add(self, path, content):
+        if isinstance(content, unicode):
+            content = content.encode('utf-8')
+        info = tarfile.TarInfo(path)
+        info.size = len(content)
+        info.mtime = time.time()
+        self.tarball.addfile(info, StringIO(content))
+
+    def close(self):
+        self.tarball.close()
+
+
+class JSONLinesWriter(object):
+    """
+    Writes the JSON files to a newline-delimited JSON file, one object per
+    line with its path. Other files are left out.
+    """
+
+    def __init__(self, path):
+        self.output = open(path, 'w')
+
+    def add(self, path, content):
+        if path.endswith('.json'):
+            self.output.write('{"path": %s, "data": %s}\n'
+                              % (json.dumps(path), content))
+
+    def close(self):
+        self.output.close()
+
+
+WRITERS = {
+    'tar': (TarWriter, '.tgz'),
+    'ndjson': (JSONLinesWriter, '.ndjson'),
+}
+
+
+def render_extra_files(template_dir, date):
+    """Yields the `(path, content)` of the license and readme files."""
+    context = Context({'date': date, 'url': settings.SITE_URL})
+    for f in ('license.txt', 'readme.txt'):
+        template = loader.get_template(template_dir + f)
+        yield f, template.render(context)
+
+
+def get_last_export_path(root, name):
+    return os.path.join(root, 'tarballs', '.last-%s' % name)
+
+
+def get_last_export(root, name):
+    """Returns when the last export of `name` was started, if any."""
+    try:
+        with open(get_last_export_path(root, name)) as f:
+            return datetime.datetime.strptime(f.read().strip(),
+                                              '%Y-%m-%d %H:%M:%S')
+    except (IOError, ValueError):
+        return None
+
+
+def set_last_export(root, name, started):
+    with open(get_last_export_path(root, name), 'w') as f:
+        f.write(started.strftime('%Y-%m-%d %H:%M:%S'))
+
+
+def get_last_export_ids(root, name):
+    """Returns the IDs of the objects of the last export of `name`, if any."""
+    try:
+        with open(get_last_export_path(root, name) + '-ids') as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+
+def set_last_export_ids(root, name, ids):
+    with open(get_last_export_path(root, name) + '-ids', 'w') as f:
+        json.dump(ids, f)
+
+
+def get_changed_app_ids(since):
+    """
+    Returns the IDs of the apps changed since `since`: the app itself, one of
+    its versions, a file of one of them, or one of its previews.
+    """
+    changed = set(Webapp.with_deleted.filter(modified__gte=since)
+                  .values_list('pk', flat=True))
+    changed.update(Version.with_deleted.filter(modified__gte=since)
+                   .values_list('addon', flat=True))
+    changed.update(File.objects.filter(modified__gte=since)
+                   .values_list('version__addon', flat=True))
+    changed.update(Preview.objects.filter(modified__gte=since)
+                   .values_list('addon', flat=True))
+    return changed
+
+
+def write_export(root, name, filename, items, format='tar'):
+    """
+    Write the `(path, content)` of `items` to
+    `root`/tarballs/`filename` in `format`.
+
+    Returns the path of the export.
+    """
+    writer_class, extension = WRITERS[format]
+    target_dir = os.path.join(root, 'tarballs')
+    if not os.path.exists(target_dir):
+        os.makedirs(target_dir)
+    target_file = os.path.join(target_dir, filename + extension)
+
+    log.info(u'Creating {0} export {1}'.format(name, target_file))
+    start = time.time()
+    count = 0
+    writer = writer_class(target_file)
+    try:
+        for path, content in items:
+            writer.add(path, content)
+            count += 1
+    finally:
+        writer.close()
+    log.info(u'Exported {0} files to {1} in {2:.2f}s'.format(
+        count, target_file, time.time() - start))
+    return target_file
+
+
+def export_apps(filename=None, format='tar', incremental=False, workers=1,
+                batch_size=100):
+    """
+    Export the public apps and collections to `DUMPED_APPS_PATH`, streamed
+    into a single file.
+
+    If `incremental` is True, only the apps changed since the start of the
+    last export are included, see `get_changed_app_ids`, along with the apps
+    that became public again. The IDs of the apps that were hidden or
+    deleted since then are listed in "apps/removed.json".
+
+    The download counts and ratings are written in bulk by the crons without
+    changing the apps, and a deleted preview or file leaves no trace: an
+    incremental export only has them for the apps changed otherwise.
+    """
+    from mkt.collections.models import Collection
+    from mkt.collections.tasks import collection_data
+
+    root = settings.DUMPED_APPS_PATH
+    started = datetime.datetime.now().replace(microsecond=0)
+    today = started.strftime('%Y-%m-%d')
+    filename = filename or today
+
+    visible = list(Webapp.objects.visible().order_by('pk')
+                   .values_list('pk', flat=True))
+    ids, removed = visible, []
+    if incremental:
+        since = get_last_export(root, 'apps')
+        last_ids = get_last_export_ids(root, 'apps')
+        if since and last_ids is not None:
+            last_ids = set(last_ids)
+            changed = get_changed_app_ids(since)
+            ids = [pk for pk in visible
+                   if pk in changed or pk not in last_ids]
+            removed = sorted(last_ids.difference(visible))
+
+    def items():
+        for item in iter_serialized(serialize_apps, ids,
+                                    batch_size=batch_size, workers=workers):
+            yield item
+        if removed:
+            yield os.path.join('apps', 'removed.json'), json.dumps(removed)
+        for collection in Collection.public.order_by('pk').iterator():
+            yield (os.path.join('collections', object_path(collection.pk)),
+                   json.dumps(collection_data(collection), cls=JSONEncoder))
+        for item in render_extra_files('webapps/dump/apps/', today):
+            yield item
+
+    target_file = write_export(root, 'apps', filename, items(), format)
+    set_last_export(root, 'apps', started)
+    set_last_export_ids(root, 'apps', visible)
+    return target_file
+
+
+def export_user_installs(filename=None, format='tar', workers=1,
+                         batch_size=100):
+    """
+    Export the installs of the users to `DUMPED_USERS_PATH`, streamed into a
+    single file.
+    """
+    root = settings.DUMPED_USERS_PATH
+    today = datetime.datetime.utcnow().strftime('%Y-%m-%d')
+    filename = filename or today
+
+    ids = list(Installed.objects.order_by('user')
+               .values_list('user', flat=True).distinct())
+
+    def items():
+        for item in iter_serialized(serialize_user_installs, ids,
+                                    batch_size=batch_size, workers=workers):
+            yield item
+        for path, content in render_extra_files('webapps/dump/users/',
+                                                today):
+            yield os.path.join('users', path), content
+
+    return write_export(root, 'users', filename, items(), format)
@@ -1,14 +1,16 @@
+import json
 import sys
 from operator import attrgetter
 
 from django.conf import settings
 from django.core.urlresolvers import reverse
-from django.db.models import Min
+from django.db.models import Count, Min
 from elasticsearch_dsl import F, filter as es_filter, query
 
 import commonware.log
 
 import amo
+from amo.utils import sorted_groupby
 
 import mkt
 from mkt.constants import APP_FEATURES
@@ -236,57 +238,286 @@ class WebappIndexer(BaseIndexer):
                           attach_translations):
             transform([obj])
 
+        version = obj.current_version
+        if version:
+            attach_trans_dict(Version, [version])
+        # Keep the geodata, which may have just been created, on the app so
+        # that its translations stick around.
+        obj._geodata = obj.geodata
+        attach_trans_dict(Geodata, [obj.geodata])
+
+        related = {
+            'collection': [{'id': cms.collection_id, 'order': cms.order}
+                           for cms in obj.collectionmembership_set.all()],
+            'content_ratings': obj.content_ratings.all(),
+            'features': (version.features.to_dict()
+                         if version else AppFeatures().to_dict()),
+            'installed_count': Installed.objects.filter(addon=obj).count(),
+            'is_escalated': obj.escalationqueue_set.exists(),
+            'is_rereviewed': obj.rereviewqueue_set.exists(),
+            'owners': [au.user.id for au in obj.addonuser_set.filter(
+                role=amo.AUTHOR_ROLE_OWNER)],
+            'previews': obj.previews.all(),
+            'region_exclusions': obj.get_excluded_region_ids(),
+            'reviewed': obj.versions.filter(deleted=False).aggregate(
+                Min('reviewed')).get('reviewed__min'),
+            'upsell': None,
+            'uses_flash': obj.uses_flash,
+            'versions': obj.versions.all(),
+        }
+        try:
+            related['content_descriptors'] = obj.rating_descriptors.to_keys()
+        except RatingDescriptors.DoesNotExist:
+            related['content_descriptors'] = []
+        try:
+            related['interactive_elements'] = (
+                obj.rating_interactives.to_keys())
+        except RatingInteractives.DoesNotExist:
+            related['interactive_elements'] = []
+        try:
+            related['price_tier'] = obj.addonpremium.price.name
+        except AddonPremium.DoesNotExist:
+            related['price_tier'] = None
+        if obj.upsell:
+            upsell_obj = obj.upsell.premium
+            related['upsell'] = (upsell_obj,
+                                 upsell_obj.get_excluded_region_ids())
+
+        return cls._build_document(obj, related)
+
+    @classmethod
+    def extract_documents(cls, objs):
+        """
+        Bulk version of `extract_document`.
+
+        Extracts the ElasticSearch index documents for all the `objs` apps,
+        fetching every related table with one query for the whole list
+        instead of a couple dozen queries per app. Documents are identical
+        to the ones returned by `extract_document`.
+        """
+        related = cls.get_related_data(objs)
+        return [cls._build_document(obj, related[obj.id]) for obj in objs]
+
+    @classmethod
+    def get_related_data(cls, objs):
+        """
+        Fetches all the data `_build_document` needs for the `objs` apps with
+        one query per related table.
+
+        Returns a dict of the related data keyed by app id. Translations,
+        versions, geodata and the other attributes the document is built from
+        are attached to the apps themselves.
+        """
+        from mkt.collections.models import CollectionMembership
+        from mkt.reviewers.models import EscalationQueue, RereviewQueue
+        from mkt.webapps.models import (AddonExcludedRegion, AddonUpsell,
+                                        AddonUser, AppFeatures, AppManifest,
+                                        attach_devices, attach_prices,
+                                        attach_tags, attach_translations,
+                                        ContentRating, Geodata, Installed,
+                                        Preview, RatingDescriptors,
+                                        RatingInteractives, Webapp)
+
+        objs = list(objs)
+        if not objs:
+            return {}
+
+        ids = [obj.id for obj in objs]
+
+        # Attach everything we need to index apps.
+        for transform in (attach_devices, attach_prices, attach_tags,
+                          attach_translations):
+            transform(objs)
+
+        def group(qs, key):
+            return dict((k, list(v)) for k, v in sorted_groupby(qs, key))
+
+        # Premium upsells are indexed along with their own region exclusions,
+        # so they are fetched here and share the exclusions/geodata queries.
+        upsells = dict(AddonUpsell.objects.no_cache().filter(free__in=ids)
+                       .values_list('free', 'premium'))
+        upsell_dict = {}
+        if upsells:
+            upsell_dict = dict(
+                (app.id, app) for app in
+                Webapp.with_deleted.no_cache().filter(id__in=upsells.values()))
+        all_ids = set(ids) | set(upsell_dict)
+
+        # Versions, with their files attached by the Version transformer.
+        # Current and latest versions are taken from that same list.
+        versions = group(Version.objects.no_cache().filter(addon__in=ids),
+                         'addon_id')
+        for obj in objs:
+            app_versions = dict((v.id, v) for v in versions.get(obj.id, []))
+            for v in app_versions.values():
+                v.addon = obj
+            if obj._current_version_id in app_versions:
+                obj._current_version = app_versions[obj._current_version_id]
+            if obj._latest_version_id in app_versions:
+                obj._latest_version = app_versions[obj._latest_version_id]
+
+        current_versions = filter(None, (obj.current_version for obj in objs))
+        attach_trans_dict(Version, current_versions)
+        features = dict(
+            (f.version_id, f.to_dict()) for f in
+            AppFeatures.objects.no_cache().filter(
+                version__in=[v.id for v in current_versions]))
+
+        # Manifests are needed for `is_offline` (hosted apps, from the
+        # current version) and `is_privileged` (packaged apps, from the latest
+        # version).
+        manifest_versions = [
+            obj.latest_version if obj.is_packaged else obj.current_version
+            for obj in objs]
+        manifests = dict(AppManifest.objects.no_cache()
+                         .filter(version__in=[v.id for v in manifest_versions
+                                              if v])
+                         .values_list('version', 'manifest'))
+
+        def get_manifest(version):
+            manifest = manifests[version.id]
+            return json.loads(manifest) if manifest else {}
+
+        for obj in objs:
+            latest, current = obj.latest_version, obj.current_version
+            if (obj.is_packaged and latest and latest.all_files and
+                    latest.id in manifests):
+                latest.is_privileged = (
+                    get_manifest(latest).get('type') == 'privileged')
+            if not obj.is_packaged:
+                if not current or not current.all_files:
+                    obj.is_offline = False
+                elif current.id in manifests:
+                    obj.is_offline = 'appcache_path' in get_manifest(current)
+
+        geodata = dict((g.addon_id, g) for g in
+                       Geodata.objects.no_cache().filter(addon__in=all_ids))
+        for app in objs + upsell_dict.values():
+            # `Webapp.geodata` creates the missing ones.
+            app._geodata = geodata.get(app.id) or app.geodata
+        attach_trans_dict(Geodata, [obj.geodata for obj in objs])
+
+        aers = group(AddonExcludedRegion.objects.no_cache()
+                     .filter(addon__in=all_ids).values_list('addon', 'region'),
+                     lambda x: x[0])
+        aers = dict((k, [region for _, region in v])
+                    for k, v in aers.items())
+
+        collections = group(
+            CollectionMembership.objects.no_cache().filter(app__in=ids),
+            'app_id')
+        content_ratings = group(
+            ContentRating.objects.no_cache().filter(addon__in=ids),
+            'addon_id')
+        descriptors = dict(
+            (rd.addon_id, rd.to_keys()) for rd in
+            RatingDescriptors.objects.no_cache().filter(addon__in=ids))
+        interactives = dict(
+            (ri.addon_id, ri.to_keys()) for ri in
+            RatingInteractives.objects.no_cache().filter(addon__in=ids))
+        escalated = set(EscalationQueue.objects.no_cache()
+                        .filter(addon__in=ids)
+                        .values_list('addon', flat=True))
+        rereviewed = set(RereviewQueue.objects.no_cache()
+                         .filter(addon__in=ids)
+                         .values_list('addon', flat=True))
+        installs = dict(Installed.objects.no_cache().filter(addon__in=ids)
+                        .values_list('addon').annotate(Count('id'))
+                        .order_by())
+        owners = group(AddonUser.objects.no_cache()
+                       .filter(addon__in=ids, role=amo.AUTHOR_ROLE_OWNER)
+                       .values_list('addon', 'user'), lambda x: x[0])
+        previews = group(
+            Preview.objects.no_cache().filter(addon__in=ids).no_transforms(),
+            'addon_id')
+        price_tiers = dict(AddonPremium.objects.no_cache()
+                           .filter(addon__in=ids)
+                           .values_list('addon', 'price__name'))
+
+        related = {}
+        for obj in objs:
+            app_versions = versions.get(obj.id, [])
+            reviewed = filter(None, (v.reviewed for v in app_versions))
+            current = obj.current_version
+            latest_file = None
+            if current and current.all_files:
+                latest_file = sorted(current.all_files,
+                                     key=attrgetter('created'))[-1]
+            upsell = None
+            if obj.id in upsells and upsells[obj.id] in upsell_dict:
+                upsell_obj = upsell_dict[upsells[obj.id]]
+                upsell = (upsell_obj, upsell_obj.get_excluded_region_ids(
+                    aers=aers.get(upsell_obj.id, [])))
+
+            related[obj.id] = {
+                'collection': [{'id': cms.collection_id, 'order': cms.order}
+                               for cms in collections.get(obj.id, [])],
+                'content_descriptors': descriptors.get(obj.id, []),
+                'content_ratings': content_ratings.get(obj.id, []),
+                'features': features.get(current.id if current else None,
+                                         AppFeatures().to_dict()),
+                'installed_count': installs.get(obj.id, 0),
+                'interactive_elements': interactives.get(obj.id, []),
+                'is_escalated': obj.id in escalated,
+                'is_rereviewed': obj.id in rereviewed,
+                'owners': [user for _, user in owners.get(obj.id, [])],
+                'previews': previews.get(obj.id, []),
+                'price_tier': price_tiers.get(obj.id),
+                'region_exclusions': obj.get_excluded_region_ids(
+                    aers=aers.get(obj.id, [])),
+                'reviewed': min(reviewed) if reviewed else None,
+                'upsell': upsell,
+                'uses_flash': latest_file.uses_flash if latest_file else False,
+                'versions': app_versions,
+            }
+        return related
+
+    @classmethod
+    def _build_document(cls, obj, related):
+        """
+        Builds the ElasticSearch index document for `obj` from the app itself
+        and the `related` data fetched by `extract_document` or
+        `get_related_data`.
+        """
         latest_version = obj.latest_version
         version = obj.current_version
         geodata = obj.geodata
-        features = (version.features.to_dict()
-                    if version else AppFeatures().to_dict())
 
         try:
             status = latest_version.statuses[0][1] if latest_version else None
         except IndexError:
             status = None
 
-        installed_ids = list(Installed.objects.filter(addon=obj)
-                             .values_list('id', flat=True))
-
         attrs = ('app_slug', 'bayesian_rating', 'created', 'id', 'is_disabled',
                  'last_updated', 'modified', 'premium_type', 'status',
-                 'uses_flash', 'weekly_downloads')
+                 'weekly_downloads')
         d = dict(zip(attrs, attrgetter(*attrs)(obj)))
 
-        d['boost'] = len(installed_ids) or 1
+        d['boost'] = related['installed_count'] or 1
         d['app_type'] = obj.app_type_id
         d['author'] = obj.developer_name
         d['banner_regions'] = geodata.banner_regions_slugs()
         d['category'] = obj.categories if obj.categories else []
         if obj.is_published:
-            d['collection'] = [{'id': cms.collection_id, 'order': cms.order}
-                               for cms in obj.collectionmembership_set.all()]
+            d['collection'] = related['collection']
         else:
             d['collection'] = []
-        d['content_ratings'] = (obj.get_content_ratings_by_body(es=True) or
-                                None)
-        try:
-            d['content_descriptors'] = obj.rating_descriptors.to_keys()
-        except RatingDescriptors.DoesNotExist:
-            d['content_descriptors'] = []
+        d['content_ratings'] = (obj.get_content_ratings_by_body(
+            es=True, content_ratings=related['content_ratings']) or None)
+        d['content_descriptors'] = related['content_descriptors']
         d['current_version'] = version.version if version else None
         d['default_locale'] = obj.default_locale
         d['description'] = list(
             set(string for _, string in obj.translations[obj.description_id]))
         d['device'] = getattr(obj, 'device_ids', [])
-        d['features'] = features
+        d['features'] = related['features']
         d['has_public_stats'] = obj.public_stats
         d['icon_hash'] = obj.icon_hash
-        try:
-            d['interactive_elements'] = obj.rating_interactives.to_keys()
-        except RatingInteractives.DoesNotExist:
-            d['interactive_elements'] = []
-        d['is_escalated'] = obj.escalationqueue_set.exists()
+        d['interactive_elements'] = related['interactive_elements']
+        d['is_escalated'] = related['is_escalated']
         d['is_offline'] = getattr(obj, 'is_offline', False)
         d['is_priority'] = obj.priority_review
-        d['is_rereviewed'] = obj.rereviewqueue_set.exists()
+        d['is_rereviewed'] = related['is_rereviewed']
         if latest_version:
             d['latest_version'] = {
                 'status': status,
@@ -310,25 +541,18 @@ class WebappIndexer(BaseIndexer):
         d['name'] = list(
             set(string for _, string in obj.translations[obj.name_id]))
         d['name_sort'] = unicode(obj.name).lower()
-        d['owners'] = [au.user.id for au in
-                       obj.addonuser_set.filter(role=amo.AUTHOR_ROLE_OWNER)]
-        d['popularity'] = len(installed_ids)
+        d['owners'] = related['owners']
+        d['popularity'] = related['installed_count']
         d['previews'] = [{'filetype': p.filetype, 'modified': p.modified,
                           'id': p.id, 'sizes': p.sizes}
-                         for p in obj.previews.all()]
-        try:
-            p = obj.addonpremium.price
-            d['price_tier'] = p.name
-        except AddonPremium.DoesNotExist:
-            d['price_tier'] = None
-
+                         for p in related['previews']]
+        d['price_tier'] = related['price_tier']
         d['ratings'] = {
             'average': obj.average_rating,
             'count': obj.total_reviews,
         }
-        d['region_exclusions'] = obj.get_excluded_region_ids()
-        d['reviewed'] = obj.versions.filter(
-            deleted=False).aggregate(Min('reviewed')).get('reviewed__min')
+        d['region_exclusions'] = related['region_exclusions']
+        d['reviewed'] = related['reviewed']
         if version:
             d['supported_locales'] = filter(
                 None, version.supported_locales.split(','))
@@ -336,20 +560,21 @@ class WebappIndexer(BaseIndexer):
             d['supported_locales'] = []
 
         d['tags'] = getattr(obj, 'tag_list', [])
-        if obj.upsell and obj.upsell.premium.is_published():
-            upsell_obj = obj.upsell.premium
+        if related['upsell'] and related['upsell'][0].is_published():
+            upsell_obj, upsell_exclusions = related['upsell']
             d['upsell'] = {
                 'id': upsell_obj.id,
                 'app_slug': upsell_obj.app_slug,
                 'icon_url': upsell_obj.get_icon_url(128),
                 # TODO: Store all localizations of upsell.name.
                 'name': unicode(upsell_obj.name),
-                'region_exclusions': upsell_obj.get_excluded_region_ids()
+                'region_exclusions': upsell_exclusions,
             }
 
+        d['uses_flash'] = related['uses_flash']
         d['versions'] = [dict(version=v.version,
                               resource_uri=reverse_version(v))
-                         for v in obj.versions.all()]
+                         for v in related['versions']]
 
         # Handle our localized fields.
         for field in ('description', 'homepage', 'name', 'support_email',
@@ -360,14 +585,12 @@ class WebappIndexer(BaseIndexer):
                 in obj.translations[getattr(obj, '%s_id' % field)]
                 if string]
         if version:
-            attach_trans_dict(Version, [version])
             d['release_notes_translations'] = [
                 {'lang': to_language(lang), 'string': string}
                 for lang, string
                 in version.translations[version.releasenotes_id]]
         else:
             d['release_notes_translations'] = None
-        attach_trans_dict(Geodata, [geodata])
         d['banner_message_translations'] = [
             {'lang': to_language(lang), 'string': string}
             for lang, string
@@ -423,22 +646,32 @@ class WebappIndexer(BaseIndexer):
         return Webapp.with_deleted.all()
 
     @classmethod
-    def run_indexing(cls, ids, ES, index=None, **kw):
-        """Override run_indexing to use app transformers."""
+    def iter_documents(cls, ids, failed=None):
+        """
+        Override iter_documents to include deleted apps and extract all the
+        documents of the chunk at once, see `extract_documents`.
+        """
         from mkt.webapps.models import Webapp
-        sys.stdout.write('Indexing %s webapps\n' % len(ids))
-
-        qs = Webapp.with_deleted.no_cache().filter(id__in=ids)
 
-        docs = []
-        for obj in qs:
+        objs = list(Webapp.with_deleted.no_cache().filter(id__in=ids))
+        try:
+            related = cls.get_related_data(objs)
+        except Exception as e:
+            if failed is None:
+                raise
+            sys.stdout.write('Failed to fetch the data of webapps {0}-{1}: '
+                             '{2}\n'.format(ids[0], ids[-1], e))
+            failed.extend(obj.id for obj in objs)
+            return
+
+        for obj in objs:
             try:
-                docs.append(cls.extract_document(obj.id, obj=obj))
+                yield cls._build_document(obj, related[obj.id])
             except Exception as e:
                 sys.stdout.write('Failed to index webapp {0}: {1}\n'.format(
                     obj.id, e))
-
-        cls.bulk_index(docs, es=ES, index=index or cls.get_index())
+                if failed is not None:
+                    failed.append(obj.id)
 
     @classmethod
     def get_app_filter(cls, request, additional_data=None, sq=None,
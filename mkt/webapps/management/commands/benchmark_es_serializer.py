@@ -0,0 +1,76 @@
+"""
+Compares the serialization of Webapp ES documents with and without fake
+instances.
+
+Extracts the documents of a chunk of public apps, round-trips them through JSON
+like Elasticsearch would, then serializes them with ESAppSerializer both ways
+and reports the number of apps serialized per second. Nothing is sent to
+Elasticsearch.
+
+Call like:
+
+    ./manage.py benchmark_es_serializer --chunk-size=500 --repeat=5
+
+"""
+import json
+import time
+from optparse import make_option
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.test.client import RequestFactory
+
+from elasticsearch.serializer import JSONSerializer
+
+import amo
+import mkt
+from mkt.search.serializers import BaseESSerializer
+from mkt.webapps.indexers import WebappIndexer
+from mkt.webapps.models import Webapp
+from mkt.webapps.serializers import ESAppSerializer
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', type='int', default=500,
+                    help='Number of apps to serialize.'),
+        make_option('--repeat', type='int', default=5,
+                    help='Number of times to serialize the chunk.'),
+    )
+
+    help = __doc__
+
+    def _get_documents(self, size):
+        apps = list(Webapp.objects.no_cache().filter(status=amo.STATUS_PUBLIC)
+                    .order_by('-id')[:size])
+        return JSONSerializer().dumps(WebappIndexer.extract_documents(apps))
+
+    def _measure(self, fn, documents, repeat):
+        elapsed = 0
+        for i in xrange(repeat):
+            # Serializing can modify the documents, start from fresh ones.
+            docs = json.loads(documents)
+            start = time.time()
+            for doc in docs:
+                fn(doc)
+            elapsed += time.time() - start
+        return len(docs) * repeat / elapsed if elapsed else 0
+
+    def handle(self, *args, **kw):
+        request = RequestFactory().get('/')
+        request.REGION = mkt.regions.RESTOFWORLD
+        request.user = AnonymousUser()
+        serializer = ESAppSerializer(context={'request': request})
+
+        def fake_instance(doc):
+            super(BaseESSerializer, serializer).to_native(
+                serializer.fake_object(doc))
+
+        documents = self._get_documents(kw['chunk_size'])
+        self.stdout.write('Serializing %s apps %s times.' %
+                          (len(json.loads(documents)), kw['repeat']))
+        for name, fn in (('fake instance', fake_instance),
+                         ('es accessors', serializer.to_native)):
+            self.stdout.write('%-14s %10.0f apps/sec' %
+                              (name, self._measure(fn, documents,
+                                                   kw['repeat'])))
@@ -0,0 +1,74 @@
+"""
+Compares fetching whole Webapp documents from Elasticsearch with fetching only
+the fields the serializer of each endpoint needs.
+
+Runs the same search for every endpoint both ways and reports the size of the
+responses and the time they took, including decoding them.
+
+Call like:
+
+    ./manage.py benchmark_es_source --size=25 --repeat=20
+
+"""
+import json
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.test.client import RequestFactory
+
+from mkt.feed.fields import get_app_source_fields
+from mkt.fireplace.serializers import FireplaceESAppSerializer
+from mkt.reviewers.serializers import ReviewersESAppSerializer
+from mkt.webapps.indexers import WebappIndexer
+from mkt.webapps.serializers import ESAppSerializer, SuggestionsESAppSerializer
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option('--size', type='int', default=25,
+                    help='Number of apps fetched by each search.'),
+        make_option('--repeat', type='int', default=20,
+                    help='Number of times to run each search.'),
+    )
+
+    help = __doc__
+
+    def _get_endpoints(self):
+        return (
+            ('search', ESAppSerializer.get_es_source_fields()),
+            ('fireplace search',
+             FireplaceESAppSerializer.get_es_source_fields()),
+            ('suggestions', SuggestionsESAppSerializer.get_es_source_fields()),
+            ('reviewers search',
+             ReviewersESAppSerializer.get_es_source_fields()),
+            ('feed', get_app_source_fields(RequestFactory().get('/'))),
+            ('fireplace feed',
+             get_app_source_fields(RequestFactory().get('/fireplace/'))),
+        )
+
+    def _measure(self, source, size, repeat):
+        es = WebappIndexer.get_es()
+        body = WebappIndexer.search(source=source)[:size].to_dict()
+        total_bytes = total_time = 0
+        for i in xrange(repeat):
+            start = time.time()
+            res = es.search(index=WebappIndexer.get_index(),
+                            doc_type=WebappIndexer.get_mapping_type_name(),
+                            body=body)
+            total_time += time.time() - start
+            total_bytes += len(json.dumps(res))
+        return total_bytes / repeat, total_time * 1000 / repeat
+
+    def handle(self, *args, **kw):
+        size, repeat = kw['size'], kw['repeat']
+        self.stdout.write('Fetching %s apps %s times per endpoint.' %
+                          (size, repeat))
+        full_bytes, full_ms = self._measure(None, size, repeat)
+        self.stdout.write('%-18s %10s bytes %8.1fms' %
+                          ('whole documents', full_bytes, full_ms))
+        for name, source in self._get_endpoints():
+            num_bytes, ms = self._measure(source, size, repeat)
+            self.stdout.write('%-18s %10s bytes %8.1fms (%s fields)' %
+                              (name, num_bytes, ms,
+                               len(source) if source else 'all'))
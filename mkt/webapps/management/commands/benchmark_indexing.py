@@ -0,0 +1,55 @@
+"""
+Compares the per-app and the bulk extraction of Webapp ES documents.
+
+Extracts the documents of a chunk of apps both ways and reports the number of
+queries and the time each one needed. Nothing is sent to Elasticsearch.
+
+Call like:
+
+    ./manage.py benchmark_indexing --chunk-size=500
+
+"""
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from mkt.webapps.indexers import WebappIndexer
+from mkt.webapps.models import Webapp
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', type='int', default=500,
+                    help='Number of apps to extract documents for.'),
+    )
+
+    help = __doc__
+
+    def _get_chunk(self, size):
+        return list(Webapp.with_deleted.no_cache().order_by('-id')[:size])
+
+    def _measure(self, fn):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.time()
+            fn()
+            elapsed = time.time() - start
+        return len(queries), elapsed
+
+    def handle(self, *args, **kw):
+        size = kw['chunk_size']
+
+        def per_app():
+            for obj in self._get_chunk(size):
+                WebappIndexer.extract_document(obj.id, obj)
+
+        def bulk():
+            WebappIndexer.extract_documents(self._get_chunk(size))
+
+        self.stdout.write('Extracting documents for %s apps.' % size)
+        for name, fn in (('per-app', per_app), ('bulk', bulk)):
+            num_queries, elapsed = self._measure(fn)
+            self.stdout.write('%-8s %6s queries %8.2fs' %
+                              (name, num_queries, elapsed))
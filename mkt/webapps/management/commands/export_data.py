@@ -1,11 +1,42 @@
+from optparse import make_option
+
 from django.core.management.base import BaseCommand
 
+from mkt.webapps.export import export_apps, export_user_installs, WRITERS
 from mkt.webapps.tasks import export_data
 
 
 class Command(BaseCommand):
     help = 'Export our data as a tgz for third-parties'
+    option_list = BaseCommand.option_list + (
+        make_option('--stream', action='store_true', default=False,
+                    help='Stream the export into a single file from this '
+                         'process instead of running the celery tasks'),
+        make_option('--users', action='store_true', default=False,
+                    help='With --stream, export the user installs instead '
+                         'of the apps'),
+        make_option('--format', action='store', default='tar',
+                    choices=sorted(WRITERS),
+                    help='With --stream, the format of the export'),
+        make_option('--incremental', action='store_true', default=False,
+                    help='With --stream, only export the apps changed '
+                         'since the last export, and list the removed ones'),
+        make_option('--workers', action='store', type='int', default=1,
+                    help='With --stream, serialize with this many local '
+                         'processes'),
+    )
 
     def handle(self, *args, **kwargs):
-        # Execute as a celery task so we get the right permissions.
-        export_data.delay()
+        if not kwargs['stream']:
+            # Execute as a celery task so we get the right permissions.
+            export_data.delay()
+            return
+
+        if kwargs['users']:
+            target_file = export_user_installs(format=kwargs['format'],
+                                               workers=kwargs['workers'])
+        else:
+            target_file = export_apps(format=kwargs['format'],
+                                      incremental=kwargs['incremental'],
+                                      workers=kwargs['workers'])
+        self.stdout.write('Exported to %s\n' % target_file)
@@ -22,15 +22,14 @@ from django.utils.translation import trans_real as translation
 import caching.base as caching
 import commonware.log
 import json_field
-from cache_nuggets.lib import memoize, memoize_key
 from jinja2.filters import do_dictsort
 from tower import ugettext as _
 from tower import ugettext_lazy as _lazy
 
 import amo
 import mkt
-from amo.utils import (JSONEncoder, slugify, smart_path, sorted_groupby,
-                       urlparams)
+from amo.utils import (epoch, JSONEncoder, slugify, smart_path,
+                       sorted_groupby, urlparams)
 from lib.crypto import packaged
 from lib.iarc.client import get_iarc_client
 from lib.iarc.utils import get_iarc_app_title, render_xml
@@ -1017,13 +1016,21 @@ class Webapp(UUIDModelMixin, OnChangeMixin, ModelBase):
             return '%s/%s-%s.png' % (static_url('ADDON_ICONS_DEFAULT_URL'),
                                      icon_type_split[1], size)
         else:
-            # [1] is the whole ID, [2] is the directory.
-            split_id = re.match(r'((\d*?)\d{1,3})$', str(self.id))
-            # If we don't have the icon_hash set to a dummy string ("never"),
-            # when the icon is eventually changed, icon_hash will be updated.
-            suffix = getattr(self, 'icon_hash', None) or 'never'
-            return static_url('ADDON_ICON_URL') % (
-                split_id.group(2) or 0, self.id, size, suffix)
+            return self.get_uploaded_icon_url(
+                self.id, size, getattr(self, 'icon_hash', None))
+
+    @staticmethod
+    def get_uploaded_icon_url(id, size, icon_hash=None):
+        """
+        Returns the URL of the icon uploaded for the app `id`, without
+        needing an instance.
+        """
+        # [1] is the whole ID, [2] is the directory.
+        split_id = re.match(r'((\d*?)\d{1,3})$', str(id))
+        # If we don't have the icon_hash set to a dummy string ("never"),
+        # when the icon is eventually changed, icon_hash will be updated.
+        return static_url('ADDON_ICON_URL') % (
+            split_id.group(2) or 0, id, size, icon_hash or 'never')
 
     @staticmethod
     def transformer(apps):
@@ -1645,7 +1652,7 @@ class Webapp(UUIDModelMixin, OnChangeMixin, ModelBase):
 
         return sorted(set(all_ids) - set(excluded or []))
 
-    def get_excluded_region_ids(self):
+    def get_excluded_region_ids(self, aers=None):
         """
         Return IDs of regions for which this app is excluded.
 
@@ -1653,10 +1660,14 @@ class Webapp(UUIDModelMixin, OnChangeMixin, ModelBase):
         this will also exclude any region that does not have the price tier
         set.
 
+        If `aers` is provided we'll use that list of `AddonExcludedRegion`
+        region IDs instead of querying them.
+
         Note: free and in-app are not included in this.
         """
-        excluded = set(self.addonexcludedregion
-                           .values_list('region', flat=True))
+        if aers is None:
+            aers = self.addonexcludedregion.values_list('region', flat=True)
+        excluded = set(aers)
 
         if self.is_premium():
             all_regions = set(mkt.regions.ALL_REGION_IDS)
@@ -1996,15 +2007,20 @@ class Webapp(UUIDModelMixin, OnChangeMixin, ModelBase):
         """
         return hashlib.sha512(settings.SECRET_KEY + str(self.id)).hexdigest()
 
-    def get_content_ratings_by_body(self, es=False):
+    def get_content_ratings_by_body(self, es=False, content_ratings=None):
         """
         Gets content ratings on this app keyed by bodies.
 
         es -- denotes whether to return ES-friendly results (just the IDs of
               rating classes) to fetch and translate later.
+        content_ratings -- an already fetched list of this app's
+                           `ContentRating` objects, to avoid querying them.
         """
-        content_ratings = {}
-        for cr in self.content_ratings.all():
+        if content_ratings is None:
+            content_ratings = self.content_ratings.all()
+
+        ratings_by_body = {}
+        for cr in content_ratings:
             body = cr.get_body()
             rating_serialized = {
                 'body': body.id,
@@ -2012,9 +2028,9 @@ class Webapp(UUIDModelMixin, OnChangeMixin, ModelBase):
             }
             if not es:
                 rating_serialized = dehydrate_content_rating(rating_serialized)
-            content_ratings[body.label] = rating_serialized
+            ratings_by_body[body.label] = rating_serialized
 
-        return content_ratings
+        return ratings_by_body
 
     def set_iarc_info(self, submission_id, security_code):
         """
@@ -2390,12 +2406,112 @@ class AddonExcludedRegion(ModelBase):
         return mkt.regions.REGIONS_CHOICES_ID_DICT.get(self.region)
 
 
-@memoize(prefix='get_excluded_in')
+REGION_EXCLUSIONS_KEY = 'webapp:region-exclusions'
+REGION_EXCLUSIONS_TIMEOUT = 60 * 60
+# How many changes are replayed on the cached exclusions of a region before
+# they are built again from the database.
+REGION_EXCLUSIONS_MAX_CHANGES = 100
+
+
+def region_exclusions_key(*parts):
+    return ':'.join(map(str, (REGION_EXCLUSIONS_KEY,) + parts))
+
+
+def get_excluded_region_masks(addon_ids):
+    """
+    Return a dict of the region exclusions bitmask of `addon_ids`, looked up
+    in the database with two queries. Apps that aren't excluded anywhere are
+    left out.
+
+    Bit `n` of a mask is set when the app is excluded from the region with ID
+    `n`, by an `AddonExcludedRegion` or due to Geodata flags.
+    """
+    masks = {}
+    aers = (AddonExcludedRegion.objects.filter(addon__in=addon_ids)
+            .values_list('addon', 'region'))
+    for addon_id, region_id in aers:
+        masks[addon_id] = masks.get(addon_id, 0) | 1 << region_id
+    for geodata in (Geodata.objects.no_cache()
+                    .filter(Q(addon__in=addon_ids),
+                            Q(region_br_iarc_exclude=True) |
+                            Q(region_de_iarc_exclude=True) |
+                            Q(region_de_usk_exclude=True))):
+        masks[geodata.addon_id] = (masks.get(geodata.addon_id, 0) |
+                                   geodata.get_excluded_region_mask())
+    return masks
+
+
+def get_region_exclusions_seq():
+    """
+    Return the number of the last change of region exclusions, see
+    `update_region_exclusions`.
+    """
+    key = region_exclusions_key('seq')
+    seq = cache.get(key)
+    if seq is None:
+        # Start after anything a lost counter could have reached, so the
+        # changes of an earlier counter are never mistaken for new ones.
+        cache.add(key, epoch(datetime.datetime.now()), None)
+        seq = cache.get(key)
+    return seq
+
+
+def update_region_exclusions(addon_id):
+    """
+    Record a change of the region exclusions of an app.
+
+    Every change is stored with the new mask of the app under its own
+    number, taken from an atomic counter, so concurrent changes can't
+    overwrite each other. The mask is looked up after the number is taken:
+    the change with the highest number saw every earlier one.
+    """
+    key = region_exclusions_key('seq')
+    try:
+        seq = cache.incr(key)
+    except ValueError:
+        # The counter isn't in the cache yet, or was evicted.
+        cache.add(key, epoch(datetime.datetime.now()), None)
+        seq = cache.incr(key)
+    mask = get_excluded_region_masks([addon_id]).get(addon_id, 0)
+    cache.set(region_exclusions_key('change', seq), (addon_id, mask),
+              REGION_EXCLUSIONS_TIMEOUT)
+
+
 def get_excluded_in(region_id):
     """
     Return IDs of Webapp objects excluded from a particular region or excluded
     due to Geodata flags.
+
+    The IDs of each region are cached along with the number of the last
+    change they include. The changes recorded since then by
+    `update_region_exclusions` are applied to them on the next lookup, so
+    only the apps that changed are updated. They are built again from the
+    database only when the changes are missing or too many.
     """
+    seq = get_region_exclusions_seq()
+    key = region_exclusions_key('region', region_id)
+    cached = cache.get(key)
+    if cached is not None:
+        last_seq, excluded = cached
+        if last_seq == seq:
+            return excluded
+        if last_seq < seq <= last_seq + REGION_EXCLUSIONS_MAX_CHANGES:
+            change_keys = [region_exclusions_key('change', n)
+                           for n in range(last_seq + 1, seq + 1)]
+            changes = cache.get_many(change_keys)
+            # A change can be missing if it was evicted, or if it is still
+            # being recorded: its app is then up to date in the database.
+            if len(changes) == len(change_keys):
+                bit = 1 << region_id
+                for change_key in change_keys:
+                    addon_id, mask = changes[change_key]
+                    if mask & bit:
+                        excluded.add(addon_id)
+                    else:
+                        excluded.discard(addon_id)
+                cache.set(key, (seq, excluded), REGION_EXCLUSIONS_TIMEOUT)
+                return excluded
+
     aers = list(AddonExcludedRegion.objects.filter(region=region_id)
                 .values_list('addon', flat=True))
 
@@ -2412,16 +2528,20 @@ def get_excluded_in(region_id):
     if geodata_qs:
         geodata_exclusions = list(Geodata.objects.filter(geodata_qs)
                                   .values_list('addon', flat=True))
-    return set(aers + geodata_exclusions)
+    excluded = set(aers + geodata_exclusions)
+    # The number was read before the queries: changes recorded while they
+    # ran are applied again on the next lookup.
+    cache.set(key, (seq, excluded), REGION_EXCLUSIONS_TIMEOUT)
+    return excluded
 
 
 @receiver(models.signals.post_save, sender=AddonExcludedRegion,
-          dispatch_uid='clean_memoized_exclusions')
-def clean_memoized_exclusions(sender, **kw):
+          dispatch_uid='update_region_exclusions_aer_save')
+@receiver(models.signals.post_delete, sender=AddonExcludedRegion,
+          dispatch_uid='update_region_exclusions_aer_delete')
+def update_region_exclusions_aer(sender, instance, **kw):
     if not kw.get('raw'):
-        for k in mkt.regions.ALL_REGION_IDS:
-            cache.delete_many([memoize_key('get_excluded_in', k)
-                               for k in mkt.regions.ALL_REGION_IDS])
+        update_region_exclusions(instance.addon_id)
 
 
 class IARCInfo(ModelBase):
@@ -2687,6 +2807,12 @@ class Geodata(ModelBase):
     # Exclude apps with USK_RATING_REFUSED in Germany.
     region_de_usk_exclude = models.BooleanField(default=False)
 
+    def __init__(self, *args, **kwargs):
+        super(Geodata, self).__init__(*args, **kwargs)
+        # What's in the database, nothing yet for a new instance.
+        self._original_excluded_region_mask = (
+            self.get_excluded_region_mask() if self.pk else 0)
+
     class Meta:
         db_table = 'webapps_geodata'
 
@@ -2695,6 +2821,20 @@ class Geodata(ModelBase):
             self.id, 'restricted' if self.restricted else 'unrestricted',
             self.addon.id)
 
+    def get_excluded_region_mask(self):
+        """
+        Return the bitmask of the regions the app is excluded from due to
+        these flags, see `get_excluded_region_masks`.
+        """
+        mask = 0
+        # For pre-IARC unrated games in Brazil/Germany.
+        if self.region_br_iarc_exclude:
+            mask |= 1 << mkt.regions.BR.id
+        # For USK_RATING_REFUSED apps in Germany.
+        if self.region_de_iarc_exclude or self.region_de_usk_exclude:
+            mask |= 1 << mkt.regions.DE.id
+        return mask
+
     def get_status(self, region):
         """
         Return the status of listing in a given region (e.g., China).
@@ -2804,3 +2944,15 @@ for region in (mkt.regions.BR, mkt.regions.DE):
 # Save geodata translations when a Geodata instance is saved.
 models.signals.pre_save.connect(save_signal, sender=Geodata,
                                 dispatch_uid='geodata_translations')
+
+
+@receiver(models.signals.post_save, sender=Geodata,
+          dispatch_uid='update_region_exclusions_geodata')
+def update_region_exclusions_geodata(sender, instance, **kw):
+    if kw.get('raw'):
+        return
+    # Only the exclusion flags matter, not the banner or the other fields.
+    mask = instance.get_excluded_region_mask()
+    if mask != instance._original_excluded_region_mask:
+        update_region_exclusions(instance.addon_id)
+        instance._original_excluded_region_mask = mask
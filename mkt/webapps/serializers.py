@@ -1,4 +1,5 @@
 import json
+from collections import namedtuple
 from decimal import Decimal
 
 from django.conf import settings
@@ -24,14 +25,23 @@ from mkt.site.helpers import absolutify
 from mkt.submit.forms import mark_for_rereview
 from mkt.submit.serializers import PreviewSerializer, SimplePreviewSerializer
 from mkt.translations.utils import no_translation
+from mkt.users.models import UserProfile
 from mkt.versions.models import Version
-from mkt.webapps.models import (AddonUpsell, AppFeatures, Geodata, Preview,
-                                Webapp)
+from mkt.webapps.models import (AddonUpsell, AddonUser, AppFeatures, Geodata,
+                                Installed, Preview, Webapp)
 from mkt.webapps.utils import dehydrate_content_rating
 
 
 log = commonware.log.getLogger('z.api')
 
+# What the fields linking to an app need to build their URL from ES data.
+ESAppRef = namedtuple('ESAppRef', ['pk'])
+
+# All regions, sorted like Webapp.get_regions() sorts them.
+REGIONS_BY_SLUG = sorted(
+    map(mkt.regions.REGIONS_CHOICES_ID_DICT.get, mkt.regions.ALL_REGION_IDS),
+    key=lambda region: region.slug)
+
 
 def http_error(errorclass, reason, extra_data=None):
     r = errorclass()
@@ -397,6 +407,56 @@ class ESAppSerializer(BaseESSerializer, AppSerializer):
     # The fields we want converted to Python date/datetimes.
     datetime_fields = ('created', 'modified', 'reviewed')
 
+    # The fields we serialize as-is from ES, the others have an es_* method.
+    es_sources = {
+        'author': 'author',
+        'categories': 'category',
+        'created': 'created',
+        'current_version': 'current_version',
+        'default_locale': 'default_locale',
+        'id': 'id',
+        'is_disabled': 'is_disabled',
+        'is_offline': 'is_offline',
+        'manifest_url': 'manifest_url',
+        'modified': 'modified',
+        'premium_type': 'premium_type',
+        'public_stats': 'has_public_stats',
+        'reviewed': 'reviewed',
+        'slug': 'app_slug',
+        'status': 'status',
+    }
+
+    # The ES keys needed by the other fields, and by fake_object() and
+    # can_serialize_es() whatever the fields.
+    es_source_fields = {
+        'absolute_url': ('app_slug',),
+        'app_type': ('app_type',),
+        'banner_regions': (),
+        'content_ratings': ('content_descriptors', 'content_ratings',
+                            'interactive_elements'),
+        'device_types': ('device',),
+        'icons': ('icon_hash',),
+        'is_packaged': ('app_type',),
+        'package_path': ('package_path',),
+        'payment_account': (),
+        'payment_required': (),
+        'previews': ('previews',),
+        'price': (),
+        'price_locale': (),
+        'privacy_policy': (),
+        'ratings': ('ratings',),
+        'regions': ('region_exclusions',),
+        'resource_uri': (),
+        'supported_locales': ('supported_locales',),
+        'tags': ('tags',),
+        'upsell': ('upsell',),
+        'user': (),
+        'versions': ('versions',),
+        'weekly_downloads': ('has_public_stats', 'weekly_downloads'),
+    }
+    es_source_fields_required = ('app_slug', 'app_type', 'id', 'premium_type',
+                                 'region_exclusions', 'status')
+
     class Meta(AppSerializer.Meta):
         fields = AppSerializer.Meta.fields + ['absolute_url', 'group',
                                               'reviewed']
@@ -408,7 +468,12 @@ class ESAppSerializer(BaseESSerializer, AppSerializer):
         self.fields.pop('upsold', None)
 
     def fake_object(self, data):
-        """Create a fake instance of Webapp and related models from ES data."""
+        """
+        Create a fake instance of Webapp and related models from ES data.
+
+        The data can be missing the keys the serializer fields don't need, see
+        `get_es_source_fields`.
+        """
         is_packaged = data['app_type'] != amo.ADDON_WEBAPP_HOSTED
         is_privileged = data['app_type'] == amo.ADDON_WEBAPP_PRIVILEGED
 
@@ -423,19 +488,19 @@ class ESAppSerializer(BaseESSerializer, AppSerializer):
         obj.listed_authors = []
         obj._current_version = Version()
         obj._current_version.addon = obj
-        obj._current_version._developer_name = data['author']
-        obj._current_version.supported_locales = data['supported_locales']
-        obj._current_version.version = data['current_version']
+        obj._current_version._developer_name = data.get('author')
+        obj._current_version.supported_locales = data.get('supported_locales')
+        obj._current_version.version = data.get('current_version')
         obj._latest_version = Version()
         obj._latest_version.is_privileged = is_privileged
         obj._geodata = Geodata()
         obj.all_previews = [
             Preview(id=p['id'], modified=self.to_datetime(p['modified']),
             filetype=p['filetype'], sizes=p.get('sizes', {}))
-            for p in data['previews']]
-        obj.categories = data['category']
-        obj._device_types = [DEVICE_TYPES[d] for d in data['device']]
-        obj._is_disabled = data['is_disabled']
+            for p in data.get('previews', [])]
+        obj.categories = data.get('category')
+        obj._device_types = [DEVICE_TYPES[d] for d in data.get('device', [])]
+        obj._is_disabled = data.get('is_disabled')
 
         # Set base attributes on the "fake" app using the data from ES.
         self._attach_fields(
@@ -455,7 +520,7 @@ class ESAppSerializer(BaseESSerializer, AppSerializer):
         self._attach_translations(obj._geodata, data, ('banner_message',))
 
         # Set attributes that have a different name in ES.
-        obj.public_stats = data['has_public_stats']
+        obj.public_stats = data.get('has_public_stats')
 
         # Override obj.get_region() with a static list of regions generated
         # from the region_exclusions stored in ES.
@@ -467,45 +532,140 @@ class ESAppSerializer(BaseESSerializer, AppSerializer):
 
         return obj
 
+    def can_serialize_es(self, data):
+        # Premium apps need their prices and payment accounts from the
+        # database, deleted apps have no current version and apps without
+        # regions fall back to a query, so those still use the fake instance.
+        excluded = set(data.get('region_exclusions') or [])
+        return (data.get('premium_type') not in amo.ADDON_PREMIUMS and
+                data.get('status') != amo.STATUS_DELETED and
+                not excluded.issuperset(mkt.regions.ALL_REGION_IDS))
+
     def get_content_ratings(self, obj):
+        return self.es_content_ratings(obj.es_data)
+
+    def get_versions(self, obj):
+        return self.es_versions(obj.es_data)
+
+    def get_ratings_aggregates(self, obj):
+        return self.es_ratings(obj.es_data)
+
+    def get_upsell(self, obj):
+        return self.es_upsell(obj.es_data)
+
+    def get_absolute_url(self, obj):
+        return absolutify(obj.get_absolute_url())
+
+    def get_package_path(self, obj):
+        return self.es_package_path(obj.es_data)
+
+    def get_tags(self, obj):
+        return self.es_tags(obj.es_data)
+
+    # The es_* methods return the value of a field straight from the ES data,
+    # see BaseESSerializer.
+    def es_absolute_url(self, data):
+        return absolutify(reverse('detail', args=[data['app_slug']]))
+
+    def es_app_type(self, data):
+        return amo.ADDON_WEBAPP_TYPES[data['app_type']]
+
+    def es_banner_regions(self, data):
+        # Like geodata.banner_regions_slugs on the fake instance, which has
+        # no banner regions.
+        return []
+
+    def es_content_ratings(self, data):
         body = (mkt.regions.REGION_TO_RATINGS_BODY().get(
             self.context['request'].REGION.slug, 'generic'))
         prefix = 'has_%s' % body
 
         # Backwards incompat with old index.
-        for i, desc in enumerate(obj.es_data.get('content_descriptors', [])):
+        for i, desc in enumerate(data.get('content_descriptors', [])):
             if desc.isupper():
-                obj.es_data['content_descriptors'][i] = 'has_' + desc.lower()
-        for i, inter in enumerate(obj.es_data.get('interactive_elements', [])):
+                data['content_descriptors'][i] = 'has_' + desc.lower()
+        for i, inter in enumerate(data.get('interactive_elements', [])):
             if inter.isupper():
-                obj.es_data['interactive_elements'][i] = 'has_' + inter.lower()
+                data['interactive_elements'][i] = 'has_' + inter.lower()
 
         return {
             'body': body,
             'rating': dehydrate_content_rating(
-                (obj.es_data.get('content_ratings') or {})
+                (data.get('content_ratings') or {})
                 .get(body)) or None,
             'descriptors': [key for key in
-                            obj.es_data.get('content_descriptors', [])
+                            data.get('content_descriptors', [])
                             if prefix in key],
             'descriptors_text': [mkt.iarc_mappings.REVERSE_DESCS[key] for key
-                                 in obj.es_data.get('content_descriptors')
+                                 in data.get('content_descriptors')
                                  if prefix in key],
-            'interactives': obj.es_data.get('interactive_elements', []),
+            'interactives': data.get('interactive_elements', []),
             'interactives_text': [mkt.iarc_mappings.REVERSE_INTERACTIVES[key]
                                   for key in
-                                  obj.es_data.get('interactive_elements')]
+                                  data.get('interactive_elements')]
         }
 
-    def get_versions(self, obj):
-        return dict((v['version'], v['resource_uri'])
-                    for v in obj.es_data['versions'])
+    def es_device_types(self, data):
+        with no_translation():
+            return [DEVICE_TYPES[d].api_name for d in data['device']]
 
-    def get_ratings_aggregates(self, obj):
-        return obj.es_data.get('ratings', {})
+    def es_icon_url(self, data, size):
+        return Webapp.get_uploaded_icon_url(data['id'], size,
+                                            data.get('icon_hash'))
 
-    def get_upsell(self, obj):
-        upsell = obj.es_data.get('upsell', False)
+    def es_icons(self, data):
+        return dict((icon_size, self.es_icon_url(data, icon_size))
+                    for icon_size in amo.APP_ICON_SIZES)
+
+    def es_is_packaged(self, data):
+        return data['app_type'] != amo.ADDON_WEBAPP_HOSTED
+
+    def es_package_path(self, data):
+        return data.get('package_path')
+
+    def es_payment_account(self, data):
+        return None
+
+    def es_payment_required(self, data):
+        return False
+
+    def es_price(self, data):
+        return None
+
+    def es_price_locale(self, data):
+        return None
+
+    def es_previews(self, data):
+        return [Preview(id=p['id'], modified=self.to_datetime(p['modified']),
+                        filetype=p['filetype'], sizes=p.get('sizes', {}))
+                for p in data['previews']]
+
+    def es_privacy_policy(self, data):
+        return ESAppRef(pk=data['id'])
+
+    def es_ratings(self, data):
+        return data.get('ratings', {})
+
+    def es_regions(self, data):
+        excluded = set(data['region_exclusions'] or [])
+        return [region for region in REGIONS_BY_SLUG
+                if region.id not in excluded]
+
+    def es_resource_uri(self, data):
+        return ESAppRef(pk=data['id'])
+
+    def es_supported_locales(self, data):
+        locs = data.get('supported_locales')
+        if locs:
+            return locs.split(',') if isinstance(locs, basestring) else locs
+        else:
+            return []
+
+    def es_tags(self, data):
+        return data['tags']
+
+    def es_upsell(self, data):
+        upsell = data.get('upsell', False)
         if upsell:
             region_id = self.context['request'].REGION.id
             exclusions = upsell.get('region_exclusions')
@@ -516,14 +676,27 @@ class ESAppSerializer(BaseESSerializer, AppSerializer):
                 upsell = False
         return upsell
 
-    def get_absolute_url(self, obj):
-        return absolutify(obj.get_absolute_url())
+    def es_user(self, data):
+        request = self.context.get('request')
+        if request and request.user.is_authenticated():
+            user = request.user
+            return {
+                'developed': AddonUser.objects.filter(
+                    addon=data['id'], user=user,
+                    role=amo.AUTHOR_ROLE_OWNER).exists(),
+                'installed': (isinstance(user, UserProfile) and
+                              Installed.objects.filter(
+                                  addon=data['id'], user=user).exists()),
+                'purchased': data['id'] in user.purchase_ids(),
+            }
 
-    def get_package_path(self, obj):
-        return obj.es_data.get('package_path')
+    def es_versions(self, data):
+        return dict((v['version'], v['resource_uri'])
+                    for v in data['versions'])
 
-    def get_tags(self, obj):
-        return obj.es_data['tags']
+    def es_weekly_downloads(self, data):
+        if data['has_public_stats']:
+            return data.get('weekly_downloads')
 
 
 class BaseESAppFeedSerializer(ESAppSerializer):
@@ -539,6 +712,12 @@ class BaseESAppFeedSerializer(ESAppSerializer):
             '64': obj.get_icon_url(64)
         }
 
+    def es_icons(self, data):
+        return {
+            '32': self.es_icon_url(data, 32),
+            '64': self.es_icon_url(data, 64)
+        }
+
 
 class ESAppFeedSerializer(BaseESAppFeedSerializer):
     """
@@ -587,12 +766,18 @@ class SimpleESAppSerializer(ESAppSerializer):
 class SuggestionsESAppSerializer(ESAppSerializer):
     icon = serializers.SerializerMethodField('get_icon')
 
+    es_source_fields = dict(ESAppSerializer.es_source_fields,
+                            icon=('icon_hash',))
+
     class Meta(ESAppSerializer.Meta):
         fields = ['name', 'description', 'absolute_url', 'icon']
 
     def get_icon(self, app):
         return app.get_icon_url(64)
 
+    def es_icon(self, data):
+        return self.es_icon_url(data, 64)
+
 
 class FeedDiscoPlaceESAppSerializer(SuggestionsESAppSerializer):
     class Meta(ESAppSerializer.Meta):
@@ -601,6 +786,9 @@ class FeedDiscoPlaceESAppSerializer(SuggestionsESAppSerializer):
     def get_icon(self, app):
         return app.get_icon_url(128)
 
+    def es_icon(self, data):
+        return self.es_icon_url(data, 128)
+
 
 class RocketbarESAppSerializer(serializers.Serializer):
     """Used by Firefox OS's Rocketbar apps viewer."""
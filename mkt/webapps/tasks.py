@@ -1,3 +1,4 @@
+import collections
 import datetime
 import hashlib
 import itertools
@@ -9,15 +10,19 @@ import StringIO
 import shutil
 import subprocess
 import tempfile
+import threading
 import time
+import urlparse
+from multiprocessing.pool import ThreadPool
 
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
 from django.core.files.storage import default_storage as storage
 from django.core.urlresolvers import reverse
+from django.db import connection
 from django.template import Context, loader
 
-import pytz
 import requests
 from celery import chord
 from celery.exceptions import RetryTaskError
@@ -36,19 +41,22 @@ from mkt.abuse.models import AbuseReport
 from mkt.constants.categories import CATEGORY_CHOICES
 from mkt.constants.regions import RESTOFWORLD
 from mkt.developers.models import ActivityLog, AppLog
-from mkt.developers.tasks import (_fetch_manifest, fetch_icon, pngcrush_image,
+from mkt.developers.tasks import (_fetch_manifest, fetch_icon,
+                                  ManifestNotModified, pngcrush_image,
                                   resize_preview, save_icon, validator)
 from mkt.files.models import FileUpload
 from mkt.files.utils import WebAppParser
 from mkt.ratings.models import Review
 from mkt.reviewers.models import EscalationQueue, RereviewQueue
+from mkt.search.indexers import IndexTask
 from mkt.site.decorators import set_task_user, use_master, write
 from mkt.site.mail import send_mail_jinja
 from mkt.site.helpers import absolutify
 from mkt.users.models import UserProfile
 from mkt.users.utils import get_task_user
+from mkt.webapps.export import get_user_installs_data
 from mkt.webapps.indexers import WebappIndexer
-from mkt.webapps.models import AppManifest, Preview, Webapp
+from mkt.webapps.models import AppManifest, Preview, Trending, Webapp
 from mkt.webapps.utils import get_locale_properties
 
 
@@ -114,8 +122,9 @@ def update_manifests(ids, **kw):
     # we'll need to log in as user.
     amo.set_user(get_task_user())
 
+    fetched = _fetch_manifests(Webapp.objects.filter(pk__in=ids))
     for id in ids:
-        _update_manifest(id, check_hash, retries)
+        _update_manifest(id, check_hash, retries, fetched.get(id))
     if retries:
         try:
             update_manifests.retry(args=(retries.keys(),),
@@ -158,7 +167,98 @@ def notify_developers_of_failure(app, error_message, has_link=False):
                             context, recipient_list=to)
 
 
-def _update_manifest(id, check_hash, failed_fetches):
+def _manifest_validators_key(id):
+    return 'manifest-validators:%s' % id
+
+
+def _fetch_webapp_manifest(url, validators=None):
+    """
+    Fetch the manifest at `url`, with a conditional request if the
+    `validators` of the last fetch are given.
+
+    Never raises, returns a `(content, validators, error)` tuple instead:
+    `content` is None if the manifest wasn't modified or if fetching it
+    failed with the exception `error`.
+    """
+    validators = dict(validators or {})
+    try:
+        content = _fetch_manifest(url, validators=validators)
+    except ManifestNotModified:
+        return None, validators, None
+    except Exception, e:
+        task_log.info(u'Failed to fetch manifest from %s' % url,
+                      exc_info=True)
+        return None, validators, e
+    return content, validators, None
+
+
+def _fetch_manifests(webapps):
+    """
+    Fetch the manifests of `webapps` from a pool of threads, with at most
+    `MANIFEST_FETCH_PER_HOST` requests to the same host at a time.
+
+    Returns the `_fetch_webapp_manifest` result of each app by ID.
+    """
+    by_host = collections.defaultdict(list)
+    for webapp in webapps:
+        by_host[urlparse.urlparse(webapp.manifest_url).netloc].append(webapp)
+    if not by_host:
+        return {}
+
+    validators = cache.get_many([_manifest_validators_key(webapp.pk)
+                                 for host in by_host
+                                 for webapp in by_host[host]])
+    semaphores = dict(
+        (host, threading.BoundedSemaphore(settings.MANIFEST_FETCH_PER_HOST))
+        for host in by_host)
+
+    def fetch(args):
+        host, webapp = args
+        with semaphores[host]:
+            return webapp.pk, _fetch_webapp_manifest(
+                webapp.manifest_url,
+                validators.get(_manifest_validators_key(webapp.pk)))
+
+    # Alternate between the hosts so the threads don't all wait on the
+    # semaphore of the same one.
+    jobs = [job for job in itertools.chain(*itertools.izip_longest(
+                *[[(host, webapp) for webapp in apps]
+                  for host, apps in by_host.items()]))
+            if job is not None]
+
+    pool = ThreadPool(min(settings.MANIFEST_FETCH_WORKERS, len(jobs)))
+    try:
+        return dict(pool.map(fetch, jobs))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _manifest_fetch_failed(webapp, error, failed_fetches):
+    msg = u'Failed to get manifest from %s. Error: %s' % (
+        webapp.manifest_url, error)
+    failed_fetches[webapp.id] = failed_fetches.get(webapp.id, 0) + 1
+    if failed_fetches[webapp.id] == 3:
+        # This is our 3rd attempt, let's send the developer(s) an email to
+        # notify him of the failures.
+        notify_developers_of_failure(webapp, u'Validation errors:\n' + msg)
+    elif failed_fetches[webapp.id] >= 4:
+        # This is our 4th attempt, we should already have notified the
+        # developer(s). Let's put the app in the re-review queue.
+        _log(webapp, msg, rereview=True)
+        if webapp.status in amo.WEBAPPS_APPROVED_STATUSES:
+            RereviewQueue.flag(webapp, amo.LOG.REREVIEW_MANIFEST_CHANGE,
+                               msg)
+        del failed_fetches[webapp.id]
+    else:
+        _log(webapp, msg, rereview=False)
+
+
+def _update_manifest(id, check_hash, failed_fetches, fetched=None):
+    """
+    Update the app `id` from its manifest. `fetched` is the result of
+    `_fetch_webapp_manifest` if the manifest was already fetched.
+    """
     webapp = Webapp.objects.get(pk=id)
     version = webapp.versions.latest()
     file_ = version.files.latest()
@@ -168,29 +268,29 @@ def _update_manifest(id, check_hash, failed_fetches):
         _log(webapp, u'Ignoring, no existing file')
         return
 
-    # Fetch manifest, catching and logging any exception.
-    try:
-        content = _fetch_manifest(webapp.manifest_url)
-    except Exception, e:
-        msg = u'Failed to get manifest from %s. Error: %s' % (
-            webapp.manifest_url, e)
-        failed_fetches[id] = failed_fetches.get(id, 0) + 1
-        if failed_fetches[id] == 3:
-            # This is our 3rd attempt, let's send the developer(s) an email to
-            # notify him of the failures.
-            notify_developers_of_failure(webapp, u'Validation errors:\n' + msg)
-        elif failed_fetches[id] >= 4:
-            # This is our 4th attempt, we should already have notified the
-            # developer(s). Let's put the app in the re-review queue.
-            _log(webapp, msg, rereview=True, exc_info=True)
-            if webapp.status in amo.WEBAPPS_APPROVED_STATUSES:
-                RereviewQueue.flag(webapp, amo.LOG.REREVIEW_MANIFEST_CHANGE,
-                                   msg)
-            del failed_fetches[id]
-        else:
-            _log(webapp, msg, rereview=False, exc_info=True)
+    if fetched is None:
+        fetched = _fetch_webapp_manifest(
+            webapp.manifest_url,
+            cache.get(_manifest_validators_key(webapp.pk)))
+    content, validators, error = fetched
+
+    if content is None and error is None:
+        # Not modified. We can skip it if the manifest we last fetched is the
+        # one of the current file, otherwise fetch it again to update it.
+        if check_hash and validators.get('hash') == file_.hash:
+            _log(webapp, u'Manifest not modified')
+            return
+        content, validators, error = _fetch_webapp_manifest(
+            webapp.manifest_url)
+
+    if error is not None:
+        _manifest_fetch_failed(webapp, error, failed_fetches)
         return
 
+    validators['hash'] = _get_content_hash(content)
+    cache.set(_manifest_validators_key(webapp.pk), validators,
+              settings.MANIFEST_VALIDATORS_TIMEOUT)
+
     # Check hash.
     if check_hash:
         hash_ = _get_content_hash(content)
@@ -337,7 +437,7 @@ def update_supported_locales(ids, **kw):
                 _log(app, u'Updating supported locales failed.', exc_info=True)
 
 
-@post_request_task(acks_late=True)
+@post_request_task(base=IndexTask, acks_late=True)
 @write
 def index_webapps(ids, **kw):
     # DEPRECATED: call WebappIndexer.index_ids directly.
@@ -485,14 +585,9 @@ def dump_user_installs(ids, **kw):
     task_log.info(u'Dumping user installs {0} to {1}. [{2}]'
                   .format(ids[0], ids[-1], len(ids)))
 
-    for user_id in ids:
-        try:
-            user = UserProfile.objects.get(pk=user_id)
-        except UserProfile.DoesNotExist:
-            task_log.info('User profile does not exist: {0}'.format(user_id))
-            continue
-
-        hash = user.recommendation_hash
+    users = list(UserProfile.objects.filter(pk__in=ids).order_by('pk'))
+    for data in get_user_installs_data(users):
+        hash = data['user']
         target_dir = os.path.join(settings.DUMPED_USERS_PATH, 'users', hash[0])
         target_file = os.path.join(target_dir, '%s.json' % hash)
 
@@ -502,31 +597,7 @@ def dump_user_installs(ids, **kw):
             except OSError:
                 pass  # Catch race condition if file exists now.
 
-        # Gather data about user.
-        installed = []
-        zone = pytz.timezone(settings.TIME_ZONE)
-        for install in user.installed_set.all():
-            try:
-                app = install.addon
-            except Webapp.DoesNotExist:
-                continue
-
-            installed.append({
-                'id': app.id,
-                'slug': app.app_slug,
-                'installed': pytz.utc.normalize(
-                    zone.localize(install.created)).strftime(
-                        '%Y-%m-%dT%H:%M:%S')
-            })
-
-        data = {
-            'user': hash,
-            'region': user.region,
-            'lang': user.lang,
-            'installed_apps': installed,
-        }
-
-        task_log.info('Dumping user {0} to {1}'.format(user.id, target_file))
+        task_log.info('Dumping user {0} to {1}'.format(hash, target_file))
         json.dump(data, open(target_file, 'w'), cls=JSONEncoder)
 
 
@@ -634,6 +705,18 @@ def import_manifests(ids, **kw):
                               '%s: %s' % (app.id, version.id, e))
 
 
+def _trending_value(count_1, count_3):
+    """
+    Calculate trending from the installs of the past week, `count_1`, and of
+    the 3 weeks before it, `count_3`.
+    """
+    # Average the installs of the prior 3 weeks.
+    count_3 = count_3 / 3
+    if count_1 > 100 and count_3 > 1:
+        return (count_1 - count_3) / count_3
+    return 0.0
+
+
 def _get_trending(app_id, region=None):
     """
     Calculate trending.
@@ -668,135 +751,198 @@ def _get_trending(app_id, region=None):
     if not count_1 > 100:
         return 0.0
 
-    # Get the average installs for the prior 3 weeks. Don't use the `len` of
-    # the returned counts because of week boundaries.
+    # Get the installs for the prior 3 weeks. Don't use the `len` of the
+    # returned counts because of week boundaries.
     try:
         count_3 = sum(
             c['count'] for c in
             client('app_installs', days_ago(28), days_ago(8), 'week', **kwargs)
-            if c.get('count')) / 3
+            if c.get('count'))
     except ValueError as e:
         task_log.info('Call to ES failed: {0}'.format(e))
         count_3 = 0
 
-    if count_3 > 1:
-        return (count_1 - count_3) / count_3
-    else:
-        return 0.0
+    return _trending_value(count_1, count_3)
+
+
+def _get_trending_bulk(ids):
+    """
+    Calculate global and per-region trending of many apps at once, see
+    `_get_trending`.
+
+    Monolith is hit with a single query aggregating the installs of the past
+    week and of the 3 weeks before it, by app and by region.
+
+    Returns a dict mapping `(app_id, region_id)` to the trending values that
+    aren't 0. Global trending uses the region ID 0.
+    """
+    client = get_monolith_client()
+
+    def date_range(start, end):
+        return {'range': {'date': {
+            'gte': start.date().strftime('%Y-%m-%d'),
+            'lte': end.date().strftime('%Y-%m-%d'),
+        }}}
+
+    today = datetime.datetime.today()
+    installs = {
+        'week': {
+            'filter': date_range(days_ago(7), today),
+            'aggs': {'installs': {'sum': {'field': 'app_installs'}}}},
+        'prior': {
+            'filter': date_range(days_ago(28), days_ago(8)),
+            'aggs': {'installs': {'sum': {'field': 'app_installs'}}}},
+    }
+    regions = dict((region.slug, region.id)
+                   for region in mkt.regions.REGIONS_DICT.values())
+    query = {
+        'query': {'filtered': {
+            'query': {'match_all': {}},
+            'filter': {'and': [{'terms': {'app-id': list(ids)}},
+                               date_range(days_ago(28), today)]}}},
+        'aggs': {
+            'apps': {
+                'terms': {'field': 'app-id', 'size': len(ids)},
+                'aggs': dict(installs, regions={
+                    'terms': {'field': 'region', 'size': len(regions)},
+                    'aggs': installs})}},
+        'size': 0}
+
+    try:
+        resp = client.raw(query)
+        app_buckets = resp['aggregations']['apps']['buckets']
+    except Exception as e:
+        task_log.info('Call to ES failed: {0}'.format(e))
+        return {}
+
+    def value(bucket):
+        return _trending_value(bucket['week']['installs']['value'] or 0,
+                               bucket['prior']['installs']['value'] or 0)
+
+    trending = {}
+    for app_bucket in app_buckets:
+        app_id = int(app_bucket['key'])
+        trending[(app_id, 0)] = value(app_bucket)
+        for region_bucket in app_bucket['regions']['buckets']:
+            if region_bucket['key'] in regions:
+                trending[(app_id, regions[region_bucket['key']])] = value(
+                    region_bucket)
+
+    return dict((key, value) for key, value in trending.items() if value)
 
 
 @task
 @write
 def update_trending(ids, **kw):
-    count = 0
-    times = []
+    t_start = time.time()
+    ids = list(Webapp.objects.filter(id__in=ids).no_transforms()
+               .values_list('id', flat=True))
+    if not ids:
+        return
 
-    for app in Webapp.objects.filter(id__in=ids).no_transforms():
+    # Trending values of 0 aren't saved, like the ones of the apps and
+    # regions Monolith has no installs for.
+    values = _get_trending_bulk(ids)
 
-        count += 1
-        t_start = time.time()
+    existing = dict(((trending.addon_id, trending.region), trending)
+                    for trending in Trending.objects.filter(addon__in=ids))
+    created = []
+    for (app_id, region_id), value in values.items():
+        trending = existing.get((app_id, region_id))
+        if trending is None:
+            created.append(Trending(addon_id=app_id, region=region_id,
+                                    value=value))
+        elif trending.value != value:
+            trending.update(value=value)
+    Trending.objects.bulk_create(created)
 
-        # Calculate global trending, then per-region trending below.
-        value = _get_trending(app.id)
-        if value:
-            trending, created = app.trending.get_or_create(
-                region=0, defaults={'value': value})
-            if not created:
-                trending.update(value=value)
+    task_log.info('Trending calculated for %s apps in %0.2fs.'
+                  % (len(ids), time.time() - t_start))
 
-        for region in mkt.regions.REGIONS_DICT.values():
-            value = _get_trending(app.id, region)
-            if value:
-                trending, created = app.trending.get_or_create(
-                    region=region.id, defaults={'value': value})
-                if not created:
-                    trending.update(value=value)
 
-        times.append(time.time() - t_start)
+def _get_installs_bulk(client, ids, start=None, end=None):
+    """
+    Sum the installs of many apps in a single Monolith query, optionally
+    between two dates.
 
-    task_log.info('Trending calculated for %s apps. Avg time overall: '
-                  '%0.2fs' % (count, sum(times) / count))
+    Returns a dict mapping app IDs to their installs, 0 for the apps Monolith
+    has no installs for, or None if the query failed.
+    """
+    filters = [{'terms': {'app-id': list(ids)}}]
+    if start and end:
+        filters.append({'range': {'date': {
+            'gte': start.date().strftime('%Y-%m-%d'),
+            'lte': end.date().strftime('%Y-%m-%d'),
+        }}})
+    query = {
+        'query': {'filtered': {'query': {'match_all': {}},
+                               'filter': {'and': filters}}},
+        'aggs': {
+            'apps': {
+                'terms': {'field': 'app-id', 'size': len(ids)},
+                'aggs': {'installs': {'sum': {'field': 'app_installs'}}}}},
+        'size': 0}
+
+    try:
+        resp = client.raw(query)
+        buckets = resp['aggregations']['apps']['buckets']
+    except Exception as e:
+        task_log.info('Call to ES failed: {0}'.format(e))
+        return None
+
+    installs = dict.fromkeys(ids, 0)
+    for bucket in buckets:
+        installs[int(bucket['key'])] = int(bucket['installs']['value'] or 0)
+    return installs
 
 
 @task
 @write
 def update_downloads(ids, **kw):
     client = get_monolith_client()
-    count = 0
-
-    for app in Webapp.objects.filter(id__in=ids).no_transforms():
-
-        appid = {'app-id': app.id}
 
-        # Get weekly downloads.
-        query = {
-            'query': {'match_all': {}},
-            'facets': {
-                'installs': {
-                    'date_histogram': {
-                        'value_field': 'app_installs',
-                        'interval': 'week',
-                        'key_field': 'date',
-                    },
-                    'facet_filter': {
-                        'and': [
-                            {'term': appid},
-                            {'range': {'date': {
-                                'gte': days_ago(8).date().strftime('%Y-%m-%d'),
-                                'lte': days_ago(1).date().strftime('%Y-%m-%d'),
-                            }}}
-                        ]
-                    }
-                }
-            },
-            'size': 0}
+    apps = dict((pk, (weekly, total)) for pk, weekly, total in
+                Webapp.objects.filter(id__in=ids).no_transforms()
+                .values_list('id', 'weekly_downloads', 'total_downloads'))
+    if not apps:
+        return
 
-        try:
-            resp = client.raw(query)
-            # If we query monolith with interval=week and the past 7 days
-            # crosses a Monday, Monolith splits the counts into two. We want
-            # the sum over the past week so we need to `sum` these.
-            weekly = sum(
-                c['total'] for c in
-                resp.get('facets', {}).get('installs', {}).get('entries')
-                if c.get('total'))
-        except Exception as e:
-            task_log.info('Call to ES failed: {0}'.format(e))
-            weekly = 0
-
-        # Get total downloads.
-        query = {'query': {'match_all': {}},
-                 'facets': {
-                     'installs': {
-                         'statistical': {'field': 'app_installs'},
-                         'facet_filter': {'term': appid}}},
-                 'size': 0}
-        try:
-            resp = client.raw(query)
-            total = resp.get('facets', {}).get('installs', {}).get('total', 0)
-        except Exception as e:
-            task_log.info('Call to ES failed: {0}'.format(e))
-            total = 0
-
-        # Update Webapp object, if needed.
-        update = False
-        signal = False
-        if weekly != app.weekly_downloads:
-            update = True
-            signal = True
-        if total != app.total_downloads:
-            update = True
-
-        if update:
-            # Note: Calling `update` will trigger a reindex on the app if
-            # `_signal` is True. Since we only index `weekly_downloads`, we
-            # can skip reindexing if this hasn't changed.
-            count += 1
-            app.update(weekly_downloads=weekly, total_downloads=total,
-                       _signal=signal)
+    # Get weekly and total downloads. If a query fails, leave the current
+    # values untouched.
+    weekly = (_get_installs_bulk(client, apps, days_ago(8), days_ago(1)) or
+              dict((pk, values[0]) for pk, values in apps.items()))
+    total = (_get_installs_bulk(client, apps) or
+             dict((pk, values[1]) for pk, values in apps.items()))
+
+    changed = [pk for pk, values in apps.items()
+               if values != (weekly[pk], total[pk])]
+    if changed:
+        # A single UPDATE for all the changed apps.
+        table = Webapp._meta.db_table
+        cases = ' '.join(['WHEN %s THEN %s'] * len(changed))
+        params = []
+        for counts in (weekly, total):
+            for pk in changed:
+                params += [pk, counts[pk]]
+        cursor = connection.cursor()
+        cursor.execute(
+            'UPDATE {table} SET weekly_downloads = CASE id {cases} END, '
+            'total_downloads = CASE id {cases} END '
+            'WHERE id IN ({ids})'.format(
+                table=table, cases=cases,
+                ids=', '.join(['%s'] * len(changed))),
+            params + changed)
+        # The UPDATE sends no post_save, invalidate the cached apps by hand.
+        Webapp.objects.invalidate(*[Webapp(id=pk) for pk in changed])
+
+        # Since we only index `weekly_downloads`, only reindex the apps for
+        # which it changed.
+        reindex = [pk for pk in changed if weekly[pk] != apps[pk][0]]
+        if reindex:
+            WebappIndexer.index_ids(reindex)
 
     task_log.info('App downloads updated for %s out of %s apps.'
-                  % (count, len(ids)))
+                  % (len(changed), len(ids)))
 
 
 class PreGenAPKError(Exception):
@@ -8,7 +8,7 @@ from django.core.files.storage import default_storage as storage
 from django.core.management import call_command
 
 import mock
-from nose.tools import eq_
+from nose.tools import eq_, ok_
 
 import amo
 import amo.tests
@@ -23,7 +23,7 @@ from mkt.webapps import cron
 from mkt.webapps.cron import (clean_old_signed, mkt_gc, update_app_trending,
                               update_downloads)
 from mkt.webapps.models import Webapp
-from mkt.webapps.tasks import _get_trending
+from mkt.webapps.tasks import _get_trending, _get_trending_bulk
 
 
 class TestLastUpdated(amo.tests.TestCase):
@@ -128,25 +128,17 @@ class TestWeeklyDownloads(amo.tests.TestCase):
     def get_app(self):
         return Webapp.objects.get(pk=self.app.pk)
 
+    def installs(self, *counts):
+        return {'aggregations': {'apps': {'buckets': [
+            {'key': app.pk, 'doc_count': 1, 'installs': {'value': count}}
+            for app, count in counts]}}}
+
+    @mock.patch('mkt.webapps.tasks.WebappIndexer.index_ids')
     @mock.patch('mkt.webapps.tasks.get_monolith_client')
-    def test_weekly_downloads(self, _mock):
+    def test_weekly_downloads(self, _mock, index_mock):
         client = mock.Mock()
-        raw = {
-            'facets': {
-                'installs': {
-                    '_type': 'date_histogram',
-                    'entries': [
-                        {'count': 3,
-                         'time': 1390780800000,
-                         'total': 19.0},
-                        {'count': 62,
-                         'time': 1391385600000,
-                         'total': 236.0}
-                    ]
-                }
-            }
-        }
-        client.raw.return_value = raw
+        client.raw.side_effect = [self.installs((self.app, 255.0)),
+                                  self.installs()]
         _mock.return_value = client
 
         eq_(self.app.weekly_downloads, 0)
@@ -155,20 +147,15 @@ class TestWeeklyDownloads(amo.tests.TestCase):
 
         self.app.reload()
         eq_(self.app.weekly_downloads, 255)
+        eq_(self.app.total_downloads, 0)
+        index_mock.assert_called_with([self.app.pk])
 
+    @mock.patch('mkt.webapps.tasks.WebappIndexer.index_ids')
     @mock.patch('mkt.webapps.tasks.get_monolith_client')
-    def test_total_downloads(self, _mock):
+    def test_total_downloads(self, _mock, index_mock):
         client = mock.Mock()
-        raw = {
-            'facets': {
-                'installs': {
-                    u'_type': u'statistical',
-                    u'count': 49,
-                    u'total': 6638.0
-                }
-            }
-        }
-        client.raw.return_value = raw
+        client.raw.side_effect = [self.installs(),
+                                  self.installs((self.app, 6638.0))]
         _mock.return_value = client
 
         eq_(self.app.total_downloads, 0)
@@ -177,9 +164,49 @@ class TestWeeklyDownloads(amo.tests.TestCase):
 
         self.app.reload()
         eq_(self.app.total_downloads, 6638)
+        # Only `weekly_downloads` is indexed.
+        ok_(not index_mock.called)
+
+    @mock.patch('mkt.webapps.tasks.WebappIndexer.index_ids')
+    @mock.patch('mkt.webapps.tasks.get_monolith_client')
+    def test_bulk(self, _mock, index_mock):
+        app2 = Webapp.objects.create(status=amo.STATUS_PUBLIC,
+                                     weekly_downloads=10, total_downloads=20)
+        app3 = Webapp.objects.create(status=amo.STATUS_PUBLIC,
+                                     weekly_downloads=3, total_downloads=30)
+        client = mock.Mock()
+        client.raw.side_effect = [
+            self.installs((self.app, 1.0), (app2, 10.0), (app3, 4.0)),
+            self.installs((self.app, 2.0), (app2, 20.0), (app3, 30.0))]
+        _mock.return_value = client
+
+        update_downloads([self.app.pk, app2.pk, app3.pk])
+
+        eq_(client.raw.call_count, 2)
+        eq_([(app.weekly_downloads, app.total_downloads) for app in
+             Webapp.objects.filter(pk__in=[self.app.pk, app2.pk, app3.pk])
+                           .order_by('pk')],
+            [(1, 2), (10, 20), (4, 30)])
+        eq_(sorted(index_mock.call_args[0][0]), [self.app.pk, app3.pk])
+
+    @mock.patch('mkt.webapps.tasks.WebappIndexer.index_ids')
+    @mock.patch('mkt.webapps.tasks.get_monolith_client')
+    def test_invalidates_cached_apps(self, _mock, index_mock):
+        client = mock.Mock()
+        client.raw.side_effect = [self.installs((self.app, 255.0)),
+                                  self.installs((self.app, 300.0))]
+        _mock.return_value = client
+        eq_(self.get_app().weekly_downloads, 0)  # Now cached.
+
+        update_downloads([self.app.pk])
+
+        app = self.get_app()
+        eq_(app.weekly_downloads, 255)
+        eq_(app.total_downloads, 300)
 
     @mock.patch('mkt.webapps.tasks.get_monolith_client')
     def test_monolith_error(self, _mock):
+        self.app.update(weekly_downloads=5, total_downloads=10)
         client = mock.Mock()
         client.side_effect = ValueError
         client.raw.side_effect = Exception
@@ -188,8 +215,8 @@ class TestWeeklyDownloads(amo.tests.TestCase):
         update_downloads([self.app.pk])
 
         self.app.reload()
-        eq_(self.app.weekly_downloads, 0)
-        eq_(self.app.total_downloads, 0)
+        eq_(self.app.weekly_downloads, 5)
+        eq_(self.app.total_downloads, 10)
 
 
 class TestCleanup(amo.tests.TestCase):
@@ -250,9 +277,15 @@ class TestUpdateTrending(amo.tests.TestCase):
     def setUp(self):
         self.app = Webapp.objects.create(status=amo.STATUS_PUBLIC)
 
-    @mock.patch('mkt.webapps.tasks._get_trending')
+    def trending_values(self, value):
+        values = {(self.app.id, 0): value}
+        for region in mkt.regions.REGIONS_DICT.values():
+            values[(self.app.id, region.id)] = value
+        return values
+
+    @mock.patch('mkt.webapps.tasks._get_trending_bulk')
     def test_trending_saved(self, _mock):
-        _mock.return_value = 12.0
+        _mock.return_value = self.trending_values(12.0)
         update_app_trending()
 
         eq_(self.app.get_trending(), 12.0)
@@ -260,12 +293,45 @@ class TestUpdateTrending(amo.tests.TestCase):
             eq_(self.app.get_trending(region=region), 12.0)
 
         # Test running again updates the values as we'd expect.
-        _mock.return_value = 2.0
+        _mock.return_value = self.trending_values(2.0)
         update_app_trending()
         eq_(self.app.get_trending(), 2.0)
         for region in mkt.regions.REGIONS_DICT.values():
             eq_(self.app.get_trending(region=region), 2.0)
 
+    @mock.patch('mkt.webapps.tasks.get_monolith_client')
+    def test_get_trending_bulk(self, _mock):
+        def bucket(key, week, prior, regions=None):
+            data = {'key': key,
+                    'week': {'installs': {'value': week}},
+                    'prior': {'installs': {'value': prior}}}
+            if regions is not None:
+                data['regions'] = {'buckets': regions}
+            return data
+
+        client = mock.Mock()
+        client.raw.return_value = {'aggregations': {'apps': {'buckets': [
+            bucket(self.app.id, 255.0, 255.0, [
+                bucket('us', 255.0, 255.0),
+                # Under the threshold of 100 installs.
+                bucket('br', 99.0, 3.0),
+                bucket('unknown', 255.0, 255.0),
+            ])]}}}
+        _mock.return_value = client
+
+        # Same numbers as in `test_get_trending`.
+        eq_(_get_trending_bulk([self.app.id]),
+            {(self.app.id, 0): 2.0,
+             (self.app.id, mkt.regions.US.id): 2.0})
+        eq_(client.raw.call_count, 1)
+
+    @mock.patch('mkt.webapps.tasks.get_monolith_client')
+    def test_get_trending_bulk_monolith_error(self, _mock):
+        client = mock.Mock()
+        client.raw.side_effect = ValueError
+        _mock.return_value = client
+        eq_(_get_trending_bulk([self.app.id]), {})
+
     @mock.patch('mkt.webapps.tasks.get_monolith_client')
     def test_get_trending(self, _mock):
         client = mock.Mock()
@@ -0,0 +1,139 @@
+import datetime
+import hashlib
+import json
+import os
+import tarfile
+from tempfile import mkdtemp
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from nose.tools import eq_, ok_
+
+import amo
+import amo.tests
+from mkt.site.fixtures import fixture
+from mkt.users.models import UserProfile
+from mkt.webapps.export import (export_apps, export_user_installs,
+                                iter_serialized, serialize_apps)
+from mkt.webapps.models import Webapp
+from mkt.webapps.tasks import rm_directory
+
+
+class TestExportApps(amo.tests.TestCase):
+    fixtures = fixture('webapp_337141', 'collection_81721')
+
+    def setUp(self):
+        self.export_directory = mkdtemp()
+        self.app_path = 'apps/337/337141.json'
+
+    def tearDown(self):
+        rm_directory(self.export_directory)
+
+    def export(self, **kwargs):
+        with self.settings(DUMPED_APPS_PATH=self.export_directory):
+            return export_apps(filename='export', **kwargs)
+
+    def test_tarball(self):
+        tarball = tarfile.open(self.export())
+        eq_(sorted(tarball.getnames()),
+            [self.app_path, 'collections/81/81721.json', 'license.txt',
+             'readme.txt'])
+        eq_(json.loads(tarball.extractfile(self.app_path).read())['id'],
+            337141)
+        # Nothing is written but the tarball.
+        eq_(sorted(os.listdir(self.export_directory)), ['tarballs'])
+
+    def test_ndjson(self):
+        lines = [json.loads(line)
+                 for line in open(self.export(format='ndjson'))]
+        eq_([line['path'] for line in lines],
+            [self.app_path, 'collections/81/81721.json'])
+        eq_(lines[0]['data']['id'], 337141)
+
+    def test_not_public(self):
+        Webapp.objects.get(pk=337141).update(status=amo.STATUS_PENDING)
+        names = tarfile.open(self.export()).getnames()
+        ok_(self.app_path not in names)
+
+    def test_incremental(self):
+        self.export()
+        names = tarfile.open(self.export(incremental=True)).getnames()
+        ok_(self.app_path not in names)
+
+        Webapp.objects.get(pk=337141).update(
+            modified=datetime.datetime.now() + datetime.timedelta(days=1))
+        names = tarfile.open(self.export(incremental=True)).getnames()
+        ok_(self.app_path in names)
+
+    def test_incremental_version_changed(self):
+        self.export()
+        Webapp.objects.get(pk=337141).current_version.update(
+            modified=datetime.datetime.now() + datetime.timedelta(days=1))
+        names = tarfile.open(self.export(incremental=True)).getnames()
+        ok_(self.app_path in names)
+
+    def test_incremental_removed(self):
+        self.export()
+        Webapp.objects.get(pk=337141).update(status=amo.STATUS_PENDING)
+        tarball = tarfile.open(self.export(incremental=True))
+        ok_(self.app_path not in tarball.getnames())
+        eq_(json.loads(tarball.extractfile('apps/removed.json').read()),
+            [337141])
+
+        # Listed once, and exported again once public.
+        names = tarfile.open(self.export(incremental=True)).getnames()
+        ok_('apps/removed.json' not in names)
+        Webapp.objects.get(pk=337141).update(status=amo.STATUS_PUBLIC)
+        names = tarfile.open(self.export(incremental=True)).getnames()
+        ok_(self.app_path in names)
+
+    def test_serialize_apps_queries(self):
+        ids = [337141] + [amo.tests.app_factory().pk for i in range(3)]
+        cache.clear()
+        with CaptureQueriesContext(connection) as one:
+            eq_(len(serialize_apps(ids[:1])), 1)
+        cache.clear()
+        with CaptureQueriesContext(connection) as four:
+            eq_(len(serialize_apps(ids)), 4)
+        # A fixed number of queries per batch, whatever its size.
+        eq_(len(four), len(one))
+
+    def test_iter_serialized(self):
+        app = amo.tests.app_factory()
+        # Batches are serialized in order.
+        eq_([path for path, data in
+             iter_serialized(serialize_apps, [337141, app.pk],
+                             batch_size=1)],
+            [self.app_path, 'apps/%s/%s.json' % (app.pk / 1000, app.pk)])
+
+
+class TestExportUserInstalls(amo.tests.TestCase):
+    fixtures = fixture('user_2519', 'webapp_337141')
+
+    def setUp(self):
+        self.export_directory = mkdtemp()
+        self.app = Webapp.objects.get(pk=337141)
+        self.user = UserProfile.objects.get(pk=2519)
+        self.app.installed.create(user=self.user)
+        self.hash = hashlib.sha256('%s%s' % (str(self.user.pk),
+                                             settings.SECRET_KEY)).hexdigest()
+
+    def tearDown(self):
+        rm_directory(self.export_directory)
+
+    def test_tarball(self):
+        deleted = amo.tests.app_factory()
+        deleted.installed.create(user=self.user)
+        deleted.delete()
+
+        with self.settings(DUMPED_USERS_PATH=self.export_directory):
+            tarball = tarfile.open(export_user_installs(filename='export'))
+        path = 'users/%s/%s.json' % (self.hash[0], self.hash)
+        eq_(sorted(tarball.getnames()),
+            [path, 'users/license.txt', 'users/readme.txt'])
+        data = json.loads(tarball.extractfile(path).read())
+        eq_(data['user'], self.hash)
+        eq_([app['id'] for app in data['installed_apps']], [self.app.id])
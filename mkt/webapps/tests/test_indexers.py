@@ -1,4 +1,8 @@
 # -*- coding: utf-8 -*-
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+import mock
 from nose.tools import eq_, ok_
 
 import amo.tests
@@ -9,7 +13,9 @@ from mkt.reviewers.models import EscalationQueue, RereviewQueue
 from mkt.site.fixtures import fixture
 from mkt.translations.utils import to_language
 from mkt.webapps.indexers import WebappIndexer
-from mkt.webapps.models import AddonDeviceType, ContentRating, Webapp
+from mkt.webapps.models import (AddonDeviceType, AddonExcludedRegion,
+                                AddonUpsell, AppManifest, ContentRating,
+                                Installed, Webapp)
 
 
 class TestWebappIndexer(amo.tests.TestCase):
@@ -176,6 +182,64 @@ class TestWebappIndexer(amo.tests.TestCase):
             {'lang': 'fr', 'string': release_notes['fr']})
 
 
+class TestWebappIndexerBulk(amo.tests.TestCase):
+    fixtures = fixture('webapp_337141', 'user_999')
+
+    def setUp(self):
+        self.app = Webapp.objects.get(pk=337141)
+        self.apps = [self.app] + [amo.tests.app_factory() for i in range(3)]
+        for app in self.apps:
+            AppManifest.objects.get_or_create(
+                version=app.current_version,
+                defaults={'manifest': '{"appcache_path": "/cache"}'})
+
+    def _get_objs(self, apps=None):
+        ids = [app.pk for app in apps or self.apps]
+        return list(Webapp.with_deleted.no_cache().filter(id__in=ids)
+                    .order_by('id'))
+
+    def test_identical_documents(self):
+        AddonExcludedRegion.objects.create(addon=self.app,
+                                           region=mkt.regions.BR.id)
+        ContentRating.objects.create(
+            addon=self.app, ratings_body=mkt.ratingsbodies.PEGI.id,
+            rating=mkt.ratingsbodies.PEGI_12.id)
+        EscalationQueue.objects.create(addon=self.apps[1])
+        RereviewQueue.objects.create(addon=self.apps[2])
+        Installed.objects.create(addon=self.app, user_id=999)
+        AddonUpsell.objects.create(free=self.apps[3], premium=self.app)
+
+        objs = self._get_objs()
+        docs = WebappIndexer.extract_documents(objs)
+        eq_(len(docs), len(objs))
+        for obj, doc in zip(self._get_objs(), docs):
+            eq_(doc, WebappIndexer.extract_document(obj.pk, obj))
+
+    def test_queries_do_not_depend_on_chunk_size(self):
+        objs = self._get_objs(self.apps[:1])
+        with CaptureQueriesContext(connection) as one:
+            WebappIndexer.extract_documents(objs)
+
+        objs = self._get_objs()
+        with CaptureQueriesContext(connection) as chunk:
+            WebappIndexer.extract_documents(objs)
+
+        eq_(len(one), len(chunk))
+
+    def test_empty(self):
+        eq_(WebappIndexer.extract_documents([]), [])
+
+    @mock.patch.object(WebappIndexer, 'get_related_data')
+    def test_iter_documents_related_data_failed(self, get_related_data):
+        get_related_data.side_effect = Exception
+        ids = [app.pk for app in self.apps]
+        failed = []
+        eq_(list(WebappIndexer.iter_documents(ids, failed=failed)), [])
+        eq_(sorted(failed), sorted(ids))
+        with self.assertRaises(Exception):
+            list(WebappIndexer.iter_documents(ids))
+
+
 class TestAppFilter(amo.tests.ESTestCase):
 
     def test_app_ids(self):
@@ -15,6 +15,7 @@ from django import forms
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
 from django.core import mail
+from django.core.cache import cache
 from django.core.files.storage import default_storage as storage
 from django.core.urlresolvers import reverse
 from django.db.models.signals import post_delete, post_save
@@ -56,9 +57,11 @@ from mkt.webapps.indexers import WebappIndexer
 from mkt.webapps.models import (AddonDeviceType, AddonExcludedRegion,
                                 AddonUpsell, AppFeatures, AppManifest,
                                 BlacklistedSlug, ContentRating, Geodata,
-                                get_excluded_in, IARCInfo, Installed, Preview,
+                                get_excluded_in, get_excluded_region_masks,
+                                IARCInfo, Installed, Preview,
                                 RatingDescriptors, RatingInteractives,
-                                version_changed, Webapp)
+                                region_exclusions_key, version_changed,
+                                Webapp)
 from mkt.webapps.signals import version_changed as version_changed_signal
 
 
@@ -594,6 +597,64 @@ class TestWebapp(amo.tests.WebappTestCase):
         AddonExcludedRegion.objects.create(addon=app, region=region.id)
         self.assertSetEqual(get_excluded_in(region.id), [app.id])
 
+    def test_excluded_in_updated(self):
+        app = self.get_app()
+        eq_(get_excluded_in(mkt.regions.BR.id), set())
+        eq_(get_excluded_in(mkt.regions.DE.id), set())
+        aer = AddonExcludedRegion.objects.create(addon=app,
+                                                 region=mkt.regions.BR.id)
+        # Only the change of this app is applied to the cached exclusions.
+        with self.assertNumQueries(0):
+            eq_(get_excluded_in(mkt.regions.BR.id), set([app.id]))
+            eq_(get_excluded_in(mkt.regions.DE.id), set())
+        aer.delete()
+        with self.assertNumQueries(0):
+            eq_(get_excluded_in(mkt.regions.BR.id), set())
+
+    def test_excluded_in_interleaved_updates(self):
+        app = self.get_app()
+        other = amo.tests.app_factory()
+        eq_(get_excluded_in(mkt.regions.BR.id), set())
+        # A request that read the exclusions before the two changes below...
+        key = region_exclusions_key('region', mkt.regions.BR.id)
+        stale = cache.get(key)
+        AddonExcludedRegion.objects.create(addon=app,
+                                           region=mkt.regions.BR.id)
+        AddonExcludedRegion.objects.create(addon=other,
+                                           region=mkt.regions.BR.id)
+        eq_(get_excluded_in(mkt.regions.BR.id), set([app.id, other.id]))
+        # ...and caches what it read after them can't hide either change.
+        cache.set(key, stale)
+        eq_(get_excluded_in(mkt.regions.BR.id), set([app.id, other.id]))
+
+    def test_excluded_in_missing_change(self):
+        app = self.get_app()
+        eq_(get_excluded_in(mkt.regions.BR.id), set())
+        AddonExcludedRegion.objects.create(addon=app,
+                                           region=mkt.regions.BR.id)
+        seq = cache.get(region_exclusions_key('seq'))
+        cache.delete(region_exclusions_key('change', seq))
+        eq_(get_excluded_in(mkt.regions.BR.id), set([app.id]))
+
+    def test_excluded_in_geodata_unrelated_change(self):
+        app = self.get_app()
+        eq_(get_excluded_in(mkt.regions.DE.id), set())
+        seq = cache.get(region_exclusions_key('seq'))
+        app.geodata.update(banner_regions=[mkt.regions.DE.id])
+        eq_(cache.get(region_exclusions_key('seq')), seq)
+        app.geodata.update(region_de_usk_exclude=True)
+        eq_(cache.get(region_exclusions_key('seq')), seq + 1)
+        with self.assertNumQueries(0):
+            eq_(get_excluded_in(mkt.regions.DE.id), set([app.id]))
+
+    def test_excluded_region_masks(self):
+        app = self.get_app()
+        AddonExcludedRegion.objects.create(addon=app,
+                                           region=mkt.regions.BR.id)
+        app.geodata.update(region_de_usk_exclude=True)
+        eq_(get_excluded_region_masks([app.id, app.id + 1]),
+            {app.id: 1 << mkt.regions.BR.id | 1 << mkt.regions.DE.id})
+
     def test_supported_locale_property(self):
         app = self.get_app()
         eq_(app.supported_locales,
@@ -23,8 +23,16 @@ from mkt.users.models import UserProfile
 from mkt.versions.models import Version
 from mkt.webapps.indexers import WebappIndexer
 from mkt.webapps.models import AddonDeviceType, Installed, Preview, Webapp
-from mkt.webapps.serializers import (AppSerializer, ESAppSerializer,
-                                     SimpleESAppSerializer)
+from mkt.fireplace.serializers import (FeedFireplaceESAppSerializer,
+                                       FireplaceESAppSerializer)
+from mkt.reviewers.serializers import ReviewersESAppSerializer
+from mkt.search.serializers import BaseESSerializer
+from mkt.webapps.serializers import (AppSerializer, ESAppFeedSerializer,
+                                     ESAppFeedCollectionSerializer,
+                                     ESAppSerializer,
+                                     FeedDiscoPlaceESAppSerializer,
+                                     SimpleESAppSerializer,
+                                     SuggestionsESAppSerializer)
 
 
 class TestAppSerializer(amo.tests.TestCase):
@@ -674,6 +682,169 @@ class TestESAppSerializer(amo.tests.ESTestCase):
         eq_(res.data['group'], {'en-US': 'My Group'})
 
 
+class TestESAppSerializerAccessors(amo.tests.ESTestCase):
+    """
+    Serializing straight from the ES data must give the same output as
+    serializing the fake instance.
+    """
+    fixtures = fixture('user_2519', 'webapp_337141')
+
+    def setUp(self):
+        self.profile = UserProfile.objects.get(pk=2519)
+        self.app = Webapp.objects.get(pk=337141)
+        self.app.update(categories=['books', 'social'])
+        Preview.objects.create(filetype='image/png', addon=self.app,
+                               position=0)
+        self.app.description = {
+            'en-US': u'XSS attempt <script>alert(1)</script>',
+            'fr': u'Déscriptîon in frènch'
+        }
+        self.app.save()
+        self.refresh('webapp')
+        self.request = self.get_request('/')
+
+    def get_request(self, url, user=None):
+        request = RequestFactory().get(url)
+        request.REGION = mkt.regions.US
+        request.user = user or AnonymousUser()
+        return request
+
+    def get_obj(self):
+        # Serializing can modify the hit, so always get a fresh one.
+        return WebappIndexer.search().filter(
+            'term', id=self.app.pk).execute().hits[0]
+
+    def check(self, serializer_class, request=None):
+        serializer = serializer_class(
+            context={'request': request or self.request})
+        ok_(serializer.compile_es_accessors(),
+            '%s has no ES accessors.' % serializer_class.__name__)
+        ok_(serializer.can_serialize_es(self.get_obj()))
+        res = serializer.to_native(self.get_obj())
+        expected = super(BaseESSerializer, serializer).to_native(
+            serializer.fake_object(self.get_obj()))
+        eq_(res.keys(), expected.keys())
+        for k, v in expected.items():
+            eq_(res[k], v,
+                u'Expected value "%s" for field "%s", got "%s"' %
+                (v, k, res[k]))
+        return res
+
+    def test_basic(self):
+        self.check(ESAppSerializer)
+
+    def test_basic_no_queries(self):
+        serializer = ESAppSerializer(context={'request': self.request})
+        obj = self.get_obj()
+        with self.assertNumQueries(0):
+            serializer.to_native(obj)
+
+    def test_with_lang(self):
+        res = self.check(ESAppSerializer, self.get_request('/?lang=fr'))
+        eq_(res['description'], u'Déscriptîon in frènch')
+
+    def test_user(self):
+        self.app.installed.create(user=self.profile)
+        res = self.check(ESAppSerializer,
+                         self.get_request('/', user=self.profile))
+        eq_(res['user'], {'developed': False, 'installed': True,
+                          'purchased': False})
+
+    def test_content_ratings(self):
+        self.app.set_content_ratings({
+            ratingsbodies.CLASSIND: ratingsbodies.CLASSIND_18,
+            ratingsbodies.GENERIC: ratingsbodies.GENERIC_18,
+        })
+        self.app.set_descriptors(['has_generic_violence',
+                                  'has_classind_shocking'])
+        self.app.set_interactives(['has_digital_purchases', 'has_shares_info'])
+        self.app.save()
+        self.refresh('webapp')
+        self.check(ESAppSerializer)
+
+        request = self.get_request('/')
+        request.REGION = mkt.regions.BR
+        eq_(self.check(ESAppSerializer, request)['content_ratings']['body'],
+            'classind')
+
+    def test_region_exclusions(self):
+        self.app.addonexcludedregion.create(region=mkt.regions.BR.id)
+        self.app.save()
+        self.refresh('webapp')
+        res = self.check(ESAppSerializer)
+        ok_(mkt.regions.BR.slug not in
+            [region['slug'] for region in res['regions']])
+
+    def test_feed_collection_group(self):
+        serializer = ESAppSerializer(context={'request': self.request})
+        obj = self.get_obj()
+        obj['group_translations'] = [{'lang': 'en-US', 'string': 'My Group'}]
+        eq_(serializer.to_native(obj)['group'], {'en-US': 'My Group'})
+
+    def test_subclasses(self):
+        for serializer_class in (ESAppFeedSerializer,
+                                 ESAppFeedCollectionSerializer,
+                                 FeedDiscoPlaceESAppSerializer,
+                                 FeedFireplaceESAppSerializer,
+                                 FireplaceESAppSerializer,
+                                 ReviewersESAppSerializer,
+                                 SimpleESAppSerializer,
+                                 SuggestionsESAppSerializer):
+            self.check(serializer_class)
+
+    def test_premium(self):
+        self.make_premium(self.app)
+        self.app.save()
+        self.refresh('webapp')
+        serializer = ESAppSerializer(context={'request': self.request})
+        ok_(not serializer.can_serialize_es(self.get_obj()))
+        with mock.patch.object(serializer, 'fake_object',
+                               wraps=serializer.fake_object) as fake_object:
+            serializer.to_native(self.get_obj())
+        ok_(fake_object.called)
+
+    def get_source_obj(self, serializer_class):
+        return WebappIndexer.search(
+            source=serializer_class.get_es_source_fields()).filter(
+                'term', id=self.app.pk).execute().hits[0]
+
+    def test_source_fields(self):
+        eq_(ESAppFeedCollectionSerializer.get_es_source_fields(),
+            ['app_slug', 'app_type', 'device', 'icon_hash', 'id',
+             'premium_type', 'region_exclusions', 'status'])
+        source = ESAppSerializer.get_es_source_fields()
+        ok_('name_translations' in source)
+        ok_('popularity' not in source)
+
+    def test_serialize_source_fields(self):
+        for serializer_class in (ESAppSerializer,
+                                 ESAppFeedCollectionSerializer,
+                                 FireplaceESAppSerializer,
+                                 ReviewersESAppSerializer,
+                                 SuggestionsESAppSerializer):
+            serializer = serializer_class(
+                context={'request': self.request})
+            eq_(serializer.to_native(self.get_source_obj(serializer_class)),
+                serializer.to_native(self.get_obj()))
+
+    def test_fake_object_source_fields(self):
+        serializer = ESAppFeedCollectionSerializer(
+            context={'request': self.request})
+        obj = serializer.fake_object(
+            self.get_source_obj(ESAppFeedCollectionSerializer))
+        eq_(super(BaseESSerializer, serializer).to_native(obj),
+            serializer.to_native(self.get_obj()))
+
+    def test_overridden_method(self):
+        class TagsESAppSerializer(ESAppSerializer):
+            def get_tags(self, obj):
+                return ['overridden']
+
+        serializer = TagsESAppSerializer(context={'request': self.request})
+        eq_(serializer.compile_es_accessors(), None)
+        eq_(serializer.to_native(self.get_obj())['tags'], ['overridden'])
+
+
 class TestSimpleESAppSerializer(amo.tests.ESTestCase):
     fixtures = fixture('webapp_337141')
 
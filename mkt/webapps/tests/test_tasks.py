@@ -1,16 +1,20 @@
 # -*- coding: utf-8 -*-
+import BaseHTTPServer
 import collections
 import datetime
 import hashlib
 import json
 import os
+import SocketServer
 import stat
 import tarfile
+import threading
 from copy import deepcopy
 from tempfile import mkdtemp
 
 from django.conf import settings
 from django.core import mail
+from django.core.cache import cache
 from django.core.files.storage import default_storage as storage
 from django.core.management import call_command
 from django.core.urlresolvers import reverse
@@ -30,7 +34,8 @@ from mkt.site.helpers import absolutify
 from mkt.users.models import UserProfile
 from mkt.versions.models import Version
 from mkt.webapps.models import AddonUser, Preview, Webapp
-from mkt.webapps.tasks import (dump_app, dump_user_installs, export_data,
+from mkt.webapps.tasks import (_fetch_manifests, _manifest_validators_key,
+                               dump_app, dump_user_installs, export_data,
                                fake_app_names, fix_excluded_regions,
                                generate_app_data, notify_developers_of_failure,
                                pre_generate_apk, PreGenAPKError, rm_directory,
@@ -309,6 +314,31 @@ class TestUpdateManifest(amo.tests.TestCase):
         assert not retry.called
         assert RereviewQueue.objects.filter(addon=self.addon).exists()
 
+    def test_not_modified(self):
+        self._hash = ohash
+        self.response_mock.headers['etag'] = '"v1"'
+        self._run()
+        eq_(cache.get(_manifest_validators_key(self.addon.pk)),
+            {'etag': '"v1"', 'last_modified': None, 'hash': ohash})
+
+        self.response_mock.status_code = 304
+        self._run()
+        eq_(self.req_mock.call_count, 2)
+        eq_(self.req_mock.call_args[1]['headers']['If-None-Match'], '"v1"')
+        assert not self.validator.called
+
+    def test_not_modified_refetch(self):
+        # The manifest we last fetched isn't the one of the current file, it
+        # is fetched again without the conditional headers.
+        cache.set(_manifest_validators_key(self.addon.pk),
+                  {'etag': '"v1"', 'hash': 'sha256:failed-validation'})
+        not_modified = mock.Mock(status_code=304, headers={})
+        self.req_mock.side_effect = [not_modified, self.response_mock]
+        self._run()
+        eq_(self.req_mock.call_count, 2)
+        ok_('If-None-Match' not in self.req_mock.call_args[1]['headers'])
+        assert self.validator.called
+
     @mock.patch('mkt.webapps.models.Webapp.set_iarc_storefront_data')
     def test_manifest_validation_failure(self, _iarc):
         # We are already mocking validator, but this test needs to make sure
@@ -501,6 +531,78 @@ class TestUpdateManifest(amo.tests.TestCase):
         ok_(_iarc.called)
 
 
+class ManifestServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class ManifestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serves a manifest on every path, with its path as ETag."""
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.current += 1
+            server.concurrency = max(server.concurrency, server.current)
+        try:
+            etag = '"%s"' % self.path
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type',
+                             'application/x-web-app-manifest+json')
+            self.send_header('ETag', etag)
+            self.end_headers()
+            self.wfile.write(json.dumps({'name': self.path}))
+        finally:
+            with server.lock:
+                server.current -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+class TestFetchManifests(amo.tests.TestCase):
+
+    def setUp(self):
+        self.server = ManifestServer(('127.0.0.1', 0), ManifestHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = self.server.current = 0
+        self.server.concurrency = 0
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.shutdown)
+
+        url = 'http://127.0.0.1:%s/%%s/manifest.webapp' % (
+            self.server.server_port)
+        self.apps = [Webapp(id=i, manifest_url=url % i)
+                     for i in range(1, 121)]
+
+    def test_fetch(self):
+        fetched = _fetch_manifests(self.apps)
+        eq_(sorted(fetched), range(1, 121))
+        content, validators, error = fetched[1]
+        eq_(json.loads(content), {'name': '/1/manifest.webapp'})
+        eq_(validators['etag'], '"/1/manifest.webapp"')
+        eq_(error, None)
+        eq_(self.server.requests, 120)
+        ok_(self.server.concurrency <= settings.MANIFEST_FETCH_PER_HOST)
+
+    def test_not_modified(self):
+        for id, (content, validators, error) in (
+                _fetch_manifests(self.apps).items()):
+            cache.set(_manifest_validators_key(id), validators)
+
+        # Every manifest is requested again, none is modified.
+        fetched = _fetch_manifests(self.apps)
+        eq_(self.server.requests, 240)
+        eq_(set((content, error) for content, validators, error
+                in fetched.values()), set([(None, None)]))
+
+
 class TestDumpApps(amo.tests.TestCase):
     fixtures = fixture('webapp_337141')
 
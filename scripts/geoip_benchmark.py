@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+Measures the lookups per second of the local GeoIP database.
+
+Usage: python scripts/geoip_benchmark.py [ranges.csv] [--lookups=N]
+
+Without a file, a database of random ranges is generated.
+"""
+import optparse
+import os
+import random
+import site
+import socket
+import struct
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+site.addsitedir(os.path.join(ROOT, 'apps'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mkt.settings')
+
+from lib.geoip import GeoIPDatabase  # noqa
+
+
+def int_to_ip(value):
+    return socket.inet_ntoa(struct.pack('!I', value))
+
+
+def generate_ranges(count):
+    """Writes `count` random ranges to a temporary file, returns its path."""
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    starts = sorted(random.sample(xrange(1 << 32), count))
+    with os.fdopen(fd, 'w') as f:
+        for start, next_start in zip(starts, starts[1:] + [1 << 32]):
+            end = random.randint(start, next_start - 1)
+            f.write('%s,%s,%s\n' % (int_to_ip(start), int_to_ip(end),
+                                    random.choice(['us', 'fr', 'br', 'de'])))
+    return path
+
+
+def run(label, lookup, addresses):
+    start = time.time()
+    for address in addresses:
+        lookup(address)
+    elapsed = time.time() - start
+    print '%-30s %10d lookups/sec' % (label, len(addresses) / elapsed)
+
+
+def main():
+    parser = optparse.OptionParser(usage=__doc__.strip())
+    parser.add_option('--lookups', type='int', default=200000)
+    parser.add_option('--ranges', type='int', default=200000,
+                      help='Number of ranges to generate without a file.')
+    parser.add_option('--cache-size', type='int', default=10000)
+    options, args = parser.parse_args()
+
+    path = args[0] if args else generate_ranges(options.ranges)
+    database = GeoIPDatabase(path, cache_size=options.cache_size)
+
+    start = time.time()
+    database.check()
+    print 'Loaded %s ranges in %.2fs' % (len(database.table[0]),
+                                         time.time() - start)
+
+    addresses = [int_to_ip(random.randint(1, (1 << 32) - 1))
+                 for i in xrange(options.lookups)]
+    run('Search, no cache', database.search, addresses)
+    run('Lookup, random addresses', database.lookup, addresses)
+    hot = addresses[:options.cache_size / 2]
+    run('Lookup, hot addresses', database.lookup,
+        hot * (len(addresses) / len(hot)))
+
+    if not args:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
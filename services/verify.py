@@ -1,5 +1,9 @@
 import calendar
+import copy
+import hashlib
 import json
+import threading
+from collections import OrderedDict
 from datetime import datetime
 from time import gmtime, time
 from urlparse import parse_qsl, urlparse
@@ -28,6 +32,7 @@ import receipts  # NOQA, used for patching in the tests
 
 status_codes = {
     200: '200 OK',
+    400: '400 Bad Request',
     405: '405 Method Not Allowed',
     500: '500 Internal Server Error',
 }
@@ -49,11 +54,68 @@ class RefundedReceipt(Exception):
     pass
 
 
+class LRUCache(object):
+    """
+    A bounded in-process cache, shared by the threads of the process.
+
+    Entries expire `timeout` seconds after being set and the least recently
+    used entries are evicted when there are more than `size` of them. Hits
+    and misses are counted in statsd under `services.<name>.cache`.
+    """
+
+    def __init__(self, name, size, timeout):
+        self.name = name
+        self.size = size
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            expires, value = self._data.pop(key, (0, None))
+            if expires > time():
+                # Put it back at the end, as the most recently used.
+                self._data[key] = (expires, value)
+            else:
+                value = None
+        statsd.incr('services.%s.cache.%s' %
+                    (self.name, 'miss' if value is None else 'hit'))
+        return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (time() + self.timeout, value)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# The decoded contents of the receipts whose signature was verified, keyed by
+# the receipt hash. Apps verify the same receipt at every launch.
+receipt_cache = LRUCache('receipt', settings.WEBAPPS_RECEIPT_CACHE_SIZE,
+                         settings.WEBAPPS_RECEIPT_CACHE_TIMEOUT)
+
+# The receipt verifiers, which keep the certificates of the issuers they
+# fetched and verified, keyed by the valid issuers.
+issuers_cache = LRUCache('issuers', 10,
+                         settings.SIGNING_ISSUERS_CACHE_TIMEOUT)
+
+
 class Verify:
 
-    def __init__(self, receipt, environ):
+    def __init__(self, receipt, environ, purchases=None):
         self.receipt = receipt
         self.environ = environ
+        # The purchases of a batch of receipts, looked up beforehand.
+        self.purchases = purchases
 
         # This is so the unit tests can override the connection.
         self.conn, self.cursor = None, None
@@ -63,11 +125,28 @@ class Verify:
         This is the default that verify will use, this will
         do the entire stack of checks.
         """
+        try:
+            self.check_full_receipt()
+        except InvalidReceipt, err:
+            return self.invalid(str(err))
+
+        return self.check_full_purchase()
+
+    def check_full_receipt(self):
+        """
+        The checks of `check_full` on the receipt itself.
+        """
         receipt_domain = urlparse(static_url('WEBAPPS_RECEIPT_URL')).netloc
+        self.decoded = self.decode()
+        self.check_type('purchase-receipt')
+        self.check_url(receipt_domain)
+
+    def check_full_purchase(self):
+        """
+        The checks of `check_full` on the purchase, once the receipt has been
+        checked.
+        """
         try:
-            self.decoded = self.decode()
-            self.check_type('purchase-receipt')
-            self.check_url(receipt_domain)
             self.check_purchase()
         except InvalidReceipt, err:
             return self.invalid(str(err))
@@ -237,15 +316,18 @@ class Verify:
         """
         Verifies that the inapp has been purchased.
         """
-        self.setup_db()
-        sql = """SELECT i.guid, c.type FROM stats_contributions c
-                 JOIN inapp_products i ON i.id=c.inapp_product_id
-                 WHERE c.id = %(contribution_id)s LIMIT 1;"""
-        self.cursor.execute(
-            sql,
-            {'contribution_id': self.get_contribution_id()}
-        )
-        result = self.cursor.fetchone()
+        if self.purchases is not None:
+            result = self.purchases.get_inapp(self.get_contribution_id())
+        else:
+            self.setup_db()
+            sql = """SELECT i.guid, c.type FROM stats_contributions c
+                     JOIN inapp_products i ON i.id=c.inapp_product_id
+                     WHERE c.id = %(contribution_id)s LIMIT 1;"""
+            self.cursor.execute(
+                sql,
+                {'contribution_id': self.get_contribution_id()}
+            )
+            result = self.cursor.fetchone()
         if not result:
             log_info('Invalid in-app receipt, no purchase')
             raise InvalidReceipt('NO_PURCHASE')
@@ -263,13 +345,17 @@ class Verify:
         """
         Verifies that the app has been purchased by the user.
         """
-        self.setup_db()
-        sql = """SELECT type FROM addon_purchase
-                 WHERE addon_id = %(app_id)s
-                 AND uuid = %(uuid)s LIMIT 1;"""
-        self.cursor.execute(sql, {'app_id': self.get_app_id(),
-                                  'uuid': self.get_user()})
-        result = self.cursor.fetchone()
+        if self.purchases is not None:
+            result = self.purchases.get_app(self.get_app_id(),
+                                            self.get_user())
+        else:
+            self.setup_db()
+            sql = """SELECT type FROM addon_purchase
+                     WHERE addon_id = %(app_id)s
+                     AND uuid = %(uuid)s LIMIT 1;"""
+            self.cursor.execute(sql, {'app_id': self.get_app_id(),
+                                      'uuid': self.get_user()})
+            result = self.cursor.fetchone()
         if not result:
             log_info('Invalid app receipt, no purchase')
             raise InvalidReceipt('NO_PURCHASE')
@@ -282,6 +368,8 @@ class Verify:
         """
         if purchase_type in (CONTRIB_REFUND, CONTRIB_CHARGEBACK):
             log_info('Valid receipt, but refunded')
+            # No need to remember a receipt that won't be valid anymore.
+            receipt_cache.delete(get_receipt_key(self.receipt))
             raise RefundedReceipt
 
         elif purchase_type in (CONTRIB_PURCHASE, CONTRIB_NO_CHARGE):
@@ -353,6 +441,79 @@ class Verify:
         return {'status': 'expired'}
 
 
+class Purchases:
+    """
+    The purchases of a batch of receipts, looked up with one query per table
+    rather than one per receipt.
+
+    Lookups return the same rows as the queries of `Verify`, or None.
+    """
+
+    def __init__(self, verifiers, cursor):
+        apps, contributions = set(), set()
+        for verifier in verifiers:
+            try:
+                if 'contrib' in verifier.get_storedata():
+                    contributions.add(verifier.get_contribution_id())
+                else:
+                    apps.add((verifier.get_app_id(), verifier.get_user()))
+            except InvalidReceipt:
+                # This will be reported when checking the purchase.
+                continue
+
+        self.apps = {}
+        if apps:
+            sql = """SELECT addon_id, uuid, type FROM addon_purchase
+                     WHERE addon_id IN %(app_ids)s
+                     AND uuid IN %(uuids)s;"""
+            app_ids, uuids = zip(*apps)
+            cursor.execute(sql, {'app_ids': tuple(set(app_ids)),
+                                 'uuids': tuple(set(uuids))})
+            for app_id, uuid, purchase_type in cursor.fetchall():
+                self.apps.setdefault((app_id, uuid), (purchase_type,))
+
+        self.inapps = {}
+        if contributions:
+            sql = """SELECT c.id, i.guid, c.type FROM stats_contributions c
+                     JOIN inapp_products i ON i.id=c.inapp_product_id
+                     WHERE c.id IN %(contribution_ids)s;"""
+            cursor.execute(sql, {'contribution_ids': tuple(contributions)})
+            for contribution_id, guid, purchase_type in cursor.fetchall():
+                self.inapps[contribution_id] = (guid, purchase_type)
+
+    def get_app(self, app_id, uuid):
+        return self.apps.get((app_id, uuid))
+
+    def get_inapp(self, contribution_id):
+        return self.inapps.get(contribution_id)
+
+
+def check_full_batch(batch, environ, cursor=None):
+    """
+    Does the checks of `Verify.check_full` on a list of receipts, returning
+    the result for each of them in the same order.
+    """
+    verifiers = [Verify(receipt, environ) for receipt in batch]
+    results = [None] * len(verifiers)
+    for i, verifier in enumerate(verifiers):
+        try:
+            verifier.check_full_receipt()
+        except InvalidReceipt, err:
+            results[i] = verifier.invalid(str(err))
+
+    checked = [v for v, result in zip(verifiers, results) if result is None]
+    if checked:
+        if not cursor:
+            cursor = mypool.connect().cursor()
+        purchases = Purchases(checked, cursor)
+        for i, verifier in enumerate(verifiers):
+            if results[i] is None:
+                verifier.purchases = purchases
+                results[i] = verifier.check_full_purchase()
+
+    return results
+
+
 def get_headers(length):
     return [('Access-Control-Allow-Origin', '*'),
             ('Access-Control-Allow-Methods', 'POST'),
@@ -362,15 +523,47 @@ def get_headers(length):
             ('Last-Modified', format_date_time(time()))]
 
 
+def get_receipt_key(receipt):
+    return hashlib.sha256(receipt).hexdigest()
+
+
+def get_verifier():
+    """
+    Returns a receipt verifier for the valid issuers, reused across receipts
+    so that the issuers certificates are only fetched and verified once per
+    `SIGNING_ISSUERS_CACHE_TIMEOUT`.
+    """
+    issuers = tuple(settings.SIGNING_VALID_ISSUERS)
+    verifier = issuers_cache.get(issuers)
+    if verifier is None:
+        verifier = certs.ReceiptVerifier(valid_issuers=list(issuers))
+        issuers_cache.set(issuers, verifier)
+    return verifier
+
+
 def decode_receipt(receipt):
+    """
+    Returns the contents of the receipt, once its signature is verified.
+
+    The contents of the verified receipts are cached, see `receipt_cache`.
+    """
+    key = get_receipt_key(receipt)
+    decoded = receipt_cache.get(key)
+    if decoded is None:
+        decoded = verify_receipt(receipt)
+        receipt_cache.set(key, decoded)
+    # The caller can change the receipt, e.g. its expiry.
+    return copy.deepcopy(decoded)
+
+
+def verify_receipt(receipt):
     """
     Cracks the receipt using the private key. This will probably change
     to using the cert at some point, especially when we get the HSM.
     """
     with statsd.timer('services.decode'):
         if settings.SIGNING_SERVER_ACTIVE:
-            verifier = certs.ReceiptVerifier(valid_issuers=
-                                             settings.SIGNING_VALID_ISSUERS)
+            verifier = get_verifier()
             try:
                 result = verifier.verify(receipt)
             except ExpiredSignatureError:
@@ -407,6 +600,8 @@ def receipt_check(environ):
     output = ''
     with statsd.timer('services.verify'):
         data = environ['wsgi.input'].read()
+        if data.lstrip().startswith('['):
+            return receipt_batch_check(environ, data)
         try:
             verify = Verify(data, environ)
             return 200, json.dumps(verify.check_full())
@@ -416,6 +611,29 @@ def receipt_check(environ):
     return output
 
 
+def receipt_batch_check(environ, data):
+    """
+    Verifies a JSON array of receipts, returning a JSON array of the results.
+    """
+    try:
+        batch = json.loads(data)
+        assert isinstance(batch, list)
+        assert len(batch) <= settings.WEBAPPS_RECEIPT_BATCH_SIZE
+        assert all(isinstance(receipt, basestring) for receipt in batch)
+    except (ValueError, AssertionError):
+        log_info('Invalid batch of receipts')
+        return 400, ''
+
+    with statsd.timer('services.verify.batch'):
+        try:
+            # JSON gives unicode, the receipts are verified as bytes.
+            batch = [receipt.encode('utf-8') for receipt in batch]
+            return 200, json.dumps(check_full_batch(batch, environ))
+        except:
+            log_exception('<batch>')
+            return 500, ''
+
+
 def application(environ, start_response):
     body = ''
     path = environ.get('PATH_INFO', '')
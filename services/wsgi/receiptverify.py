@@ -1,4 +1,12 @@
 import os
+
+# Run the verifier cooperatively, to keep many verifications in flight per
+# worker, for servers that don't patch the standard library themselves (unlike
+# `gunicorn -k gevent`). This has to be done before anything else is imported.
+if os.environ.get('RECEIPT_VERIFY_GEVENT'):
+    from gevent import monkey
+    monkey.patch_all()
+
 import site
 
 os.environ['DJANGO_SETTINGS_MODULE'] = 'settings_local_mkt'
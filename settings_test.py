@@ -51,6 +51,16 @@ SEND_REAL_EMAIL = True
 # Turn off search engine indexing.
 USE_ELASTIC = False
 
+# Don't cache API search results, most tests search again after indexing.
+CACHE_SEARCH_API_TIMEOUT = 0
+
+# Don't cache feed snapshots, the feed tests don't all go through the indexers.
+CACHE_FEED_SNAPSHOT_TIMEOUT = 0
+
+# Write monolith records right away.
+MONOLITH_BUFFER_SIZE = 1
+MONOLITH_SPOOL_DIR = None
+
 # Ensure all validation code runs in tests:
 VALIDATE_ADDONS = True
 
@@ -104,6 +114,7 @@ SQL_RESET_SEQUENCES = False
 GEOIP_URL = ''
 GEOIP_DEFAULT_VAL = 'restofworld'
 GEOIP_DEFAULT_TIMEOUT = .2
+GEOIP_DB_PATH = ''
 
 ES_DEFAULT_NUM_REPLICAS = 0
 ES_DEFAULT_NUM_SHARDS = 3